@@ -2,44 +2,80 @@
 #pip install Pillow imagehash numpy psutil qtpy PyQt5
 
 
+import time
+_STARTUP_TIME = time.perf_counter()  # 启动计时起点，见 report_startup_time
+
 import sys
 import os
-import time
 import shutil
 from datetime import datetime
 from pathlib import Path
-from PIL import Image
-import imagehash
 from qtpy import QtWidgets, QtCore, QtGui
-import DCCdetect
 from search_history import SearchHistoryManager
 import traceback
-import multiprocessing
-from functools import partial
-from image_processor import process_image, compute_image_hash 
-
-# 尝试导入Qt Material
-try:
-    from qt_material import apply_stylesheet
-    HAS_QT_MATERIAL = True
-except ImportError:
-    HAS_QT_MATERIAL = False
-    print("提示: 要使用Material Design风格，请安装qt-material: pip install qt-material")
+from worker_pool import WorkerPool, use_lean_main
+from result_model import ResultTableModel, ROW_HEIGHT, SORT_MODES
+# 以下模块在第一次使用时才导入，窗口显示前不加载 numpy、imagehash、PIL 和 psutil:
+#   DCCdetect（psutil）: 点击Unity/Blender菜单时
+#   search_worker / search_engine / hash_index / thumbnail_cache（numpy、imagehash、PIL）: 开始搜索时
+#   folder_watcher: 勾选监视文件夹时
+#   qt_material: 应用Material风格时
+
+# 启动时间预算（毫秒），超出时在控制台给出提示，见 benchmarks/bench_startup.py
+STARTUP_BUDGET_MS = 1000
+
+
+def load_material_stylesheet():
+    """尝试导入Qt Material，不可用时返回None"""
+    try:
+        from qt_material import apply_stylesheet
+        return apply_stylesheet
+    except ImportError:
+        print("提示: 要使用Material Design风格，请安装qt-material: pip install qt-material")
+        return None
 
 class ImageSimilarityApp(QtWidgets.QMainWindow):
+    STREAM_TABLE_LIMIT = 1000  # 搜索过程中表格最多显示的实时结果数（只保留相似度最高的部分）
+
     def __init__(self):
         super().__init__()
         self.source_image_path = None
+        self.source_image_paths = []  # 全部源图像（多于一个时为批量查询，第一个用于预览和历史记录）
         self.search_folders = []  # 修改为列表，存储多个文件夹路径
-        self.similarity_results = []
+        self.similarity_results = []  # 搜索完成后为 result_store.ResultSet
         self.current_sort_mode = 0  # 默认按相似度排序
+        self._hash_index = None  # 持久化哈希索引，见 hash_index 属性
+        self._thumbnail_cache = None  # SSIM规范缩略图缓存，见 thumbnail_cache 属性
+        self.worker_pool = WorkerPool()  # 常驻进程池，窗口显示后在后台启动，所有搜索复用
+        self.folder_watcher = None  # 可选的文件夹监视，在后台保持索引最新（勾选后创建）
+        self.last_hash_search = None  # 上一次哈希搜索的记录，切换哈希算法时直接重新排名
+        self.search_thread = None  # 正在执行搜索的后台线程
+        self.search_worker = None
+        self.search_progress = None
+        self.stream_count = 0  # 已收到的实时结果数量
 
-        # 初始化历史记录管理器
+        # 初始化历史记录管理器（历史记录在窗口显示后加载，见 main）
         self.history_manager = SearchHistoryManager(self)
         assert isinstance(self.history_manager, SearchHistoryManager), "历史记录管理器初始化失败"#断源
         self.history_manager.restore_history_state = self.restore_history_state
         self.initUI()
             
+    @property
+    def hash_index(self):
+        """持久化哈希索引（第一次使用时打开）"""
+        if self._hash_index is None:
+            from hash_index import HashIndex
+            self._hash_index = HashIndex()
+        return self._hash_index
+
+    @property
+    def thumbnail_cache(self):
+        """SSIM规范缩略图缓存（第一次使用时打开）"""
+        if self._thumbnail_cache is None:
+            from thumbnail_cache import ThumbnailCache
+            self._thumbnail_cache = ThumbnailCache()
+        return self._thumbnail_cache
+
     def initUI(self):
         self.setWindowTitle('图像相似度搜索')
         self.setGeometry(200, 200, 750, 1200)
@@ -140,7 +176,13 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         self.add_folder_btn.clicked.connect(self.add_search_folder)
         self.clear_folders_btn.clicked.connect(self.clear_search_folders)
 
+        # 文件夹监视选项：在后台把文件变化同步到哈希索引，哈希搜索无需再扫描文件夹
+        self.watch_checkbox = QtWidgets.QCheckBox("监视文件夹变化")
+        self.watch_checkbox.setToolTip("在后台自动更新哈希索引，哈希搜索时无需再扫描和检查每个文件")
+        self.watch_checkbox.toggled.connect(self.update_folder_watcher)
+
         folder_header.addWidget(self.folder_count_label, 1)
+        folder_header.addWidget(self.watch_checkbox, 0)
         folder_header.addWidget(self.add_folder_btn, 0)
         folder_header.addWidget(self.clear_folders_btn, 0)
 
@@ -162,24 +204,54 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         self.algorithm_group = QtWidgets.QButtonGroup(self)
         self.hash_radio = QtWidgets.QRadioButton("图像哈希")
         self.ssim_radio = QtWidgets.QRadioButton("SSIM(高精度)")
+        self.cascade_radio = QtWidgets.QRadioButton("级联(哈希预筛+SSIM)")
         self.hash_radio.setChecked(True)  # 默认选择哈希
         self.algorithm_group.addButton(self.hash_radio)
         self.algorithm_group.addButton(self.ssim_radio)
+        self.algorithm_group.addButton(self.cascade_radio)
 
         algorithm_layout.addWidget(self.hash_radio)
         algorithm_layout.addWidget(self.ssim_radio)
+        algorithm_layout.addWidget(self.cascade_radio)
 
         # 哈希类型选择
         self.hash_combo = QtWidgets.QComboBox()
         self.hash_combo.addItems(["pHash (感知哈希)", "aHash (平均哈希)", "dHash (差异哈希)"])
+        self.hash_combo.currentIndexChanged.connect(self.rerank_hash_results)
         algorithm_layout.addWidget(self.hash_combo)
 
+        # SSIM缩略图缓存选项：使用缓存的规范缩略图计算，无需重新解码原图
+        self.ssim_cache_checkbox = QtWidgets.QCheckBox("SSIM使用缩略图缓存")
+        self.ssim_cache_checkbox.setChecked(True)
+        self.ssim_cache_checkbox.setEnabled(False)
+        algorithm_layout.addWidget(self.ssim_cache_checkbox)
+
         # Radio Button触发事件
         self.hash_radio.toggled.connect(self.toggle_algorithm_options)
         self.ssim_radio.toggled.connect(self.toggle_algorithm_options)
+        self.cascade_radio.toggled.connect(self.toggle_algorithm_options)
 
         algorithm_layout.addStretch(1)
 
+        # 级联模式设置：先用哈希对全部文件评分，只对前K个（或高于哈希阈值的）候选计算SSIM
+        cascade_layout = QtWidgets.QHBoxLayout()
+        cascade_layout.addWidget(QtWidgets.QLabel("级联设置:"))
+        cascade_layout.addWidget(QtWidgets.QLabel("SSIM重排数量:"))
+        self.cascade_topk = QtWidgets.QSpinBox()
+        self.cascade_topk.setRange(1, 100000)
+        self.cascade_topk.setValue(200)
+        cascade_layout.addWidget(self.cascade_topk)
+        cascade_layout.addWidget(QtWidgets.QLabel("哈希阈值:"))
+        self.cascade_threshold = QtWidgets.QDoubleSpinBox()
+        self.cascade_threshold.setRange(0.0, 1.0)
+        self.cascade_threshold.setSingleStep(0.05)
+        self.cascade_threshold.setValue(0.0)
+        self.cascade_threshold.setToolTip("为0时只按数量截取；大于0时只对哈希相似度不低于该值的候选计算SSIM")
+        cascade_layout.addWidget(self.cascade_threshold)
+        cascade_layout.addStretch(1)
+        self.cascade_topk.setEnabled(False)
+        self.cascade_threshold.setEnabled(False)
+
         #创建相似度筛选
         filter_layout = QtWidgets.QHBoxLayout()
         filter_layout.addWidget(QtWidgets.QLabel("相似度筛选:"))
@@ -201,12 +273,29 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
 
         # 算法和相似度筛选添加到主布局
         main_layout.addLayout(algorithm_layout)
+        main_layout.addLayout(cascade_layout)
         main_layout.addLayout(filter_layout)
         
         # 创建搜索按钮
         self.search_btn = QtWidgets.QPushButton("开始搜索")
         self.search_btn.clicked.connect(self.start_search)
         self.search_btn.setEnabled(False)
+
+        # 查找重复图片：不需要源图像，在搜索文件夹中查找近似重复的图片分组（使用所选的哈希类型）
+        self.duplicates_btn = QtWidgets.QPushButton("查找重复图片")
+        self.duplicates_btn.clicked.connect(self.find_duplicates)
+        self.duplicates_btn.setEnabled(False)
+        self.duplicate_threshold = QtWidgets.QDoubleSpinBox()
+        self.duplicate_threshold.setRange(0.8, 1.0)  # 与 duplicate_finder.MIN_DUPLICATE_SIMILARITY 一致
+        self.duplicate_threshold.setSingleStep(0.01)
+        self.duplicate_threshold.setDecimals(2)
+        self.duplicate_threshold.setValue(0.9)  # 与 duplicate_finder.DUPLICATE_SIMILARITY 一致
+        self.duplicate_threshold.setToolTip("两张图片的哈希相似度不低于该值时视为重复")
+        search_layout = QtWidgets.QHBoxLayout()
+        search_layout.addWidget(self.search_btn, 1)
+        search_layout.addWidget(QtWidgets.QLabel("重复阈值:"))
+        search_layout.addWidget(self.duplicate_threshold)
+        search_layout.addWidget(self.duplicates_btn)
         
         # 创建结果控制面板
         result_control_panel = QtWidgets.QFrame()
@@ -222,7 +311,9 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
             "按日期排序", 
             "按图片类型排序", 
             "按分辨率排序（从大到小）",
-            "按分辨率排序（从小到大）"
+            "按分辨率排序（从小到大）",
+            "按重复分组排序",
+            "按源图像排序"
         ])
         self.sort_combo.setEnabled(False)
         
@@ -239,20 +330,28 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         # 创建结果数量标签
         self.result_count_label = QtWidgets.QLabel("")
         
-        # 创建结果表格
-        self.result_table = QtWidgets.QTableWidget()
-        self.result_table.setColumnCount(5)  # 缩略图、名称、类型、分辨率、相似度
-        self.result_table.setHorizontalHeaderLabels(["缩略图", "名称", "类型", "分辨率", "相似度"])
-        self.result_table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeToContents)
+        # 创建结果表格（模型/视图：只绘制和加载可见的行，见 result_model）
+        self.result_model = ResultTableModel(self)
+        self.result_table = QtWidgets.QTableView()
+        self.result_table.setModel(self.result_model)
+        self.result_table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Fixed)
+        self.result_table.setColumnWidth(0, ROW_HEIGHT + 5)
         self.result_table.horizontalHeader().setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)
         self.result_table.horizontalHeader().setSectionResizeMode(2, QtWidgets.QHeaderView.ResizeToContents)
         self.result_table.horizontalHeader().setSectionResizeMode(3, QtWidgets.QHeaderView.ResizeToContents)
         self.result_table.horizontalHeader().setSectionResizeMode(4, QtWidgets.QHeaderView.ResizeToContents)
+        # 自适应列宽只参考可见的行，排序和插入行时无需逐行计算（默认会检查1000行）
+        self.result_table.horizontalHeader().setResizeContentsPrecision(0)
         self.result_table.verticalHeader().setVisible(False)
-        self.result_table.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
-        self.result_table.setSelectionBehavior(QtWidgets.QTableWidget.SelectRows)
-        self.result_table.setSelectionMode(QtWidgets.QTableWidget.ExtendedSelection)
-        self.result_table.cellDoubleClicked.connect(self.open_image_from_table)
+        # 所有行高度相同，视图无需逐行计算行高
+        self.result_table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.result_table.verticalHeader().setDefaultSectionSize(ROW_HEIGHT)
+        self.result_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.result_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.result_table.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.result_table.doubleClicked.connect(self.open_image_from_table)
+        # 滚动后丢弃已滚出屏幕的行尚未开始的缩略图请求，可见的行在重绘时会重新请求
+        self.result_table.verticalScrollBar().valueChanged.connect(self.result_model.cancel_thumbnails)
         
         # 设置表格支持右键菜单
         self.result_table.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
@@ -265,18 +364,23 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         self.copy_btn = QtWidgets.QPushButton("复制到...")
         self.rename_btn = QtWidgets.QPushButton("批量重命名...")
         self.open_folder_btn = QtWidgets.QPushButton("在文件管理器中打开")
+        self.select_redundant_btn = QtWidgets.QPushButton("选中多余的重复文件")
+        self.select_redundant_btn.setToolTip("查找重复图片后，选中每组中除建议保留的文件以外的全部文件")
+        self.select_redundant_btn.setEnabled(False)
 
         # 连接按钮到对应方法
         self.delete_btn.clicked.connect(self.delete_selected)
         self.copy_btn.clicked.connect(self.copy_selected)
         self.rename_btn.clicked.connect(self.rename_selected)
         self.open_folder_btn.clicked.connect(self.open_in_file_manager)
+        self.select_redundant_btn.clicked.connect(self.select_redundant_duplicates)
 
         # 添加按钮到布局
         file_ops_layout.addWidget(self.delete_btn)
         file_ops_layout.addWidget(self.copy_btn)
         file_ops_layout.addWidget(self.rename_btn)
         file_ops_layout.addWidget(self.open_folder_btn)
+        file_ops_layout.addWidget(self.select_redundant_btn)
         file_ops_layout.addStretch(1)
         
         # 创建状态栏
@@ -289,7 +393,7 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         main_layout.addWidget(self.image_info_frame)
         main_layout.addLayout(folder_layout)
         main_layout.addLayout(algorithm_layout)
-        main_layout.addWidget(self.search_btn)
+        main_layout.addLayout(search_layout)
         main_layout.addWidget(result_control_panel)
         main_layout.addWidget(self.result_count_label)
         main_layout.addWidget(QtWidgets.QLabel("搜索结果 (双击打开图像):"))
@@ -317,6 +421,7 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
             self.folders_list.addItem(folder)
             self.folder_count_label.setText(f"已选择 {len(self.search_folders)} 个搜索文件夹")
             self.update_search_button_state()
+            self.update_folder_watcher()
 
     def clear_search_folders(self):
         """清除所有搜索文件夹"""
@@ -324,6 +429,17 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         self.folders_list.clear()
         self.folder_count_label.setText("已选择 0 个搜索文件夹")
         self.update_search_button_state()
+        self.update_folder_watcher()
+
+    def update_folder_watcher(self):
+        """根据监视选项和当前搜索文件夹更新文件夹监视"""
+        folders = self.search_folders if self.watch_checkbox.isChecked() else []
+        if self.folder_watcher is None:
+            if not folders:
+                return
+            from folder_watcher import FolderWatcher
+            self.folder_watcher = FolderWatcher(self.hash_index)
+        self.folder_watcher.set_folders(folders)
 
     def show_folder_context_menu(self, position):
         """显示文件夹列表的右键菜单"""
@@ -340,7 +456,9 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
                 self.folders_list.takeItem(current_row)
                 self.folder_count_label.setText(f"已选择 {len(self.search_folders)} 个搜索文件夹")
                 self.update_search_button_state()
+                self.update_folder_watcher()
     def handle_open_unity(self):
+        import DCCdetect  # 只在点击菜单时导入（依赖psutil）
         # 调用独立模块的检测函数
         project_paths, error = DCCdetect.get_unity_project_paths()  # 使用新函数名
         
@@ -412,7 +530,8 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
                         DCCdetect.show_message_box(self, "成功", "已打开文件夹。", info=True)
     
     def handle_open_blender(self):
-    # 调用独立模块的检测函数
+        import DCCdetect  # 只在点击菜单时导入（依赖psutil）
+        # 调用独立模块的检测函数
         project_infos, error = DCCdetect.get_blender_project_paths()
         
         if error:
@@ -490,9 +609,20 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
             self.update_search_button_state()
     
     def set_source_image(self, file_path):
-        self.source_image_path = file_path
-        self.drop_area.set_image(file_path)
-        self.update_image_info(file_path)
+        self.set_source_images([file_path])
+
+    def set_source_images(self, file_paths):
+        """
+        设置源图像（拖放或选择多个文件时为批量查询：只扫描一次文件夹，结果按源图像分组）
+            预览和图像信息显示第一个源图像
+        """
+        self.source_image_paths = list(dict.fromkeys(file_paths))
+        self.source_image_path = self.source_image_paths[0]
+        self.drop_area.set_image(self.source_image_path)
+        self.update_image_info(self.source_image_path)
+        if len(self.source_image_paths) > 1:
+            self.path_value.setText(f"{self.source_image_path}\n（共 {len(self.source_image_paths)} 个源图像，批量查询）")
+            self.statusBar.showMessage(f"已选择 {len(self.source_image_paths)} 个源图像")
         self.update_search_button_state()
     
     def update_image_info(self, file_path):
@@ -501,6 +631,7 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
             file_ext = os.path.splitext(file_path)[1].lower()
             
             # 使用PIL获取详细信息
+            from PIL import Image
             with Image.open(file_path) as img:
                 # 获取文件格式
                 format_info = img.format if img.format else "未知"
@@ -555,17 +686,23 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
     def update_search_button_state(self):
 
         self.search_btn.setEnabled(self.source_image_path is not None and 
-                                len(self.search_folders) > 0)
+                                len(self.search_folders) > 0 and not self.is_searching())
+        self.duplicates_btn.setEnabled(len(self.search_folders) > 0 and not self.is_searching())
+        # 搜索过程中结果集仍在追加，不允许删除和重命名
+        self.delete_btn.setEnabled(not self.is_searching())
+        self.rename_btn.setEnabled(not self.is_searching())
+
     def toggle_algorithm_options(self, checked):
         """根据所选算法切换相关选项的可见性"""
-        if self.hash_radio.isChecked():
-            self.hash_combo.setEnabled(True)
-            # 可以添加其他与哈希算法相关的UI元素状态更改
-        else:
-            self.hash_combo.setEnabled(False)
-            # 可以添加其他与SSIM算法相关的UI元素状态更改
+        use_cascade = self.cascade_radio.isChecked()
+        # 哈希类型同时用于哈希模式和级联模式的预筛
+        self.hash_combo.setEnabled(self.hash_radio.isChecked() or use_cascade)
+        self.ssim_cache_checkbox.setEnabled(self.ssim_radio.isChecked())
+        self.cascade_topk.setEnabled(use_cascade)
+        self.cascade_threshold.setEnabled(use_cascade)
     
     def get_selected_hash_algorithm(self):
+        import imagehash
         selected_index = self.hash_combo.currentIndex()
         if selected_index == 1:
             return imagehash.average_hash
@@ -573,6 +710,10 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
             return imagehash.dhash
         else:  # 默认使用pHash
             return imagehash.phash
+
+    def get_selected_hash_name(self):
+        """获取所选哈希算法的名称（与索引列名一致）"""
+        return ('phash', 'ahash', 'dhash')[max(self.hash_combo.currentIndex(), 0)]
     
 
     # 恢复历史记录状态
@@ -587,6 +728,7 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         for folder in valid_folders:
             self.folders_list.addItem(folder)
         self.folder_count_label.setText(f"已选择 {len(valid_folders)} 个搜索文件夹")
+        self.update_folder_watcher()
         
         # 设置哈希算法
         hash_method = history.get('hash_method', 0)
@@ -606,8 +748,11 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         if reply == QtWidgets.QMessageBox.Yes:
             self.start_search()
 
-    def _update_search_results(self, filtered_count, filter_enabled, algorithm_info):
-        """更新搜索结果UI和添加历史记录"""
+    def _update_search_results(self, filtered_count, filter_enabled, algorithm_info, prefiltered_count=0):
+        """
+        更新搜索结果UI和添加历史记录
+            filtered_count: 不符合相似度条件的文件数；prefiltered_count: 级联模式中未进入SSIM重排的文件数
+        """
         # 添加到历史记录
         if self.similarity_results:
             self.history_manager.add_history_item(
@@ -620,256 +765,307 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         
         # 更新结果数量标签
         filter_message = f"(已筛选掉 {filtered_count} 个)" if filter_enabled else ""
+        if prefiltered_count:
+            filter_message += f"(哈希预筛排除 {prefiltered_count} 个)"
         self.result_count_label.setText(f"找到 {len(self.similarity_results)} 个结果 {filter_message}")
         
         # 启用排序功能
         self.sort_combo.setEnabled(True)
         self.apply_sort_btn.setEnabled(True)
         
-        # 默认按相似度排序并显示结果
-        self.sort_combo.setCurrentIndex(0)
+        # 默认按相似度排序并显示结果（批量查询时按源图像分组）
+        self.sort_combo.setCurrentIndex(self._default_sort_index())
         self.apply_sort()
         
         # 显示搜索完成的消息
         msg = f"找到 {len(self.similarity_results)} 个结果"
         if filter_enabled:
             msg += f"\n筛选了 {filtered_count + len(self.similarity_results)} 个文件，其中 {filtered_count} 个不符合相似度条件"
+        if prefiltered_count:
+            msg += f"\n另有 {prefiltered_count} 个文件在哈希预筛中被排除，未计算SSIM"
         QtWidgets.QMessageBox.information(self, "搜索完成", msg)
         
         self.statusBar.showMessage("搜索完成")
 
+    def is_searching(self):
+        """是否有搜索正在后台线程中执行"""
+        return self.search_thread is not None
+
+    def _default_sort_index(self):
+        """搜索完成后的默认排序方式：按相似度，批量查询时按源图像分组（组内按相似度）"""
+        if len(self.source_image_paths) > 1:
+            return SORT_MODES.index(('source', False))
+        return 0
+
     def start_search(self):
-        if not self.source_image_path or not self.search_folders:
+        if not self.source_image_path or not self.search_folders or self.is_searching():
             return
         
-        # 清空之前的结果
-        self.result_table.setRowCount(0)
-        self.similarity_results = []
-        self.statusBar.showMessage("正在搜索中...")
-        
-        # 显示进度对话框
-        progress = QtWidgets.QProgressDialog("计算图像相似度...", "取消", 0, 100, self)
-        progress.setWindowModality(QtCore.Qt.WindowModal)
-        progress.setMinimumDuration(0)
-        progress.show()
-        QtWidgets.QApplication.processEvents()
-        
         # 获取算法选择
         use_ssim = self.ssim_radio.isChecked()
+        use_cascade = self.cascade_radio.isChecked()
+        batch = len(self.source_image_paths) > 1
+        if batch and (use_cascade or (use_ssim and not self.ssim_cache_checkbox.isChecked())):
+            QtWidgets.QMessageBox.warning(self, "警告", "多个源图像的批量查询只支持哈希算法和使用缩略图缓存的SSIM")
+            return
+        
+        # 清空之前的结果，搜索过程中不生成缩略图
+        self._clear_results()
+        self.statusBar.showMessage("正在搜索中...")
         
         # 获取筛选设置
         filter_enabled = hasattr(self, 'filter_checkbox') and self.filter_checkbox.isChecked()
         min_similarity = getattr(self, 'min_similarity', QtWidgets.QDoubleSpinBox()).value()
         max_similarity = getattr(self, 'max_similarity', QtWidgets.QDoubleSpinBox()).value()
         
-        try:
-            # 收集所有图像文件路径
-            image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp']
-            image_files = []
-            
-            for folder in self.search_folders:
-                for ext in image_extensions:
-                    image_files.extend(list(Path(folder).glob(f'*{ext}')))
-                    #image_files.extend(list(Path(folder).glob(f'*{ext.upper()}')))
-            
-            total_files = len(image_files)
-            if total_files == 0:
-                QtWidgets.QMessageBox.information(self, "信息", "在选定的文件夹中没有找到图像文件。")
-                progress.close()
-                return
-            
-            # 批次大小计算
-            batch_size = min(max(total_files // (multiprocessing.cpu_count() * 2), 1), 100)
-            
-            # 创建进程池
-            cpu_count = multiprocessing.cpu_count()
-            
-            if use_ssim:
-                # SSIM计算
-                from image_processor import process_image_ssim
-                worker_func = partial(
-                    process_image_ssim,
-                    source_image_path=self.source_image_path,
-                    min_similarity=min_similarity,
-                    max_similarity=max_similarity,
-                    filter_enabled=filter_enabled
-                )
-            else:
-                # 哈希计算
-                from image_processor import process_image
-                # 计算源图像哈希
-                hash_algorithm = self.get_selected_hash_algorithm()
-                source_hash = compute_image_hash(self.source_image_path, hash_algorithm)
-                
-                worker_func = partial(
-                    process_image,
-                    source_hash=source_hash,
-                    hash_algorithm=hash_algorithm,
-                    min_similarity=min_similarity,
-                    max_similarity=max_similarity,
-                    filter_enabled=filter_enabled
-                )
-            
-            # 使用进程池处理图像
-            with multiprocessing.Pool(processes=cpu_count) as pool:
-                # 使用map_async批量处理
-                result_async = pool.map_async(worker_func, image_files, chunksize=batch_size)
-                
-                # 等待结果并更新进度
-                while not result_async.ready():
-                    # 使用估计进度
-                    estimated_progress = min(result_async._number_left * 100 / (total_files / batch_size), 100)
-                    progress.setValue(100 - int(estimated_progress))
-                    
-                    # 检查是否取消
-                    if progress.wasCanceled():
-                        pool.terminate()
-                        break
-                    
-                    # 更新UI
-                    QtWidgets.QApplication.processEvents()
-                    time.sleep(0.1)
-                
-                # 获取所有结果
-                if not progress.wasCanceled():
-                    all_results = result_async.get()
-                    
-                    # 过滤掉None结果
-                    self.similarity_results = [r for r in all_results if r is not None]
-                    
-                    # 计算筛选统计
-                    filtered_count = all_results.count(None)
-                    
-                    # 更新历史记录中添加算法类型
-                    algorithm_info = {
-                        'algorithm': 'ssim' if use_ssim else 'hash',
-                        'hash_type': self.hash_combo.currentIndex() if not use_ssim else None,
-                        'filter_enabled': filter_enabled,
-                        'min_similarity': min_similarity,
-                        'max_similarity': max_similarity
-                    }
-                    
-                    # 更新UI和添加历史记录
-                    self._update_search_results(filtered_count, filter_enabled, algorithm_info)
-                else:
-                    self.statusBar.showMessage("搜索已取消")
+        params = {
+            'source_image': list(self.source_image_paths) if batch else self.source_image_path,
+            'search_folders': list(self.search_folders),
+            'algorithm': 'ssim' if use_ssim else ('cascade' if use_cascade else 'hash'),
+            'hash_name': self.get_selected_hash_name(),
+            'hash_type': self.hash_combo.currentIndex() if not use_ssim else None,
+            'ssim_cache': self.ssim_cache_checkbox.isChecked(),
+            'cascade_topk': self.cascade_topk.value(),
+            'cascade_threshold': self.cascade_threshold.value(),
+            'filter_enabled': filter_enabled,
+            'min_similarity': min_similarity,
+            'max_similarity': max_similarity,
+            # 文件夹监视已同步时哈希搜索直接使用索引中的文件列表
+            'watched': self.folder_watcher is not None and self.folder_watcher.is_synced(self.search_folders),
+        }
+        
+        from search_worker import SearchWorker
+        self._start_worker(
+            SearchWorker(params, self.hash_index, self.thumbnail_cache, self.worker_pool),
+            self._on_search_finished, "正在扫描文件夹..."
+        )
+
+    def find_duplicates(self):
+        """在搜索文件夹中查找近似重复的图片分组（不需要源图像），结果按组显示在结果表格中"""
+        if not self.search_folders or self.is_searching():
+            return
         
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "错误", f"处理图像时出错: {e}")
-            self.statusBar.showMessage("搜索出错")
-            traceback.print_exc()
-        finally:
-            progress.setValue(100)
-            progress.close()
+        self._clear_results()
+        self.statusBar.showMessage("正在查找重复图片...")
+        params = {
+            'search_folders': list(self.search_folders),
+            'hash_name': self.get_selected_hash_name(),
+            'min_similarity': self.duplicate_threshold.value(),
+            'watched': self.folder_watcher is not None and self.folder_watcher.is_synced(self.search_folders),
+        }
+        from search_worker import DuplicateWorker
+        self._start_worker(
+            DuplicateWorker(params, self.hash_index, None, self.worker_pool),
+            self._on_duplicates_finished, "正在扫描文件夹..."
+        )
+
+    def _clear_results(self):
+        """开始新的搜索前清空之前的结果，搜索过程中不生成缩略图"""
+        self.result_model.load_thumbnails = False
+        self.result_model.set_results(None)
+        self.similarity_results = []
+        self.last_hash_search = None
+        self.stream_count = 0
+        self.sort_combo.setEnabled(False)
+        self.apply_sort_btn.setEnabled(False)
+        self.select_redundant_btn.setEnabled(False)
+
+    def _start_worker(self, worker, on_finished, label):
+        """在独立线程中运行搜索对象（SearchWorker 或 DuplicateWorker），并显示进度对话框"""
+        # 显示进度对话框（非模态，搜索过程中可以浏览实时出现的结果，进度由后台线程通过信号更新）
+        self.search_progress = QtWidgets.QProgressDialog(label, "取消", 0, 0, self)
+        self.search_progress.setWindowModality(QtCore.Qt.NonModal)
+        self.search_progress.setMinimumDuration(0)
+        self.search_progress.setAutoClose(False)
+        self.search_progress.setAutoReset(False)
+        
+        # 在独立线程中执行搜索
+        self.search_thread = QtCore.QThread(self)
+        self.search_worker = worker
+        self.search_worker.moveToThread(self.search_thread)
+        self.search_thread.started.connect(self.search_worker.run)
+        self.search_worker.progress.connect(self._on_search_progress)
+        self.search_worker.status.connect(self.statusBar.showMessage)
+        self.search_worker.partial_results.connect(self._on_partial_results)
+        self.search_worker.finished.connect(on_finished)
+        self.search_worker.canceled.connect(self._on_search_canceled)
+        self.search_worker.error.connect(self._on_search_error)
+        # 取消请求直接在GUI线程中设置标志，不经过正在忙碌的工作线程事件循环
+        self.search_progress.canceled.connect(self.search_worker.cancel, QtCore.Qt.DirectConnection)
+        self.search_thread.start()
+        self.search_progress.show()
+        self.update_search_button_state()
     
-    def apply_sort(self):
-        """应用所选的排序方式"""
-        if not self.similarity_results:
+    def _on_search_progress(self, done, total, text):
+        """后台线程报告的逐文件进度"""
+        if self.search_progress is None or self.search_progress.wasCanceled():
+            return
+        self.search_progress.setLabelText(text)
+        self.search_progress.setMaximum(total)
+        self.search_progress.setValue(done)
+    
+    def _on_partial_results(self, results):
+        """
+        实时结果：按相似度从高到低插入表格
+            搜索过程中只显示文字信息，缩略图在搜索完成后统一生成，避免与搜索进程争用CPU
+        """
+        self.stream_count += len(results)
+        self.result_model.add_streamed(results, self.STREAM_TABLE_LIMIT)
+        self.similarity_results = self.result_model.results()
+        self.result_count_label.setText(f"已找到 {self.stream_count} 个结果 (搜索中...)")
+    
+    def _end_search(self):
+        """关闭进度对话框并回收后台线程"""
+        if self.search_progress is not None:
+            self.search_progress.close()
+            self.search_progress = None
+        if self.search_thread is not None:
+            self.search_thread.quit()
+            self.search_thread.wait()
+            self.search_thread = None
+        self.search_worker = None
+        self.result_model.load_thumbnails = True
+        self.result_table.viewport().update()
+        self.update_search_button_state()
+    
+    def _on_search_finished(self, summary):
+        """搜索完成：保存结果并更新界面"""
+        self._end_search()
+        params = summary['params']
+        if summary['total_files'] == 0:
+            QtWidgets.QMessageBox.information(self, "信息", "在选定的文件夹中没有找到图像文件。")
+            self.statusBar.showMessage("没有找到图像文件")
             return
         
-        self.statusBar.showMessage("正在排序...")
-        QtWidgets.QApplication.processEvents()
-        
-        # 获取排序方式
-        sort_index = self.sort_combo.currentIndex()
-        self.current_sort_mode = sort_index
-        
-        # 根据选择的方式排序
-        if sort_index == 0:  # 按相似度排序
-            sorted_results = sorted(self.similarity_results, 
-                                   key=lambda x: x['similarity'], reverse=True)
-        
-        elif sort_index == 1:  # 按名称排序
-            sorted_results = sorted(self.similarity_results, 
-                                   key=lambda x: x['name'].lower())
+        self.similarity_results = summary['results']
+        self.last_hash_search = summary['hash_search']
+        
+        # 更新历史记录中添加算法类型
+        algorithm_info = {
+            'algorithm': params['algorithm'],
+            'hash_type': params['hash_type'],
+            'filter_enabled': params['filter_enabled'],
+            'min_similarity': params['min_similarity'],
+            'max_similarity': params['max_similarity']
+        }
+        
+        # 更新UI和添加历史记录
+        self._update_search_results(summary['filtered_count'], params['filter_enabled'], algorithm_info,
+                                    summary['prefiltered_count'])
+    
+    def _on_duplicates_finished(self, summary):
+        """查找重复图片完成：按分组显示结果，每组第一个文件为建议保留的文件"""
+        self._end_search()
+        if summary['total_files'] == 0:
+            QtWidgets.QMessageBox.information(self, "信息", "在选定的文件夹中没有找到图像文件。")
+            self.statusBar.showMessage("没有找到图像文件")
+            return
         
-        elif sort_index == 2:  # 按日期排序
-            sorted_results = sorted(self.similarity_results, 
-                                   key=lambda x: x['mtime'], reverse=True)
+        from duplicate_finder import format_size
+        results = summary['results']
+        groups = summary['groups']
+        wasted = format_size(summary['wasted_bytes'].sum())
+        self.similarity_results = results
+        self.result_count_label.setText(
+            f"找到 {groups} 组重复图片，共 {len(results)} 个文件，删除多余的文件可释放 {wasted}"
+        )
+        self.sort_combo.setEnabled(True)
+        self.apply_sort_btn.setEnabled(True)
+        self.select_redundant_btn.setEnabled(len(results) > 0)
+        self.sort_combo.setCurrentIndex(SORT_MODES.index(('group', False)))
+        self.apply_sort()
         
-        elif sort_index == 3:  # 按图片类型排序
-            sorted_results = sorted(self.similarity_results, 
-                                   key=lambda x: x['type'])
+        msg = f"在 {summary['total_files']} 个文件中找到 {groups} 组重复图片"
+        if groups:
+            msg += (f"\n每组第一个文件（分辨率最高，其次最新）建议保留，"
+                    f"删除其余 {len(results) - groups} 个文件可释放 {wasted}")
+        QtWidgets.QMessageBox.information(self, "查找完成", msg)
+        self.statusBar.showMessage("查找重复图片完成")
+    
+    def _on_search_canceled(self):
+        self._end_search()
+        # 保留已实时显示的结果，之后的文件操作和排序都针对这些结果
+        self.similarity_results = self.result_model.results() or []
+        if self.stream_count:
+            self.result_count_label.setText(f"已找到 {self.stream_count} 个结果 (搜索已取消)")
+        self.statusBar.showMessage("搜索已取消")
+    
+    def _on_search_error(self, message):
+        self._end_search()
+        QtWidgets.QMessageBox.critical(self, "错误", f"处理图像时出错: {message}")
+        self.statusBar.showMessage("搜索出错")
+    
+    def rerank_hash_results(self, index):
+        """切换哈希算法时，直接用已计算的哈希重新排名上一次的搜索结果"""
+        if (not self.last_hash_search or not self.hash_radio.isChecked() or self.is_searching()
+                or self.last_hash_search['source_images'] != self.source_image_paths):
+            return
         
-        elif sort_index == 4:  # 按分辨率排序 (从大到小)
-            sorted_results = sorted(self.similarity_results, 
-                                   key=lambda x: x['resolution'], reverse=True)
+        filter_enabled = self.filter_checkbox.isChecked()
+        min_similarity = self.min_similarity.value()
+        max_similarity = self.max_similarity.value()
+        from search_engine import rank_hash_records
+        # 与搜索完成时一样按相似度排序（批量查询时先按源图像分组），按源图像排序时组内保持相似度顺序
+        self.similarity_results = rank_hash_records(
+            self.last_hash_search, self.get_selected_hash_name(),
+            filter_enabled, min_similarity, max_similarity
+        ).sorted()
+        
+        filtered_count = (len(self.last_hash_search['rows']) * len(self.source_image_paths)
+                          - len(self.similarity_results))
+        filter_message = f"(已筛选掉 {filtered_count} 个)" if filter_enabled else ""
+        self.result_count_label.setText(f"找到 {len(self.similarity_results)} 个结果 {filter_message}")
+        self.sort_combo.setCurrentIndex(self._default_sort_index())
+        self.apply_sort()
+        self.statusBar.showMessage(f"已使用{self.hash_combo.currentText()}重新排名")
+    
+    def apply_sort(self):
+        """
+        应用所选的排序方式
+            只重新排列表格模型中的行（见 ResultTableModel.sort_by），不重建表格，也不重新加载缩略图；
+            结果列表本身被替换时先重新填充表格
+        """
+        if not self.similarity_results:
+            return
         
-        elif sort_index == 5:  # 按分辨率排序 (从小到大)
-            sorted_results = sorted(self.similarity_results, 
-                                   key=lambda x: x['resolution'])
+        # 获取排序方式（排序方式见 result_model.SORT_MODES）
+        sort_index = self.sort_combo.currentIndex()
+        self.current_sort_mode = sort_index
         
-        # 显示排序后的结果
-        self.populate_result_table(sorted_results)
+        if self.result_model.results() is not self.similarity_results:
+            self.populate_result_table(self.similarity_results)
+        self.result_model.sort_by(sort_index)
         
         self.statusBar.showMessage(f"已按{self.sort_combo.currentText()}排序")
     
     def populate_result_table(self, results):
-        """填充结果表格"""
-        # 清空表格
-        self.result_table.setRowCount(0)
-        
-        # 设置行数
-        self.result_table.setRowCount(len(results))
-        
-        # 填充表格
-        for row, result in enumerate(results):
-            # 创建缩略图单元格
-            thumbnail_cell = QtWidgets.QTableWidgetItem()
-            thumbnail_cell.setTextAlignment(QtCore.Qt.AlignCenter)
-            
-            try:
-                # 创建缩略图
-                pixmap = QtGui.QPixmap(result['path'])
-                if not pixmap.isNull():
-                    pixmap = pixmap.scaled(80, 80, QtCore.Qt.KeepAspectRatio, 
-                                          QtCore.Qt.SmoothTransformation)
-                    thumbnail_cell.setData(QtCore.Qt.DecorationRole, pixmap)
-            except Exception as e:
-                print(f"创建缩略图时出错: {e}")
-            
-            # 设置单元格的工具提示为文件路径
-            thumbnail_cell.setToolTip(result['path'])
-            
-            # 创建其他信息单元格
-            name_cell = QtWidgets.QTableWidgetItem(result['name'])
-            name_cell.setToolTip(result['path'])
-            
-            type_cell = QtWidgets.QTableWidgetItem(result['type'])
-            resolution_cell = QtWidgets.QTableWidgetItem(result['resolution_str'])
-            
-            # 创建相似度单元格并设置背景颜色
-            similarity_value = result['similarity']
-            similarity_cell = QtWidgets.QTableWidgetItem(f"{similarity_value:.4f}")
-            
-            # 根据相似度设置不同的背景颜色
-            if similarity_value < 0.5:
-                # 红色背景
-                similarity_cell.setBackground(QtGui.QColor(255, 150, 150))
-            elif similarity_value < 0.8:
-                # 黄色背景
-                similarity_cell.setBackground(QtGui.QColor(255, 255, 150))
-            else:
-                # 绿色背景
-                similarity_cell.setBackground(QtGui.QColor(150, 255, 150))
-            
-            # 将单元格添加到表格
-            self.result_table.setItem(row, 0, thumbnail_cell)
-            self.result_table.setItem(row, 1, name_cell)
-            self.result_table.setItem(row, 2, type_cell)
-            self.result_table.setItem(row, 3, resolution_cell)
-            self.result_table.setItem(row, 4, similarity_cell)
-            
-            # 设置行高以适应缩略图
-            self.result_table.setRowHeight(row, 85)
-    
+        """显示结果（按原顺序），缩略图在可见的行绘制时于后台生成"""
+        self.result_model.load_thumbnails = True
+        self.result_model.set_results(results)
+
+    def selected_result_rows(self):
+        """结果表格中选中的行号（升序）"""
+        return sorted(index.row() for index in self.result_table.selectionModel().selectedRows())
+
+    def closeEvent(self, event):
+        """关闭窗口时停止搜索并关闭进程池，释放索引数据库和缩略图缓存"""
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+        self._end_search()
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+        self.worker_pool.shutdown()
+        self.result_model.shutdown()
+        if self._hash_index is not None:
+            self._hash_index.close()
+        if self._thumbnail_cache is not None:
+            self._thumbnail_cache.close()
+        super().closeEvent(event)
     
-    def open_image_from_table(self, row, column):
+    def open_image_from_table(self, index):
         """从表格中打开图像"""
-        # 获取所选行的第一列（缩略图列）中的工具提示，其中包含文件路径
-        item = self.result_table.item(row, 0)
-        if item and item.toolTip():
-            self.open_image_file(item.toolTip())
+        if index.isValid():
+            self.open_image_file(self.result_model.path(index.row()))
     
     def open_image_file(self, file_path):
         """打开图像文件"""
@@ -890,20 +1086,39 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         menu = QtWidgets.QMenu()
         
         # 获取选中项
-        selected_rows = set(item.row() for item in self.result_table.selectedItems())
+        selected_rows = self.selected_result_rows()
         if selected_rows:
-            menu.addAction("删除选中项", self.delete_selected)
+            menu.addAction("删除选中项", self.delete_selected).setEnabled(self.delete_btn.isEnabled())
             menu.addAction("复制到...", self.copy_selected)
-            menu.addAction("批量重命名...", self.rename_selected)
+            menu.addAction("批量重命名...", self.rename_selected).setEnabled(self.rename_btn.isEnabled())
             menu.addAction("在文件管理器中打开", self.open_in_file_manager)
         
         # 显示菜单
         menu.exec_(self.result_table.mapToGlobal(position))
     
+    def select_redundant_duplicates(self):
+        """选中各组中除建议保留的文件以外的全部文件（之后可以直接删除、复制或在文件管理器中打开）"""
+        rows = self.result_model.redundant_rows()
+        selection = QtCore.QItemSelection()
+        last_column = self.result_model.columnCount() - 1
+        # 连续的行合并为一个选择范围
+        start = previous = None
+        for row in rows + [None]:
+            if row is not None and previous is not None and row == previous + 1:
+                previous = row
+                continue
+            if start is not None:
+                selection.select(self.result_model.index(start, 0), self.result_model.index(previous, last_column))
+            start = previous = row
+        self.result_table.selectionModel().select(
+            selection, QtCore.QItemSelectionModel.ClearAndSelect | QtCore.QItemSelectionModel.Rows
+        )
+        self.statusBar.showMessage(f"已选中 {len(rows)} 个多余的重复文件")
+    
     def delete_selected(self):
         """删除选中的图像文件"""
-        selected_rows = sorted(set(item.row() for item in self.result_table.selectedItems()), reverse=True)
-        if not selected_rows:
+        selected_rows = self.selected_result_rows()[::-1]
+        if not selected_rows or self.is_searching():
             return
         
         # 确认对话框
@@ -915,34 +1130,32 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         )
         
         if reply == QtWidgets.QMessageBox.Yes:
-            deleted_count = 0
             # 获取要删除的文件路径
             files_to_delete = []
             for row in selected_rows:
-                file_path = self.result_table.item(row, 0).toolTip()
+                file_path = self.result_model.path(row)
                 files_to_delete.append(file_path)
             
             # 删除文件并更新数据
+            deleted_files = []
             for file_path in files_to_delete:
                 try:
                     os.remove(file_path)
-                    # 从结果中移除
-                    for i, result in enumerate(self.similarity_results[:]):
-                        if result['path'] == file_path:
-                            self.similarity_results.pop(i)
-                            deleted_count += 1
-                            break
+                    deleted_files.append(file_path)
                 except Exception as e:
                     QtWidgets.QMessageBox.warning(self, "删除失败", f"无法删除文件: {file_path}\n错误: {e}")
+            # 从结果中移除
+            deleted_count = self.similarity_results.remove_paths(deleted_files)
             
-            # 更新UI
+            # 更新UI（结果已变化，重新填充表格）
+            self.populate_result_table(self.similarity_results)
             self.apply_sort()
             self.result_count_label.setText(f"找到 {len(self.similarity_results)} 个结果")
             QtWidgets.QMessageBox.information(self, "删除完成", f"成功删除 {deleted_count} 个文件")
     
     def copy_selected(self):
         """复制选中的图像文件到指定文件夹"""
-        selected_rows = set(item.row() for item in self.result_table.selectedItems())
+        selected_rows = self.selected_result_rows()
         if not selected_rows:
             return
         
@@ -954,7 +1167,7 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
         # 收集要复制的文件
         files_to_copy = []
         for row in selected_rows:
-            file_path = self.result_table.item(row, 0).toolTip()
+            file_path = self.result_model.path(row)
             files_to_copy.append(file_path)
         
         # 显示进度对话框
@@ -991,8 +1204,8 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
     
     def rename_selected(self):
         """批量重命名选中的图像文件"""
-        selected_rows = sorted(set(item.row() for item in self.result_table.selectedItems()))
-        if not selected_rows:
+        selected_rows = self.selected_result_rows()
+        if not selected_rows or self.is_searching():
             return
         
         # 创建重命名对话框
@@ -1040,7 +1253,7 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
             start_idx = start_num_spin.value()
             
             for i, row in enumerate(selected_rows):
-                file_path = self.result_table.item(row, 0).toolTip()
+                file_path = self.result_model.path(row)
                 old_name = os.path.basename(file_path)
                 name, ext = os.path.splitext(old_name)
                 
@@ -1068,7 +1281,7 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
             renamed_count = 0
             
             for i, row in enumerate(selected_rows):
-                file_path = self.result_table.item(row, 0).toolTip()
+                file_path = self.result_model.path(row)
                 folder = os.path.dirname(file_path)
                 old_name = os.path.basename(file_path)
                 name, ext = os.path.splitext(old_name)
@@ -1085,29 +1298,26 @@ class ImageSimilarityApp(QtWidgets.QMainWindow):
                 # 执行重命名
                 try:
                     os.rename(file_path, new_path)
-                    # 更新数据
-                    for result in self.similarity_results:
-                        if result['path'] == file_path:
-                            result['path'] = new_path
-                            result['name'] = new_name
-                            renamed_count += 1
-                            break
+                    # 更新数据（文件名由路径生成）
+                    if self.similarity_results.rename_path(file_path, new_path):
+                        renamed_count += 1
                 except Exception as e:
                     QtWidgets.QMessageBox.warning(self, "重命名失败", f"无法重命名文件: {file_path}\n错误: {e}")
             
-            # 更新UI
+            # 更新UI（名称已变化，重新填充表格）
+            self.populate_result_table(self.similarity_results)
             self.apply_sort()
             QtWidgets.QMessageBox.information(self, "重命名完成", f"成功重命名 {renamed_count} 个文件")
     
     def open_in_file_manager(self):
         """在文件管理器中打开选中图像所在的文件夹"""
-        selected_rows = set(item.row() for item in self.result_table.selectedItems())
+        selected_rows = self.selected_result_rows()
         if not selected_rows:
             return
         
         # 获取第一个选中行的文件路径
         first_row = min(selected_rows)
-        file_path = self.result_table.item(first_row, 0).toolTip()
+        file_path = self.result_model.path(first_row)
         folder_path = os.path.dirname(file_path)
         
         # 根据操作系统打开文件夹
@@ -1127,7 +1337,7 @@ class DropArea(QtWidgets.QLabel):
         super().__init__(parent)
         self.parent = parent
         self.setAlignment(QtCore.Qt.AlignCenter)
-        self.setText("请拖放图像到这里喵<br>Drag and drop image here")
+        self.setText("请拖放图像到这里喵（可多个，双击选择）<br>Drag and drop image here")
         self.setStyleSheet("""
             QLabel {
                 border: 2px dashed #aaa;
@@ -1145,11 +1355,22 @@ class DropArea(QtWidgets.QLabel):
     def dropEvent(self, event):
         urls = event.mimeData().urls()
         if urls and len(urls) > 0:
-            file_path = str(urls[0].toLocalFile())
-            if file_path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')):
-                self.parent.set_source_image(file_path)
+            # 同时拖放多个图像时全部作为源图像（批量查询）
+            file_paths = [str(url.toLocalFile()) for url in urls]
+            file_paths = [path for path in file_paths
+                          if path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp'))]
+            if file_paths:
+                self.parent.set_source_images(file_paths)
             else:
                 QtWidgets.QMessageBox.warning(self.parent, "警告", "请拖放有效的图像文件")
+
+    def mouseDoubleClickEvent(self, event):
+        """双击选择源图像（可多选）"""
+        file_paths, _ = QtWidgets.QFileDialog.getOpenFileNames(
+            self.parent, "选择源图像（可多选）", "", "图像文件 (*.jpg *.jpeg *.png *.bmp *.gif *.webp)"
+        )
+        if file_paths:
+            self.parent.set_source_images(file_paths)
     
     def set_image(self, image_path):
         pixmap = QtGui.QPixmap(image_path)
@@ -1170,16 +1391,41 @@ class DropArea(QtWidgets.QLabel):
         super().resizeEvent(event)
 
 
+def report_startup_time(window):
+    """
+    报告从进程启动到窗口显示并进入事件循环的耗时（状态栏），超出 STARTUP_BUDGET_MS 时在控制台给出提示
+        设置环境变量 IMAGE_SIMILARITY_STARTUP_EXIT=1 时还在控制台输出耗时，并在报告后立即退出
+        （供 benchmarks/bench_startup.py 使用）
+    """
+    elapsed_ms = (time.perf_counter() - _STARTUP_TIME) * 1000
+    startup_exit = os.environ.get('IMAGE_SIMILARITY_STARTUP_EXIT') == '1'
+    if startup_exit:
+        print(f"启动耗时: {elapsed_ms:.0f} ms")
+    if elapsed_ms > STARTUP_BUDGET_MS:
+        print(f"警告: 启动耗时 {elapsed_ms:.0f} ms，超出预算 {STARTUP_BUDGET_MS} ms")
+    window.statusBar.showMessage(f"启动耗时 {elapsed_ms:.0f} ms", 5000)
+    if startup_exit:
+        window.close()
+
+
 def main():
+    # 在启动任何线程之前让工作进程不再导入本模块（见 worker_pool.use_lean_main）
+    use_lean_main('Main')
     app = QtWidgets.QApplication(sys.argv)
     
     # 应用Qt Material风格（如果可用）
-    # if HAS_QT_MATERIAL:
+    # apply_stylesheet = load_material_stylesheet()
+    # if apply_stylesheet:
     #     # 使用蓝色主题
     #     apply_stylesheet(app, theme='light_blue.xml')
     
     window = ImageSimilarityApp()
     window.show()
+    
+    # 窗口显示后再报告启动耗时、加载历史记录，并在后台启动常驻进程池
+    QtCore.QTimer.singleShot(0, lambda: report_startup_time(window))
+    QtCore.QTimer.singleShot(0, window.history_manager.load_history_deferred)
+    QtCore.QTimer.singleShot(0, window.worker_pool.start_async)
     sys.exit(app.exec_())
 
 
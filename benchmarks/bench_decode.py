@@ -0,0 +1,83 @@
+# bench_decode.py - 缩小分辨率解码的吞吐量与哈希一致性测试
+#
+# 用法:
+#   python benchmarks/bench_decode.py                 # 生成临时测试图像（默认 8192×4608 JPEG/PNG）
+#   python benchmarks/bench_decode.py D:/Textures     # 使用已有文件夹中的图像
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_processor import compute_hashes, HASH_ALGORITHMS  # noqa: E402
+from hash_engine import hamming_distances  # noqa: E402
+
+
+def generate_images(folder, count, width, height):
+    """生成带有平滑结构和噪声的测试图像，JPEG与PNG各占一半"""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        small = (rng.random((height // 64, width // 64, 3)) * 255).astype(np.uint8)
+        img = Image.fromarray(small).resize((width, height), Image.BICUBIC)
+        ext = 'jpg' if i % 2 == 0 else 'png'
+        path = os.path.join(folder, f"bench_{i}.{ext}")
+        img.save(path, quality=90) if ext == 'jpg' else img.save(path, compress_level=1)
+        paths.append(path)
+    return paths
+
+
+def hash_files(paths, fast_decode):
+    """返回 (耗时秒数, {哈希名称: 哈希列表})"""
+    hashes = {name: [] for name in HASH_ALGORITHMS}
+    start = time.perf_counter()
+    for path in paths:
+        with Image.open(path) as img:
+            for name, value in compute_hashes(img, fast_decode=fast_decode).items():
+                hashes[name].append(value)
+    return time.perf_counter() - start, hashes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较完整解码与缩小分辨率解码的哈希速度和一致性")
+    parser.add_argument('folder', nargs='?', help="测试图像文件夹，不指定时自动生成")
+    parser.add_argument('--count', type=int, default=6, help="自动生成的图像数量")
+    parser.add_argument('--width', type=int, default=8192)
+    parser.add_argument('--height', type=int, default=4608)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.folder:
+            extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+            paths = [os.path.join(args.folder, f) for f in sorted(os.listdir(args.folder))
+                     if f.lower().endswith(extensions)]
+        else:
+            print(f"生成 {args.count} 张 {args.width}×{args.height} 测试图像...")
+            paths = generate_images(temp_dir, args.count, args.width, args.height)
+
+        for label, group in (("JPEG", [p for p in paths if p.lower().endswith(('.jpg', '.jpeg'))]),
+                             ("其他", [p for p in paths if not p.lower().endswith(('.jpg', '.jpeg'))]),
+                             ("全部", paths)):
+            if not group:
+                continue
+            full_time, full_hashes = hash_files(group, fast_decode=False)
+            fast_time, fast_hashes = hash_files(group, fast_decode=True)
+
+            print(f"\n[{label}] {len(group)} 张图像")
+            print(f"  完整解码: {len(group) / full_time:8.2f} 张/秒")
+            print(f"  快速解码: {len(group) / fast_time:8.2f} 张/秒  (加速 {full_time / fast_time:.1f}×)")
+            for name in HASH_ALGORITHMS:
+                distances = np.array([
+                    int(hamming_distances(a, np.array([b], dtype=np.int64).view(np.uint64))[0])
+                    for a, b in zip(full_hashes[name], fast_hashes[name])
+                ])
+                print(f"  {name}: 完全一致 {np.mean(distances == 0) * 100:5.1f}%  "
+                      f"平均距离 {distances.mean():.2f} 位  最大距离 {distances.max()} 位")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+# bench_pipeline.py - 搜索流程的分阶段性能基准测试
+#
+# 在可复现的合成图库（见 synthetic_corpus.py）上分别计时各个阶段，输出每秒处理的图像数（表格阶段为行数）
+# 和主进程的内存峰值。结果保存为JSON后可作为基线，之后的运行与基线比较，
+# 吞吐量下降或内存峰值增长超出容差时返回非零退出码，可用于 CI。
+#
+# 用法:
+#   python benchmarks/bench_pipeline.py --output baseline.json          # 记录基线
+#   python benchmarks/bench_pipeline.py --baseline baseline.json        # 与基线比较
+#   python benchmarks/bench_pipeline.py --stages scan,hash_record,apply_sort --count 1000 --corpus D:/bench_corpus
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+from synthetic_corpus import add_corpus_arguments, load_or_generate, params_from_args  # noqa: E402
+
+RESULT_VERSION = 1
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测函数在主进程中对损坏文件输出的错误信息（工作进程的输出不受影响）"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        yield
+
+
+class BenchContext:
+    """各阶段共用的测试数据：图库文件、抽样、临时目录、进程池和界面窗口（后两者在第一次使用时创建）"""
+
+    def __init__(self, root, manifest, work_dir, workers, sample, rows):
+        self.root = root
+        self.manifest = manifest
+        self.work_dir = work_dir
+        self.workers = workers
+        self.rows = rows
+        self.paths = [os.path.join(root, item['path']) for item in manifest['files']]
+        self.entries = []
+        for path in self.paths:
+            stat = os.stat(path)
+            self.entries.append((path, stat.st_size, stat.st_mtime))
+        # 逐文件阶段使用固定的抽样（各类文件按比例出现），源图像为第一张原图
+        self.sample = random.Random(0).sample(self.entries, min(sample, len(self.entries)))
+        self.source = self.paths[0]
+        self._worker_pool = None
+        self._window = None
+        self._file_counter = 0
+
+    @property
+    def worker_pool(self):
+        if self._worker_pool is None:
+            from worker_pool import WorkerPool
+            self._worker_pool = WorkerPool(self.workers)
+            self._worker_pool.get()  # 进程池的启动不计入各阶段的耗时
+        return self._worker_pool
+
+    @property
+    def window(self):
+        """主窗口（表格阶段直接调用其方法）"""
+        if self._window is None:
+            os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')  # 无显示器时也能运行
+            from qtpy import QtWidgets
+            self._app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+            import Main
+            self._window = Main.ImageSimilarityApp()
+            self._window.resize(1280, 900)
+            self._window.show()  # 显示并完成布局后 repaint 才会绘制表格
+            self._app.processEvents()
+        return self._window
+
+    def fresh_path(self, name):
+        """临时目录中的新文件路径（冷启动阶段每次运行使用新的索引或缓存）"""
+        self._file_counter += 1
+        return os.path.join(self.work_dir, f"{self._file_counter}_{name}")
+
+    def synthetic_results(self):
+        """由图库中可解码的文件构建的 rows 条结果（相似度和修改时间随机，种子固定）"""
+        from result_store import ResultSet
+        rng = np.random.default_rng(0)
+        files = self.manifest['files']
+        readable = np.array([i for i, item in enumerate(files) if item['kind'] != 'corrupt'])
+        index = readable[np.arange(self.rows) % len(readable)]
+        paths = [self.paths[i] for i in index.tolist()]
+        return ResultSet.from_columns(
+            paths, rng.uniform(1.5e9, 1.7e9, self.rows),
+            np.array([files[i]['width'] for i in index.tolist()]), np.array([files[i]['height'] for i in index.tolist()]),
+            rng.random(self.rows)
+        )
+
+    def close(self):
+        if self._window is not None:
+            self._window.close()
+        if self._worker_pool is not None:
+            self._worker_pool.shutdown()
+
+
+# ---- 各阶段 ----
+# 每个阶段函数完成不计时的准备工作，返回计时运行的函数；运行函数返回处理的数量
+
+def stage_scan(ctx):
+    from file_scanner import scan_images
+
+    def run():
+        return sum(len(batch) for batch in scan_images([ctx.root]))
+    return run
+
+
+def stage_process_image(ctx):
+    """逐文件：解码、计算单个哈希并与源哈希比较，返回结果字典（单进程）"""
+    import imagehash
+    from PIL import Image
+    from image_processor import process_image
+    with Image.open(ctx.source) as img:
+        source_hash = imagehash.phash(img.convert('RGB'))
+
+    def run():
+        with quiet():
+            for path, _, _ in ctx.sample:
+                process_image(path, source_hash, imagehash.phash)
+        return len(ctx.sample)
+    return run
+
+
+def _per_file(ctx, func):
+    def run():
+        with quiet():
+            for entry in ctx.sample:
+                try:
+                    func(entry)
+                except Exception:
+                    pass  # 损坏的文件
+        return len(ctx.sample)
+    return run
+
+
+def stage_hash_record(ctx):
+    """逐文件：一次解码计算三种哈希（哈希搜索的工作进程任务）"""
+    from image_processor import hash_record
+    return _per_file(ctx, hash_record)
+
+
+def stage_ssim_record(ctx):
+    """逐文件：原图SSIM（不使用缩略图缓存时的工作进程任务，取代旧的 process_image_ssim）"""
+    from image_processor import get_ssim_source, ssim_record
+    get_ssim_source(ctx.source)  # 源图像的预处理在每个工作进程中只做一次，不计入
+    return _per_file(ctx, lambda entry: ssim_record(entry, ctx.source))
+
+
+def stage_calculate_ssim(ctx):
+    """逐文件：两张图像各自解码后计算完整的SSIM"""
+    from ssim_calculator import calculate_ssim
+    return _per_file(ctx, lambda entry: calculate_ssim(ctx.source, entry[0]))
+
+
+def stage_ssim_thumbnail(ctx):
+    """逐文件：生成SSIM缩略图缓存使用的规范缩略图"""
+    from image_processor import compute_ssim_thumbnail
+    return _per_file(ctx, compute_ssim_thumbnail)
+
+
+def _engine_search(ctx, index_file=None, thumbs=None, **params):
+    from search_engine import SearchEngine
+    from hash_index import HashIndex
+    from thumbnail_cache import ThumbnailCache
+    hash_index = HashIndex(index_file) if index_file else None
+    thumbnail_cache = ThumbnailCache(thumbs + ".u8", thumbs + ".db") if thumbs else None
+    try:
+        with quiet(), SearchEngine(hash_index, thumbnail_cache, ctx.worker_pool) as engine:
+            if params.pop('duplicates', False):
+                return engine.find_duplicates([ctx.root], **params)['total_files']
+            return engine.search(ctx.source, [ctx.root], **params)['total_files']
+    finally:
+        for resource in (hash_index, thumbnail_cache):
+            if resource is not None:
+                resource.close()
+
+
+def stage_search_hash_cold(ctx):
+    """完整的哈希搜索（进程池，新建索引：扫描、解码、写入索引、排名）"""
+    index_file = ctx.fresh_path('index.db')
+    ctx.worker_pool
+    return lambda: _engine_search(ctx, index_file, algorithm='hash')
+
+
+def stage_search_hash_warm(ctx):
+    """完整的哈希搜索（索引已包含全部文件）"""
+    index_file = os.path.join(ctx.work_dir, 'warm_index.db')
+    if not os.path.exists(index_file):
+        _engine_search(ctx, index_file, algorithm='hash')
+    return lambda: _engine_search(ctx, index_file, algorithm='hash')
+
+
+def stage_search_ssim_cached(ctx):
+    """完整的SSIM搜索（进程池，新建缩略图缓存：生成缩略图、计算SSIM）"""
+    thumbs = ctx.fresh_path('thumbs')
+    ctx.worker_pool
+    return lambda: _engine_search(ctx, thumbs=thumbs, algorithm='ssim', ssim_cache=True)
+
+
+def stage_find_duplicates(ctx):
+    """查找重复图片（索引已包含全部文件：自连接和分组）"""
+    index_file = os.path.join(ctx.work_dir, 'warm_index.db')
+    if not os.path.exists(index_file):
+        _engine_search(ctx, index_file, algorithm='hash')
+    return lambda: _engine_search(ctx, index_file, duplicates=True)
+
+
+def stage_populate_result_table(ctx):
+    """主窗口显示 rows 条结果并绘制可见的行"""
+    window = ctx.window
+    results = ctx.synthetic_results()
+    window.populate_result_table(None)
+
+    def run():
+        window.similarity_results = results
+        window.populate_result_table(results)
+        window.result_table.viewport().repaint()
+        return len(results)
+    return run
+
+
+def stage_apply_sort(ctx):
+    """依次应用全部排序方式（每种排序方式第一次计算排序键）"""
+    from result_model import SORT_MODES
+    window = ctx.window
+    results = ctx.synthetic_results()
+    window.similarity_results = results
+    window.populate_result_table(results)
+    window.sort_combo.setEnabled(True)
+
+    def run():
+        for mode in range(len(SORT_MODES)):
+            window.sort_combo.setCurrentIndex(mode)
+            window.apply_sort()
+            window.result_table.viewport().repaint()
+        return len(results) * len(SORT_MODES)
+    return run
+
+
+# 名称 → (阶段函数, 计数单位, 使用的数据)
+STAGES = {
+    'scan': (stage_scan, 'images', "全部文件"),
+    'process_image': (stage_process_image, 'images', "抽样"),
+    'hash_record': (stage_hash_record, 'images', "抽样"),
+    'ssim_record': (stage_ssim_record, 'images', "抽样"),
+    'calculate_ssim': (stage_calculate_ssim, 'images', "抽样"),
+    'ssim_thumbnail': (stage_ssim_thumbnail, 'images', "抽样"),
+    'search_hash_cold': (stage_search_hash_cold, 'images', "全部文件"),
+    'search_hash_warm': (stage_search_hash_warm, 'images', "全部文件"),
+    'search_ssim_cached': (stage_search_ssim_cached, 'images', "全部文件"),
+    'find_duplicates': (stage_find_duplicates, 'images', "全部文件"),
+    'populate_result_table': (stage_populate_result_table, 'rows', "合成结果"),
+    'apply_sort': (stage_apply_sort, 'rows', "合成结果 × 排序方式"),
+}
+
+
+def measure(ctx, stage_func, repeat):
+    """
+    运行一个阶段：先在 tracemalloc 下运行一次（同时作为预热）记录内存峰值，再计时运行 repeat 次
+
+    返回值:
+        {'items', 'seconds'（中位数）, 'runs', 'per_sec', 'peak_memory_mb'}
+    """
+    run = stage_func(ctx)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    runs = []
+    items = 0
+    for _ in range(repeat):
+        run = stage_func(ctx)
+        start = time.perf_counter()
+        items = run()
+        runs.append(time.perf_counter() - start)
+    seconds = statistics.median(runs)
+    return {
+        'items': items,
+        'seconds': round(seconds, 6),
+        'runs': [round(value, 6) for value in runs],
+        'per_sec': round(items / seconds, 3) if seconds > 0 else None,
+        'peak_memory_mb': round(peak / (1 << 20), 3),
+    }
+
+
+def environment():
+    import PIL
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    与基线比较各阶段的吞吐量和内存峰值
+
+    返回值:
+        超出容差的 [(阶段名称, 说明)]
+    """
+    if current['corpus']['params'] != baseline.get('corpus', {}).get('params'):
+        print("注意: 基线使用的图库参数不同，比较结果仅供参考")
+    regressions = []
+    print(f"\n{'阶段':<24}{'基线/秒':>12}{'当前/秒':>12}{'变化':>9}{'基线内存MB':>12}{'当前内存MB':>12}")
+    for name, stage in current['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None or not base.get('per_sec') or not stage.get('per_sec'):
+            continue
+        change = stage['per_sec'] / base['per_sec'] - 1
+        mark = ""
+        if change < -tolerance:
+            mark = "  吞吐量下降"
+            regressions.append((name, f"吞吐量下降 {-change:.1%}"))
+        # 内存峰值很小时的波动不计
+        if stage['peak_memory_mb'] > base['peak_memory_mb'] * (1 + tolerance) + 1:
+            mark += "  内存增长"
+            regressions.append((name, f"内存峰值 {base['peak_memory_mb']:.1f} → {stage['peak_memory_mb']:.1f} MB"))
+        print(f"{name:<24}{base['per_sec']:>12.1f}{stage['per_sec']:>12.1f}{change:>+9.1%}"
+              f"{base['peak_memory_mb']:>12.1f}{stage['peak_memory_mb']:>12.1f}{mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在合成图库上分阶段测量吞吐量和内存峰值")
+    add_corpus_arguments(parser)
+    parser.add_argument('--corpus', help="图库文件夹（参数相同时复用，默认使用临时文件夹）")
+    parser.add_argument('--stages', type=lambda text: text.split(','), default=list(STAGES),
+                        help=f"要运行的阶段，逗号分隔（默认全部: {','.join(STAGES)}）")
+    parser.add_argument('--repeat', type=int, default=3, help="每个阶段的计时次数，取中位数（默认3）")
+    parser.add_argument('--sample', type=int, default=100, help="逐文件阶段使用的文件数（默认100）")
+    parser.add_argument('--rows', type=int, default=100000, help="表格阶段的结果行数（默认100000）")
+    parser.add_argument('--workers', type=int, help="工作进程数（默认CPU核心数）")
+    parser.add_argument('--output', help="将结果保存为JSON文件（可作为之后的基线）")
+    parser.add_argument('--baseline', help="与之比较的基线JSON文件")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="允许的吞吐量下降和内存增长比例（默认0.15）")
+    args = parser.parse_args(argv)
+    for name in args.stages:
+        if name not in STAGES:
+            parser.error(f"未知的阶段: {name}")
+
+    params = params_from_args(args)
+    temp_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    corpus_dir = args.corpus or os.path.join(temp_dir, 'corpus')
+    work_dir = os.path.join(temp_dir, 'work')
+    os.makedirs(work_dir)
+    ctx = None
+    try:
+        print(f"准备图库: {corpus_dir}")
+        manifest = load_or_generate(corpus_dir, params)
+        ctx = BenchContext(corpus_dir, manifest, work_dir, args.workers, args.sample, args.rows)
+        kinds = {}
+        for item in manifest['files']:
+            kinds[item['kind']] = kinds.get(item['kind'], 0) + 1
+
+        result = {
+            'version': RESULT_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': dict(environment(), workers=args.workers or os.cpu_count()),
+            'corpus': {'params': params, 'files': len(manifest['files']), 'kinds': kinds,
+                       'sample': len(ctx.sample), 'rows': args.rows},
+            'repeat': args.repeat,
+            'stages': {},
+        }
+        print(f"{'阶段':<24}{'数量':>9}{'单位':>8}{'耗时(秒)':>11}{'每秒':>12}{'内存峰值MB':>12}  数据")
+        for name in args.stages:
+            stage_func, unit, data = STAGES[name]
+            stage = measure(ctx, stage_func, args.repeat)
+            stage['unit'] = unit
+            result['stages'][name] = stage
+            print(f"{name:<24}{stage['items']:>9}{unit:>8}{stage['seconds']:>11.3f}"
+                  f"{stage['per_sec'] or 0:>12.1f}{stage['peak_memory_mb']:>12.1f}  {data}")
+    finally:
+        if ctx is not None:
+            ctx.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} 项超出容差 {args.tolerance:.0%}:")
+            for name, message in regressions:
+                print(f"  {name}: {message}")
+            return 1
+        print(f"\n全部阶段均在容差 {args.tolerance:.0%} 以内")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# bench_startup.py - GUI启动时间基准测试
+#
+# 多次启动 Main.py（设置 IMAGE_SIMILARITY_STARTUP_EXIT=1，窗口显示后立即退出），
+# 统计进程总耗时和程序自身报告的启动耗时（见 Main.report_startup_time）
+#
+# 用法:
+#   python benchmarks/bench_startup.py                 # 运行5次，输出中位数
+#   python benchmarks/bench_startup.py --budget 800    # 启动耗时中位数超出800毫秒时返回非零退出码
+#   python benchmarks/bench_startup.py --imports 15    # 额外列出导入耗时最多的15个模块
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_SCRIPT = os.path.join(REPO_DIR, 'Main.py')
+STARTUP_PATTERN = re.compile(r'启动耗时: (\d+) ms')
+
+
+def _environment():
+    env = dict(os.environ)
+    env['IMAGE_SIMILARITY_STARTUP_EXIT'] = '1'
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')  # 无显示器时也能运行
+    return env
+
+
+def run_once(extra_args=()):
+    """
+    启动一次程序
+
+    返回值:
+        (进程总耗时毫秒, 程序报告的启动耗时毫秒, 标准错误输出)
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *extra_args, MAIN_SCRIPT], cwd=REPO_DIR, env=_environment(),
+        capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=120
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    match = STARTUP_PATTERN.search(proc.stdout)
+    if proc.returncode != 0 or match is None:
+        raise RuntimeError(f"程序未正常启动（退出码 {proc.returncode}）:\n{proc.stdout}\n{proc.stderr}")
+    return wall_ms, int(match.group(1)), proc.stderr
+
+
+def top_imports(stderr, count):
+    """解析 -X importtime 的输出，返回累计耗时最多的模块 [(累计微秒, 模块名)]"""
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # 表头
+        timings.append((int(parts[1]), parts[2].strip()))
+    timings.sort(reverse=True)
+    return timings[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GUI启动时间基准测试")
+    parser.add_argument('--runs', type=int, default=5, help="启动次数（默认5）")
+    parser.add_argument('--budget', type=float, help="启动耗时预算（毫秒），中位数超出时返回非零退出码")
+    parser.add_argument('--imports', type=int, default=0, metavar='N', help="列出导入耗时最多的N个模块")
+    args = parser.parse_args(argv)
+
+    run_once()  # 预热一次，排除首次读取磁盘和生成.pyc的影响
+    wall_times, startup_times = [], []
+    for _ in range(args.runs):
+        wall_ms, startup_ms, _ = run_once()
+        wall_times.append(wall_ms)
+        startup_times.append(startup_ms)
+
+    startup_median = statistics.median(startup_times)
+    print(f"运行次数: {args.runs}")
+    print(f"进程总耗时中位数: {statistics.median(wall_times):.0f} ms（含解释器启动和退出）")
+    print(f"启动耗时中位数: {startup_median:.0f} ms（最小 {min(startup_times)} ms，最大 {max(startup_times)} ms）")
+
+    if args.imports:
+        _, _, stderr = run_once(('-X', 'importtime'))
+        print(f"导入耗时最多的{args.imports}个模块（累计）:")
+        for cumulative_us, name in top_imports(stderr, args.imports):
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if args.budget is not None and startup_median > args.budget:
+        print(f"超出启动耗时预算 {args.budget:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
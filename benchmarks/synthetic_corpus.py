@@ -0,0 +1,227 @@
+# synthetic_corpus.py - 可复现的合成测试图库
+#
+# 按固定随机种子生成测试图像：原图带有平滑结构和细节噪声（接近贴图的频谱），
+# 其中一部分生成近似重复的变体（缩放、重新压缩、亮度调整、裁剪）、字节完全相同的副本和损坏的文件，
+# 分散在多层子文件夹中。同样的参数总是生成同样的内容，清单 corpus.json 记录每个文件的来源。
+#
+# 用法:
+#   python benchmarks/synthetic_corpus.py D:/bench_corpus --count 500 --sizes 1024x1024,2048x2048 --formats png,jpg
+import os
+import sys
+import json
+import math
+import shutil
+import argparse
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+MANIFEST_NAME = 'corpus.json'
+DEFAULT_SIZES = ((512, 512), (1024, 1024))
+DEFAULT_FORMATS = ('png', 'jpg')
+VARIANT_KINDS = ('resize', 'recompress', 'brightness', 'crop')
+# 格式 → (扩展名, PIL保存参数)
+FORMATS = {
+    'png': ('png', {'compress_level': 1}),
+    'jpg': ('jpg', {'quality': 90}),
+    'bmp': ('bmp', {}),
+    'webp': ('webp', {'quality': 85}),
+    'gif': ('gif', {}),
+}
+
+
+def corpus_params(count=200, sizes=DEFAULT_SIZES, formats=DEFAULT_FORMATS, variant_ratio=0.3,
+                  copy_ratio=0.1, corrupt_ratio=0.02, depth=2, fanout=4, seed=0):
+    """
+    图库参数（保存在清单中，参数相同时可直接复用已生成的图库）
+        count: 原图数量；variant_ratio / copy_ratio / corrupt_ratio 为相对原图数量的比例
+        depth, fanout: 子文件夹的层数和每层的分支数
+    """
+    for name in formats:
+        if name not in FORMATS:
+            raise ValueError(f"不支持的格式: {name}")
+    return {
+        'count': count, 'sizes': [list(size) for size in sizes], 'formats': list(formats),
+        'variant_ratio': variant_ratio, 'copy_ratio': copy_ratio, 'corrupt_ratio': corrupt_ratio,
+        'depth': depth, 'fanout': fanout, 'seed': seed,
+    }
+
+
+def _texture(rng, width, height):
+    """低分辨率随机色块双三次放大后叠加细节噪声"""
+    cells = (max(height // 64, 2), max(width // 64, 2), 3)
+    base = Image.fromarray((rng.random(cells) * 255).astype(np.uint8)).resize((width, height), Image.BICUBIC)
+    noise = rng.standard_normal((height, width, 3), dtype=np.float32) * 12
+    return Image.fromarray(np.clip(np.asarray(base, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+
+def _variant(img, kind, rng):
+    width, height = img.size
+    if kind == 'resize':
+        scale = rng.choice([0.5, 0.75])
+        return img.resize((max(int(width * scale), 1), max(int(height * scale), 1)), Image.BILINEAR)
+    if kind == 'brightness':
+        return ImageEnhance.Brightness(img).enhance(rng.uniform(0.85, 1.15))
+    if kind == 'crop':
+        dx, dy = int(width * 0.03), int(height * 0.03)
+        return img.crop((dx, dy, width - dx, height - dy))
+    return img  # recompress：内容不变，以不同质量重新保存
+
+
+def _folder(index, depth, fanout):
+    parts = []
+    for _ in range(depth):
+        parts.append(f"dir_{index % fanout}")
+        index //= fanout
+    return os.path.join(*parts) if parts else ''
+
+
+def _save(img, folder, name, fmt, quality=None):
+    ext, options = FORMATS[fmt]
+    if quality is not None and 'quality' in options:
+        options = dict(options, quality=quality)
+    if fmt == 'gif':
+        img = img.convert('P', palette=Image.ADAPTIVE)
+    elif fmt == 'jpg' and img.mode != 'RGB':
+        img = img.convert('RGB')
+    rel_path = os.path.join(folder, f"{name}.{ext}")
+    img.save(rel_path, **options)
+    return rel_path
+
+
+def generate_corpus(root, params):
+    """
+    在 root 中生成图库并写入清单
+
+    返回值:
+        清单字典 {'params', 'files': [{'path', 'kind', 'of', 'width', 'height'}]}，path 为相对 root 的路径；
+        kind 为 original / variant / copy / corrupt，of 为变体、副本或损坏文件对应的原图
+    """
+    rng = np.random.default_rng(params['seed'])
+    sizes = [tuple(size) for size in params['sizes']]
+    formats = params['formats']
+    depth, fanout = params['depth'], params['fanout']
+    files = []
+    originals = []
+
+    def scaled(ratio):
+        # 比例不为0时至少生成一个
+        return math.ceil(params['count'] * ratio)
+
+    cwd = os.getcwd()
+    os.makedirs(root, exist_ok=True)
+    os.chdir(root)
+    try:
+        for i in range(params['count']):
+            width, height = sizes[i % len(sizes)]
+            fmt = formats[i % len(formats)]
+            folder = _folder(i, depth, fanout)
+            os.makedirs(folder or '.', exist_ok=True)
+            img = _texture(rng, width, height)
+            path = _save(img, folder, f"orig_{i:05d}", fmt)
+            originals.append((path, img, fmt))
+            files.append({'path': path, 'kind': 'original', 'of': None, 'width': width, 'height': height})
+
+        def pick():
+            return originals[int(rng.integers(len(originals)))]
+
+        for i in range(scaled(params['variant_ratio'])):
+            source_path, img, fmt = pick()
+            kind = VARIANT_KINDS[i % len(VARIANT_KINDS)]
+            variant = _variant(img, kind, rng)
+            folder = _folder(int(rng.integers(fanout ** depth)), depth, fanout)
+            os.makedirs(folder or '.', exist_ok=True)
+            # 重新压缩的变体统一保存为较低质量的JPEG
+            path = (_save(variant, folder, f"var_{i:05d}_{kind}", 'jpg', quality=70) if kind == 'recompress'
+                    else _save(variant, folder, f"var_{i:05d}_{kind}", fmt))
+            files.append({'path': path, 'kind': 'variant', 'of': source_path,
+                          'width': variant.size[0], 'height': variant.size[1]})
+
+        for i in range(scaled(params['copy_ratio'])):
+            source_path, img, _ = pick()
+            folder = _folder(int(rng.integers(fanout ** depth)), depth, fanout)
+            os.makedirs(folder or '.', exist_ok=True)
+            path = os.path.join(folder, f"copy_{i:05d}{os.path.splitext(source_path)[1]}")
+            shutil.copyfile(source_path, path)
+            files.append({'path': path, 'kind': 'copy', 'of': source_path, 'width': img.size[0], 'height': img.size[1]})
+
+        for i in range(scaled(params['corrupt_ratio'])):
+            source_path, _, _ = pick()
+            folder = _folder(int(rng.integers(fanout ** depth)), depth, fanout)
+            os.makedirs(folder or '.', exist_ok=True)
+            path = os.path.join(folder, f"corrupt_{i:05d}{os.path.splitext(source_path)[1]}")
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            # 一半截断为前几个字节（文件头完整但数据缺失），一半为随机字节
+            data = data[:max(len(data) // 8, 64)] if i % 2 == 0 else rng.bytes(4096)
+            with open(path, 'wb') as f:
+                f.write(data)
+            files.append({'path': path, 'kind': 'corrupt', 'of': source_path, 'width': 0, 'height': 0})
+    finally:
+        os.chdir(cwd)
+
+    manifest = {'params': params, 'files': files}
+    with open(os.path.join(root, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def load_or_generate(root, params):
+    """root 中已有参数相同的图库时直接使用，否则清空后重新生成"""
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('params') == params:
+            return manifest
+        shutil.rmtree(root)  # 参数不同的旧图库（由本模块生成）
+    elif os.path.isdir(root) and os.listdir(root):
+        raise ValueError(f"文件夹不为空且不是合成图库: {root}")
+    return generate_corpus(root, params)
+
+
+def parse_sizes(text):
+    """'1024x1024,2048x1024' → [(1024, 1024), (2048, 1024)]"""
+    sizes = []
+    for part in text.split(','):
+        width, _, height = part.lower().partition('x')
+        sizes.append((int(width), int(height or width)))
+    return sizes
+
+
+def add_corpus_arguments(parser):
+    """添加图库参数（bench_pipeline.py 共用）"""
+    parser.add_argument('--count', type=int, default=200, help="原图数量（默认200）")
+    parser.add_argument('--sizes', type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help="原图尺寸，逗号分隔（默认 512x512,1024x1024）")
+    parser.add_argument('--formats', type=lambda text: text.split(','), default=list(DEFAULT_FORMATS),
+                        help=f"原图格式，逗号分隔，可选 {','.join(FORMATS)}（默认 png,jpg）")
+    parser.add_argument('--variants', type=float, default=0.3, help="近似重复变体的比例（默认0.3）")
+    parser.add_argument('--copies', type=float, default=0.1, help="字节完全相同的副本的比例（默认0.1）")
+    parser.add_argument('--corrupt', type=float, default=0.02, help="损坏文件的比例（默认0.02）")
+    parser.add_argument('--depth', type=int, default=2, help="子文件夹层数（默认2）")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子（默认0）")
+
+
+def params_from_args(args):
+    return corpus_params(args.count, args.sizes, args.formats, args.variants, args.copies, args.corrupt,
+                         depth=args.depth, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成可复现的合成测试图库")
+    parser.add_argument('folder', help="输出文件夹（已有参数相同的图库时不重新生成）")
+    add_corpus_arguments(parser)
+    args = parser.parse_args(argv)
+
+    manifest = load_or_generate(args.folder, params_from_args(args))
+    kinds = {}
+    for item in manifest['files']:
+        kinds[item['kind']] = kinds.get(item['kind'], 0) + 1
+    print(f"{args.folder}: 共 {len(manifest['files'])} 个文件 "
+          + "，".join(f"{kind} {count}" for kind, count in kinds.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# content_digest.py - 字节完全相同文件的快速识别模块
+#
+# 图库中常有同一文件的多个副本，它们的哈希和尺寸完全相同，不必逐个解码。
+# 新文件先按文件大小与索引中的文件（以及本次新增的其他文件）比较，大小相同时比较部分摘要（首尾各64KB），
+# 部分摘要也相同时再比较完整摘要；确认内容相同后直接复用已有记录。摘要随记录保存在索引中，之后的比较无需再次读取文件
+import os
+import hashlib
+import numpy as np
+
+PARTIAL_BYTES = 64 * 1024  # 部分摘要读取文件开头和结尾各这么多字节
+DIGEST_SIZE = 16
+READ_SIZE = 1 << 20
+
+
+def partial_digest(path, size):
+    """
+    文件的部分摘要（开头和结尾各 PARTIAL_BYTES 字节，连同文件大小）
+        不超过 2 × PARTIAL_BYTES 的小文件读取全部内容，此时部分摘要即完整摘要
+    """
+    digest = hashlib.blake2b(size.to_bytes(8, 'little'), digest_size=DIGEST_SIZE)
+    with open(path, 'rb') as f:
+        if size <= 2 * PARTIAL_BYTES:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(PARTIAL_BYTES))
+            f.seek(-PARTIAL_BYTES, os.SEEK_END)
+            digest.update(f.read(PARTIAL_BYTES))
+    return digest.digest()
+
+
+def full_digest(path, size):
+    """文件全部内容的摘要（小文件与部分摘要相同）"""
+    if size <= 2 * PARTIAL_BYTES:
+        return partial_digest(path, size)
+    digest = hashlib.blake2b(size.to_bytes(8, 'little'), digest_size=DIGEST_SIZE)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def copy_record(entry, snapshot, row, digests=(None, None)):
+    """
+    为内容与索引第 row 行相同的 (路径, 文件大小, 修改时间) 条目生成索引记录（尺寸和哈希直接复制）
+        digests: 该条目的 (部分摘要, 完整摘要)，见 ExactCopyFinder.digests
+    """
+    path, size, mtime = entry
+    record = {'path': path, 'size': size, 'mtime': mtime,
+              'width': int(snapshot.width[row]), 'height': int(snapshot.height[row]),
+              'partial_digest': digests[0], 'digest': digests[1]}
+    record.update(snapshot.hashes(row))
+    return record
+
+
+class ExactCopyFinder:
+    """
+    在解码之前查找内容完全相同的已知文件
+        snapshot: 哈希索引快照（见 hash_index.HashSnapshot），使用其中的文件大小和已保存的摘要；
+                  索引中没有摘要的文件在需要时读取（文件已变化时跳过）
+        每个新文件都会登记，之后大小相同的新文件也与它比较（同一次处理中的多个副本只解码一次）
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        # 索引中有效行按文件大小排序，按大小查找候选时二分查找
+        rows = np.flatnonzero(snapshot.valid)
+        order = np.argsort(snapshot.size[rows], kind='stable')
+        self._rows = rows[order]
+        self._sizes = snapshot.size[self._rows]
+        self._index_groups = {}  # {文件大小: {部分摘要: [索引行号]}}，第一次遇到该大小的新文件时建立
+        self._new_groups = {}  # {文件大小: {部分摘要: [本次新增的条目]}}，尚未计算摘要的条目在None下
+        self._digests = {}  # {路径: [部分摘要, 完整摘要]}，本次为新文件计算的摘要
+        self._row_digests = {}  # {行号: [路径, 文件大小, 修改时间, 部分摘要, 完整摘要]}，为索引行计算的摘要
+
+    def index_updates(self):
+        """为索引中已有的行新计算的摘要，[(路径, 文件大小, 修改时间, 部分摘要, 完整摘要)]，用于 HashIndex.store_digests"""
+        return [tuple(item) for item in self._row_digests.values() if item[3] != b'']
+
+    def digests(self, path):
+        """本次为该路径计算的 (部分摘要, 完整摘要)，没有计算过的为None"""
+        return tuple(self._digests.get(path, (None, None)))
+
+    def match(self, entry, register=True):
+        """
+        查找与 (路径, 文件大小, 修改时间) 条目内容完全相同的文件
+            只有大小相同的文件才读取部分摘要，部分摘要也相同时才读取完整摘要
+            register: 没有找到时是否将条目登记为新文件（只查询、不会被解码的文件传入False）
+
+        返回值:
+            (row, original)
+            row: 内容相同的索引行号，没有时为None
+            original: 内容相同的本次新增条目（其记录尚未计算完成），没有时为None
+            都为None时该条目已登记为新文件，需要正常解码
+        """
+        size = entry[1]
+        if size <= 0:
+            return None, None
+        lo, hi = np.searchsorted(self._sizes, [size, size + 1])
+        new_group = self._new_groups.setdefault(size, {})
+        if hi == lo and not new_group:
+            # 大小唯一：不读取文件，登记后等之后出现大小相同的文件时再计算摘要
+            if register:
+                new_group[None] = [entry]
+            return None, None
+        try:
+            partial = self._entry_digest(entry, 0)
+            for row in self._index_group(size, lo, hi).get(partial, ()):
+                if self._row_digest(row, 1) == self._entry_digest(entry, 1):
+                    return row, None
+            for other in self._keyed_group(new_group).get(partial, ()):
+                if self._entry_digest(other, 1) == self._entry_digest(entry, 1):
+                    return None, other
+        except OSError:
+            return None, None  # 无法读取的文件交给解码流程报告错误
+        if register:
+            new_group.setdefault(partial, []).append(entry)
+        return None, None
+
+    def _index_group(self, size, lo, hi):
+        group = self._index_groups.get(size)
+        if group is None:
+            group = self._index_groups[size] = {}
+            for row in self._rows[lo:hi].tolist():
+                try:
+                    partial = self._row_digest(row, 0)
+                except OSError:
+                    continue
+                if partial is not None:
+                    group.setdefault(partial, []).append(row)
+        return group
+
+    def _keyed_group(self, group):
+        # 大小唯一时登记的条目此时才计算部分摘要
+        for entry in group.pop(None, []):
+            try:
+                group.setdefault(self._entry_digest(entry, 0), []).append(entry)
+            except OSError:
+                pass
+        return group
+
+    def _entry_digest(self, entry, kind):
+        path, size, _ = entry
+        digests = self._digests.setdefault(path, [None, None])
+        if digests[kind] is None:
+            digests[kind] = partial_digest(path, size) if kind == 0 else full_digest(path, size)
+            if size <= 2 * PARTIAL_BYTES:
+                digests[1 - kind] = digests[kind]
+        return digests[kind]
+
+    def _row_digest(self, row, kind):
+        """索引行的摘要：优先使用索引中保存的摘要，否则在文件未变化时读取计算（文件已变化时返回None）"""
+        snapshot = self.snapshot
+        stored = (snapshot.partial_digest if kind == 0 else snapshot.digest)[row]
+        if stored is not None:
+            return stored
+        path = snapshot.paths[row]
+        size, mtime = int(snapshot.size[row]), float(snapshot.mtime[row])
+        cached = self._row_digests.get(row)
+        if cached is None:
+            cached = self._row_digests[row] = [path, size, mtime, None, None]
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat is None or (stat.st_size, stat.st_mtime) != (size, mtime):
+                # 索引中的记录不再对应磁盘上的内容，无法比较
+                cached[3] = cached[4] = b''
+        if cached[3 + kind] is None:
+            cached[3 + kind] = partial_digest(path, size) if kind == 0 else full_digest(path, size)
+            if size <= 2 * PARTIAL_BYTES:
+                cached[4 - kind] = cached[3 + kind]
+        return cached[3 + kind] or None
@@ -0,0 +1,170 @@
+# duplicate_finder.py - 重复图片分组模块
+#
+# 在整个图库中查找近似重复的图片，不需要源图像：基于索引中的感知哈希做多索引哈希自连接，
+# 相似的图片对连成分组，每组给出建议保留的文件。也可以在命令行中运行:
+#   python -m duplicate_finder dir1 dir2 --algo phash --min 0.9 --json
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from hash_engine import HASH_BITS, connected_components, max_distance_for, near_duplicate_pairs, popcount
+from result_store import ResultSet
+
+# 默认的重复判定阈值：64位哈希中最多6位不同
+DUPLICATE_SIMILARITY = 0.9
+# 允许的最小阈值：阈值越低自连接的搜索半径越大，0.8（段内半径3）以下邻近掩码数量急剧增加，大图库耗时过长
+MIN_DUPLICATE_SIMILARITY = 0.8
+
+
+def cluster_duplicates(snapshot, rows, hash_name='phash', min_similarity=DUPLICATE_SIMILARITY,
+                       path_table=None, on_step=None):
+    """
+    将哈希相似的文件连成分组（连通分量：A与B相似、B与C相似时三者在同一组）
+        snapshot, rows: 索引快照和参与比较的行号
+        min_similarity: 两个文件直接相连所需的最小哈希相似度
+        on_step(done, total): 自连接的进度回调，见 hash_engine.near_duplicate_pairs
+
+    返回值:
+        (results, wasted_bytes)
+        results: ResultSet，只包含有重复的文件，按分组排列（可释放空间多的组在前）；
+                 组内按 分辨率从高到低、修改时间从新到旧 排列，第一个为建议保留的文件，
+                 similarity 为与该文件的哈希相似度
+        wasted_bytes: 各组删除其余文件后可释放的字节数（与分组编号对应）
+    """
+    if not MIN_DUPLICATE_SIMILARITY <= min_similarity <= 1.0:
+        raise ValueError(f"重复判定阈值应在 {MIN_DUPLICATE_SIMILARITY} 到 1.0 之间: {min_similarity}")
+    rows = np.asarray(rows, dtype=np.int64)
+    hashes = snapshot.packed[hash_name][rows]
+    # 哈希完全相同的文件（如纯色贴图的多个副本）先合并为一个条目，自连接只在不同的哈希之间进行
+    unique_hashes, inverse = np.unique(hashes, return_inverse=True)
+    a, b = near_duplicate_pairs(unique_hashes, max_distance_for(min_similarity), on_step=on_step)
+    labels = connected_components(len(unique_hashes), a, b)[inverse.reshape(-1)]
+
+    _, group, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    group = group.reshape(-1)
+    member = sizes[group] > 1
+    rows, group, hashes = rows[member], group[member], hashes[member]
+    if not len(rows):
+        return ResultSet(path_table), np.zeros(0, dtype=np.int64)
+
+    width = snapshot.width[rows]
+    height = snapshot.height[rows]
+    mtime = snapshot.mtime[rows]
+    resolution = width.astype(np.int64) * height
+    order = np.lexsort((-mtime, -resolution, group))
+    rows, group, hashes = rows[order], group[order], hashes[order]
+    size = snapshot.size[rows]
+
+    # 每组的第一个文件为建议保留的文件，分组重新编号为连续的 0..N-1
+    first = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+    dense = np.cumsum(np.concatenate([[True], group[1:] != group[:-1]])) - 1
+    wasted = np.add.reduceat(size, first) - size[first]
+    similarity = 1 - popcount(np.bitwise_xor(hashes, hashes[first][dense])) / HASH_BITS
+
+    # 可释放空间多的组排在前面（稳定排序，组内顺序不变）
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(-wasted, kind='stable')] = np.arange(len(first))
+    dense = rank[dense]
+    order = np.argsort(dense, kind='stable')
+    rows, dense, similarity = rows[order], dense[order], similarity[order]
+
+    results = ResultSet.from_columns(
+        [snapshot.paths[row] for row in rows], snapshot.mtime[rows], snapshot.width[rows],
+        snapshot.height[rows], similarity, group=dense, path_table=path_table
+    )
+    return results, np.sort(wasted)[::-1]
+
+
+def format_size(num_bytes):
+    """以 KB / MB / GB 显示字节数"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def main(argv=None):
+    from search_engine import SearchEngine, result_to_json
+    from worker_pool import WorkerPool
+    from hash_index import HashIndex
+
+    parser = argparse.ArgumentParser(prog="python -m duplicate_finder",
+                                     description="在文件夹（含子文件夹）中查找近似重复的图片分组")
+    parser.add_argument('folders', nargs='+', help="搜索文件夹")
+    parser.add_argument('--algo', choices=['phash', 'ahash', 'dhash'], default='phash', help="使用的哈希（默认 phash）")
+    parser.add_argument('--min', type=float, dest='min_similarity', default=DUPLICATE_SIMILARITY,
+                        help=f"判定为重复的最小哈希相似度，{MIN_DUPLICATE_SIMILARITY} 到 1.0（默认 {DUPLICATE_SIMILARITY}）")
+    parser.add_argument('--limit', type=int, help="只输出可释放空间最多的N组")
+    parser.add_argument('--index', default="image_similarity_index.db", help="哈希索引文件")
+    parser.add_argument('--workers', type=int, help="工作进程数（默认CPU核心数）")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出结果")
+    parser.add_argument('--quiet', action='store_true', help="不输出进度信息")
+    args = parser.parse_args(argv)
+    if not MIN_DUPLICATE_SIMILARITY <= args.min_similarity <= 1.0:
+        parser.error(f"--min 应在 {MIN_DUPLICATE_SIMILARITY} 到 1.0 之间")
+
+    def show_progress(done, total, stage):
+        end = '\n' if total and done == total else ''
+        print(f"\r{stage} {done}/{total or '?'}", end=end, file=sys.stderr, flush=True)
+
+    def show_status(message):
+        print(f"\r{message}", file=sys.stderr, flush=True)
+
+    callbacks = {} if args.quiet else {'on_progress': show_progress, 'on_status': show_status}
+    hash_index = HashIndex(args.index)
+    worker_pool = WorkerPool(args.workers)
+    start = time.perf_counter()
+    try:
+        with SearchEngine(hash_index, None, worker_pool, **callbacks) as engine:
+            summary = engine.find_duplicates(args.folders, hash_name=args.algo, min_similarity=args.min_similarity)
+    except KeyboardInterrupt:
+        print("\n已取消", file=sys.stderr)
+        return 130
+    finally:
+        worker_pool.shutdown()
+        hash_index.close()
+    elapsed = time.perf_counter() - start
+
+    results = summary['results']
+    wasted_bytes = summary['wasted_bytes']
+    groups = summary['groups']
+    if args.limit is not None:
+        groups = min(groups, args.limit)
+    group_column = results.array['group']
+    bounds = np.searchsorted(group_column, np.arange(groups + 1))
+
+    if args.json:
+        json.dump({
+            'algorithm': args.algo,
+            'min_similarity': args.min_similarity,
+            'total_files': summary['total_files'],
+            'groups': summary['groups'],
+            'wasted_bytes': int(wasted_bytes.sum()),
+            'elapsed': round(elapsed, 3),
+            'clusters': [
+                {
+                    'keeper': results.path(int(bounds[g])),
+                    'wasted_bytes': int(wasted_bytes[g]),
+                    'files': [result_to_json(results[i]) for i in range(bounds[g], bounds[g + 1])],
+                }
+                for g in range(groups)
+            ],
+        }, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for g in range(groups):
+            count = bounds[g + 1] - bounds[g]
+            print(f"# 组 {g + 1}: {count} 个文件，可释放 {format_size(wasted_bytes[g])}")
+            for i in range(bounds[g], bounds[g + 1]):
+                mark = "保留" if results.is_keeper(i) else f"{results.similarity(i):.4f}"
+                print(f"{mark}\t{results.resolution_str(i)}\t{results.path(i)}")
+        if not args.quiet:
+            print(f"共扫描 {summary['total_files']} 个文件，找到 {summary['groups']} 组重复图片"
+                  f"（{len(results)} 个文件），可释放 {format_size(wasted_bytes.sum())}，耗时 {elapsed:.2f} 秒",
+                  file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
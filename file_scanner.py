@@ -0,0 +1,107 @@
+# file_scanner.py - 并行递归图像文件扫描模块
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+# 支持的图像扩展名（小写，匹配时不区分大小写）
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+
+
+def normalize_folder(folder):
+    """
+    文件夹的规范写法（绝对路径，统一路径分隔符，去掉末尾的分隔符）
+        扫描产出的路径和文件夹监视写入索引的路径都以此为根，同一个文件在索引中只有一种写法
+        （相对路径、Windows上的 C:/x 与 C:\\x 不会产生两条记录）
+    """
+    return os.path.abspath(folder)
+
+
+def _scan_directories(paths, extensions, recursive, max_dirs):
+    """
+    深度优先扫描一组目录，最多处理 max_dirs 个目录后返回，剩余的子目录交给其他线程
+        小的子树在同一个任务中扫描完，避免逐目录提交任务的调度开销；大的子树会被拆分到多个线程
+
+    返回值:
+        (entries, remaining)
+        entries: [(路径, 文件大小, 修改时间)]
+        remaining: 尚未扫描的目录路径列表
+    """
+    entries = []
+    stack = list(paths)
+    scanned = 0
+    while stack and scanned < max_dirs:
+        path = stack.pop()
+        scanned += 1
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            # 不跟随符号链接，避免循环
+                            if recursive:
+                                stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in extensions and entry.is_file():
+                            # Windows上DirEntry.stat()直接使用目录枚举返回的信息，不产生额外的系统调用
+                            stat = entry.stat()
+                            entries.append((entry.path, stat.st_size, stat.st_mtime))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"无法访问文件夹 {path}: {e}")
+    return entries, stack
+
+
+def _top_level_folders(folders, recursive):
+    """去掉重复的文件夹，递归扫描时还去掉已包含在其他文件夹中的子文件夹"""
+    normalized = {}
+    for folder in map(normalize_folder, folders):
+        normalized.setdefault(os.path.normcase(folder), folder)
+    keys = sorted(normalized)
+    result = []
+    for key in keys:
+        if recursive and any(key.startswith(parent.rstrip(os.sep) + os.sep) for parent in keys if parent != key):
+            continue
+        result.append(normalized[key])
+    return result
+
+
+def scan_images(folders, extensions=IMAGE_EXTENSIONS, recursive=True, max_workers=None, max_dirs=64):
+    """
+    并行递归扫描图像文件，分批产出条目
+        每个目录只用一次 os.scandir 遍历，扩展名不区分大小写（.JPG、.Png 等同样匹配），
+        目录树拆分到线程池中并行扫描，每个任务完成后立即产出，调用方可以边扫描边处理
+        folders: 要扫描的文件夹列表（互相包含的文件夹只扫描一次），产出的路径以 normalize_folder 后的文件夹为根
+
+    产出:
+        [(路径, 文件大小, 修改时间)] 列表
+    """
+    extensions = frozenset(ext.lower() for ext in extensions)
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+    done_queue = queue.Queue()
+    futures = set()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="FileScanner")
+
+    def submit(paths):
+        future = executor.submit(_scan_directories, paths, extensions, recursive, max_dirs)
+        futures.add(future)
+        future.add_done_callback(done_queue.put)
+
+    try:
+        for folder in _top_level_folders(folders, recursive):
+            submit([folder])
+        while futures:
+            future = done_queue.get()
+            futures.discard(future)
+            entries, remaining = future.result()
+            # 剩余目录按线程数拆分后继续并行扫描
+            step = max(1, len(remaining) // max_workers)
+            for i in range(0, len(remaining), step):
+                submit(remaining[i:i + step])
+            if entries:
+                yield entries
+    finally:
+        # 调用方提前停止（如取消搜索）时丢弃尚未开始的任务
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,331 @@
+# folder_watcher.py - 文件夹监视模块，在后台保持哈希索引与磁盘一致
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from file_scanner import IMAGE_EXTENSIONS, normalize_folder, scan_images
+
+# inotify 事件掩码（linux/inotify.h）
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_ONLYDIR | IN_DONT_FOLLOW)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+class InotifyBackend:
+    """
+    基于 Linux inotify 的递归监视（通过ctypes调用libc，无需第三方库）
+        inotify不支持递归，为目录树中每个目录单独添加监视，新建或移入的目录会自动补充监视
+    """
+
+    def __init__(self, roots):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify 仅在Linux上可用")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._path_of = {}  # 监视描述符 → 目录路径
+        try:
+            for root in roots:
+                self._add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_tree(self, folder):
+        """为目录及其全部子目录添加监视（不跟随符号链接）"""
+        for dirpath, dirnames, _ in os.walk(folder):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                if dirpath == folder or errno == 28:  # ENOSPC：超过 max_user_watches 上限
+                    raise OSError(errno, f"无法监视文件夹 {dirpath}")
+                continue  # 子目录已被删除或无权限
+            self._path_of[wd] = dirpath
+
+    def _remove_tree(self, folder):
+        """移除目录（已被删除或移出）及其子目录的监视"""
+        prefix = os.path.join(folder, '')
+        for wd, path in list(self._path_of.items()):
+            if path == folder or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._path_of[wd]
+
+    def wait_changes(self, timeout):
+        """
+        等待文件变化
+
+        返回值:
+            (changed, removed, rescan)
+            changed: 新建或修改的图像文件路径集合
+            removed: 删除或移出的路径集合（文件或目录）
+            rescan: 需要重新扫描并与索引核对的目录集合（新移入的目录、事件队列溢出）
+        """
+        changed, removed, rescan = set(), set(), set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return changed, removed, rescan
+        try:
+            data = os.read(self._fd, 256 * 1024)
+        except BlockingIOError:
+            return changed, removed, rescan
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，无法确定丢失了哪些变化，全部重新核对
+                rescan.update(path for path in self._path_of.values())
+                continue
+            if mask & IN_IGNORED:
+                self._path_of.pop(wd, None)
+                continue
+            folder = self._path_of.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新目录中在添加监视之前就可能已有文件，需要扫描一次
+                    try:
+                        self._add_tree(path)
+                    except OSError:
+                        pass
+                    rescan.add(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove_tree(path)
+                    removed.add(path)
+            elif _is_image(path):
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_ATTRIB):
+                    changed.add(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    removed.add(path)
+        return changed, removed, rescan
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingBackend:
+    """轮询后备方案：定期重新扫描全部文件夹并与索引核对（非Linux平台或inotify不可用时使用）"""
+
+    def __init__(self, roots, interval=10.0):
+        self.roots = list(roots)
+        self.interval = interval
+        self._last_poll = time.monotonic()
+
+    def wait_changes(self, timeout):
+        remaining = self.interval - (time.monotonic() - self._last_poll)
+        if remaining > timeout:
+            time.sleep(timeout)
+            return set(), set(), set()
+        time.sleep(max(remaining, 0))
+        self._last_poll = time.monotonic()
+        return set(), set(), set(self.roots)
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """
+    文件夹监视器
+        在后台线程中把搜索文件夹中新建、修改、重命名和删除的图像同步到哈希索引。
+        初次核对完成后，哈希搜索可以直接使用索引中的文件列表，无需扫描文件夹和检查每个文件
+    """
+
+    DEBOUNCE = 0.5  # 最后一个事件之后等待的时间（秒），合并连续写入产生的多个事件
+    MAX_DELAY = 2.0  # 事件持续不断时最长的同步间隔（秒）
+    BATCH_SIZE = 64  # 每计算这么多个文件写入一次索引
+
+    def __init__(self, hash_index, poll_interval=10.0):
+        self.hash_index = hash_index
+        self.poll_interval = poll_interval
+        self.backend_name = None
+        self._roots = []
+        self._failed = set()  # 无法解码的 (路径, 文件大小, 修改时间)，文件变化前不再重试
+        self._thread = None
+        self._stop = threading.Event()
+        self._synced = threading.Event()
+
+    def set_folders(self, folders):
+        """设置要监视的文件夹（为空时停止监视），文件夹未变化时不做任何事"""
+        roots = sorted(set(map(normalize_folder, folders)))
+        if roots == self._roots and (self._thread is not None or not roots):
+            return
+        self.stop()
+        self._roots = roots
+        if roots:
+            self._stop = threading.Event()
+            self._synced = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(roots, self._stop, self._synced), name="FolderWatcher", daemon=True
+            )
+            self._thread.start()
+
+    def is_synced(self, folders):
+        """索引是否已与这些文件夹（含子文件夹）保持同步"""
+        if not self._synced.is_set() or not folders:
+            return False
+        for folder in folders:
+            path = normalize_folder(folder)
+            if not any(path == root or path.startswith(os.path.join(root, '')) for root in self._roots):
+                return False
+        return True
+
+    def stop(self):
+        """停止监视线程"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self._roots = []
+        self._synced.clear()
+
+    def _run(self, roots, stop, synced):
+        # 先添加监视再核对，核对期间发生的变化也会被记录
+        try:
+            backend = InotifyBackend(roots)
+            self.backend_name = 'inotify'
+        except OSError as e:
+            if sys.platform.startswith('linux'):
+                print(f"inotify 不可用，改为定期扫描: {e}")
+            backend = PollingBackend(roots, self.poll_interval)
+            self.backend_name = 'polling'
+
+        try:
+            for root in roots:
+                self._rescan(root, stop)
+            if stop.is_set():
+                return
+            synced.set()
+
+            changed, removed, rescan = set(), set(), set()
+            first_event = last_event = None
+            while not stop.is_set():
+                new_changed, new_removed, new_rescan = backend.wait_changes(self.DEBOUNCE)
+                now = time.monotonic()
+                if new_changed or new_removed or new_rescan:
+                    changed |= new_changed
+                    removed |= new_removed
+                    rescan |= new_rescan
+                    first_event = first_event or now
+                    last_event = now
+                if first_event is None:
+                    continue
+                if now - last_event >= self.DEBOUNCE or now - first_event >= self.MAX_DELAY:
+                    self._apply(changed, removed, rescan, stop)
+                    changed, removed, rescan = set(), set(), set()
+                    first_event = last_event = None
+        except Exception as e:
+            print(f"文件夹监视出错: {e}")
+            synced.clear()
+        finally:
+            backend.close()
+
+    def _apply(self, changed, removed, rescan, stop):
+        """把一批文件变化写入索引"""
+        snapshot = self.hash_index.snapshot()
+        gone = []
+        for path in removed:
+            if not _is_image(path):
+                # 删除或移出的目录（后端只报告图像文件和目录）：移除其下全部记录，目录被替换时随后的重新扫描会补回
+                gone.extend(snapshot.paths[row] for row in snapshot.rows_under([path]))
+            elif os.path.exists(path):
+                changed.add(path)  # 删除后又重新创建（如编辑器先写临时文件再改名）
+            else:
+                gone.append(path)
+        self.hash_index.remove_many(gone)
+
+        entries = []
+        for path in changed:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.hash_index.remove_many([path])
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        self._update_entries(entries, stop)
+
+        for folder in rescan:
+            self._rescan(folder, stop)
+
+    def _rescan(self, folder, stop):
+        """扫描文件夹并与索引核对：计算新增或修改的文件，移除磁盘上已不存在的记录"""
+        snapshot = self.hash_index.snapshot()
+        existing = set()
+        for batch in scan_images([folder]):
+            if stop.is_set():
+                return
+            existing.update(entry[0] for entry in batch)
+            self._update_entries(batch, stop)
+        stale = [snapshot.paths[row] for row in snapshot.rows_under([folder])]
+        self.hash_index.remove_many([path for path in stale if path not in existing])
+
+    def _update_entries(self, entries, stop):
+        """为索引中没有或已过期的条目计算哈希并写入索引（与已有文件内容完全相同的文件直接复制记录，不解码）"""
+        from image_processor import compute_image_record  # 只在需要解码时导入
+        from content_digest import ExactCopyFinder, copy_record
+        from hash_index import DIGEST_COLUMNS
+
+        snapshot = self.hash_index.snapshot()
+        _, missing = snapshot.find_rows(entries)
+        missing = [entry for entry in missing if entry not in self._failed]
+        if not missing:
+            return
+        finder = ExactCopyFinder(snapshot)
+        computed = {}  # 本次解码得到的记录，后面内容相同的文件直接复制
+        for start in range(0, len(missing), self.BATCH_SIZE):
+            records = []
+            for entry in missing[start:start + self.BATCH_SIZE]:
+                if stop.is_set():
+                    break
+                row, original = finder.match(entry)
+                digests = dict(zip(DIGEST_COLUMNS, finder.digests(entry[0])))
+                if row is not None:
+                    record = copy_record(entry, snapshot, row, finder.digests(entry[0]))
+                elif original is not None:
+                    source = computed.get(original[0])
+                    record = None if source is None else dict(
+                        source, path=entry[0], size=entry[1], mtime=entry[2], **digests
+                    )
+                else:
+                    record = compute_image_record(entry)
+                    if record is not None:
+                        record.update(digests)
+                        computed[entry[0]] = record
+                if record is None:
+                    self._failed.add(entry)
+                else:
+                    records.append(record)
+            self.hash_index.store_many(records)
+        self.hash_index.store_digests(finder.index_updates())
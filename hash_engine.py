@@ -0,0 +1,233 @@
+# hash_engine.py - 基于NumPy的向量化哈希比较模块
+import numpy as np
+
+HASH_BITS = 64  # 默认hash_size=8，共64位
+
+# 不支持 np.bitwise_count 的旧版NumPy使用按字节查表的方式统计位数
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def pack_hashes(hash_values):
+    """
+    将有符号64位整数哈希列表打包为uint64数组
+        hash_values: 索引中保存的有符号整数哈希（可迭代对象）
+    """
+    values = np.fromiter(hash_values, dtype=np.int64)
+    return values.view(np.uint64)
+
+
+def popcount(values):
+    """逐元素统计uint64数组中置位的比特数（结果形状与输入相同）"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _popcount_table(values)
+
+
+def _popcount_table(values):
+    """按字节查表统计位数，每个元素的8个字节放在新增的最后一维上求和，多维输入（如批量查询的矩阵）保持原形状"""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    bytes_view = values.view(np.uint8).reshape(values.shape + (8,))
+    return _POPCOUNT_TABLE[bytes_view].sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_distances(source_hash, packed_hashes):
+    """
+    计算源哈希与全部候选哈希之间的汉明距离
+        source_hash: 有符号64位整数哈希
+        packed_hashes: pack_hashes 生成的uint64数组
+    """
+    source = np.int64(source_hash).view(np.uint64)
+    return popcount(np.bitwise_xor(packed_hashes, source))
+
+
+def compare_hashes(source_hash, packed_hashes, min_similarity=0, max_similarity=1, filter_enabled=False):
+    """
+    批量计算相似度并生成筛选掩码
+
+    返回值:
+        (similarities, mask)
+        similarities: 0到1之间的相似度数组
+        mask: 符合筛选条件的布尔数组（未启用筛选时全部为True）
+    """
+    distances = hamming_distances(source_hash, packed_hashes)
+    similarities = 1 - distances / HASH_BITS
+    if filter_enabled:
+        mask = (similarities >= min_similarity) & (similarities <= max_similarity)
+    else:
+        mask = np.ones(len(similarities), dtype=bool)
+    return similarities, mask
+
+
+def max_distance_for(min_similarity):
+    """将最小相似度换算为允许的最大汉明距离"""
+    return int(np.floor((1 - min_similarity) * HASH_BITS + 1e-9))
+
+
+def _flip_masks(bits, radius):
+    """生成 bits 位内汉明重量不超过 radius 的全部异或掩码"""
+    values = np.arange(1 << bits, dtype=np.uint64)
+    return values[popcount(values) <= radius]
+
+
+class MultiIndexHash:
+    """
+    多索引哈希（Multi-Index Hashing）
+        将64位哈希切分为若干段，每段建立排序索引。
+        根据抽屉原理，汉明距离不超过k的两个哈希至少有一段的距离不超过 k // 段数，
+        因此阈值查询只需在各段中查找邻近值，再对少量候选做精确校验。
+    """
+
+    def __init__(self, packed_hashes, num_chunks=4, max_radius=2):
+        self.packed = packed_hashes
+        self.num_chunks = num_chunks
+        self.chunk_bits = HASH_BITS // num_chunks
+        self.max_radius = max_radius  # 段内半径过大时候选数量接近全量，退回线性扫描
+        self._masks = {}
+
+        chunk_mask = np.uint64((1 << self.chunk_bits) - 1)
+        self._orders = []
+        self._sorted_chunks = []
+        for j in range(num_chunks):
+            chunk = ((packed_hashes >> np.uint64(j * self.chunk_bits)) & chunk_mask).astype(np.uint16)
+            order = np.argsort(chunk, kind='stable')  # 16位整数的稳定排序使用基数排序
+            self._orders.append(order)
+            self._sorted_chunks.append(chunk[order])
+
+    def __len__(self):
+        return len(self.packed)
+
+    def _neighbor_masks(self, radius):
+        if radius not in self._masks:
+            self._masks[radius] = _flip_masks(self.chunk_bits, radius).astype(np.uint16)
+        return self._masks[radius]
+
+    def query(self, source_hash, max_distance):
+        """
+        查找与源哈希汉明距离不超过 max_distance 的全部条目
+        
+        返回值:
+            符合条件的下标数组（升序）；半径过大无法亚线性查询时返回None
+        """
+        radius = max_distance // self.num_chunks
+        if radius > self.max_radius:
+            return None
+
+        source = np.int64(source_hash).view(np.uint64)
+        chunk_mask = np.uint64((1 << self.chunk_bits) - 1)
+        masks = self._neighbor_masks(radius)
+
+        parts = []
+        for j in range(self.num_chunks):
+            query_chunk = np.uint16((source >> np.uint64(j * self.chunk_bits)) & chunk_mask)
+            neighbors = np.bitwise_xor(masks, query_chunk)
+            sorted_chunk = self._sorted_chunks[j]
+            lo = np.searchsorted(sorted_chunk, neighbors, side='left')
+            hi = np.searchsorted(sorted_chunk, neighbors, side='right')
+            order = self._orders[j]
+            parts.extend(order[a:b] for a, b in zip(lo, hi) if b > a)
+
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = np.unique(np.concatenate(parts))
+        distances = hamming_distances(source_hash, self.packed[candidates])
+        return candidates[distances <= max_distance]
+
+
+def _expand_ranges(lo, hi):
+    """把每个位置的区间 [lo, hi) 展开为 (位置序号, 区间内的值) 两个数组"""
+    counts = hi - lo
+    starts = np.cumsum(counts) - counts
+    total = int(counts.sum())
+    source = np.repeat(np.arange(len(lo)), counts)
+    target = np.repeat(lo, counts) + (np.arange(total) - np.repeat(starts, counts))
+    return source, target
+
+
+def near_duplicate_pairs(packed_hashes, max_distance, num_chunks=4, block_size=1 << 22, on_step=None):
+    """
+    多索引哈希的自连接：找出汉明距离不超过 max_distance 的全部哈希对，不做 O(n²) 的两两比较
+        与 MultiIndexHash 相同的抽屉原理：距离不超过k的两个哈希至少有一段的距离不超过 k // 段数。
+        每段按子串排序分桶，只在子串相同（或相差不超过段内半径）的桶之间生成候选对，
+        再用完整的64位哈希校验；候选对按 block_size 分块展开，内存占用有上限
+        on_step(done, total): 每处理完一段中的一个邻近掩码时调用（用于进度和取消）
+
+    返回值:
+        (a, b) 下标数组，a < b；同一对可能在多段中重复出现
+    """
+    count = len(packed_hashes)
+    chunk_bits = HASH_BITS // num_chunks
+    chunk_mask = np.uint64((1 << chunk_bits) - 1)
+    masks = _flip_masks(chunk_bits, max_distance // num_chunks).astype(np.uint16)
+    pairs_a = [np.empty(0, dtype=np.int64)]
+    pairs_b = [np.empty(0, dtype=np.int64)]
+    if count < 2:
+        return pairs_a[0], pairs_b[0]
+
+    for j in range(num_chunks):
+        chunk = ((packed_hashes >> np.uint64(j * chunk_bits)) & chunk_mask).astype(np.uint16)
+        order = np.argsort(chunk, kind='stable')
+        sorted_chunk = chunk[order]
+        # 每个桶（相同子串）在排序数组中的起止位置，按桶查找邻近桶，不必对每个条目二分查找
+        keys, bucket_start, inverse = np.unique(sorted_chunk, return_index=True, return_inverse=True)
+        bucket_end = np.append(bucket_start[1:], count)
+
+        for step, mask in enumerate(masks):
+            if mask == 0:
+                # 同一个桶内：只与排在自己之后的条目配对
+                lo = np.arange(1, count + 1)
+                hi = bucket_end[inverse]
+            else:
+                # 相差一个掩码的两个桶：只从子串较小的一侧配对，每对桶只处理一次
+                neighbors = keys ^ mask
+                position = np.minimum(np.searchsorted(keys, neighbors), len(keys) - 1)
+                found = (keys[position] == neighbors) & (keys < neighbors)
+                lo = np.where(found, bucket_start[position], 0)[inverse]
+                hi = np.where(found, bucket_end[position], 0)[inverse]
+
+            counts = hi - lo
+            counts[counts < 0] = 0
+            hi = lo + counts
+            # 按候选对的累计数量分块，每块展开后不超过约 block_size 对
+            cumulative = np.cumsum(counts)
+            bounds = np.searchsorted(cumulative, np.arange(block_size, int(cumulative[-1]), block_size), side='right')
+            bounds = np.unique(np.concatenate([[0], bounds, [count]]))
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                positions, partners = _expand_ranges(lo[start:end], hi[start:end])
+                if not len(positions):
+                    continue
+                a = order[positions + start]
+                b = order[partners]
+                close = popcount(np.bitwise_xor(packed_hashes[a], packed_hashes[b])) <= max_distance
+                a, b = a[close], b[close]
+                pairs_a.append(np.minimum(a, b))
+                pairs_b.append(np.maximum(a, b))
+            if on_step is not None:
+                on_step(j * len(masks) + step + 1, num_chunks * len(masks))
+
+    return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+
+def connected_components(count, a, b):
+    """
+    由边 (a[i], b[i]) 求连通分量（向量化的并查集：挂接到较小的根，再压缩路径，直到所有边的两端同根）
+
+    返回值:
+        长度为 count 的数组，每个元素为其所在分量中最小的下标
+    """
+    labels = np.arange(count)
+    while len(a):
+        root_a, root_b = labels[a], labels[b]
+        differ = root_a != root_b
+        if not differ.any():
+            break
+        a, b, root_a, root_b = a[differ], b[differ], root_a[differ], root_b[differ]
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(labels, root_a, low)
+        np.minimum.at(labels, root_b, low)
+        while True:
+            parents = labels[labels]
+            if np.array_equal(parents, labels):
+                break
+            labels = parents
+    return labels
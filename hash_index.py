@@ -0,0 +1,307 @@
+# hash_index.py - 图像哈希持久化索引模块
+import os
+import sqlite3
+import threading
+import numpy as np
+from hash_engine import pack_hashes, MultiIndexHash
+
+# 哈希值在索引中以有符号64位整数存储（SQLite INTEGER 为有符号类型）
+HASH_COLUMNS = ('phash', 'ahash', 'dhash')
+# 文件内容摘要（见 content_digest），只在与其他文件大小相同时才计算，因此可能为空
+DIGEST_COLUMNS = ('partial_digest', 'digest')
+
+
+class HashSnapshot:
+    """
+    索引的内存列式快照
+        按列保存全部完整记录（三种哈希齐全），行号在快照生命周期内保持不变，
+        供向量化比较和多索引哈希查询使用；删除的记录只标记为无效，不移动其他行
+    """
+
+    def __init__(self, rows):
+        self.paths = [row[0] for row in rows]
+        self.row_of = {path: i for i, path in enumerate(self.paths)}
+        self.valid = np.ones(len(rows), dtype=bool)
+        self.size = np.array([row[1] for row in rows], dtype=np.int64)
+        self.mtime = np.array([row[2] for row in rows], dtype=np.float64)
+        self.width = np.array([row[3] for row in rows], dtype=np.int32)
+        self.height = np.array([row[4] for row in rows], dtype=np.int32)
+        self.packed = {
+            name: pack_hashes(row[5 + i] for row in rows)
+            for i, name in enumerate(HASH_COLUMNS)
+        }
+        self.partial_digest = [row[8] for row in rows]
+        self.digest = [row[9] for row in rows]
+        self._multi_index = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def find_rows(self, entries):
+        """
+        检查 (路径, 文件大小, 修改时间) 条目是否仍然有效
+
+        返回值:
+            (rows, missing)
+            rows: 有效条目在快照中的行号数组
+            missing: 需要重新解码的条目列表
+        """
+        rows = []
+        missing = []
+        for entry in entries:
+            path, size, mtime = entry
+            row = self.row_of.get(path)
+            if row is not None and self.size[row] == size and self.mtime[row] == mtime:
+                rows.append(row)
+            else:
+                missing.append(entry)
+        return np.array(rows, dtype=np.int64), missing
+
+    def rows_under(self, folders):
+        """
+        获取位于指定文件夹（含子文件夹）中的全部有效行，不访问文件系统
+            用于文件夹监视已保证索引与磁盘一致的情况
+        """
+        prefixes = tuple(os.path.join(os.path.normcase(os.path.abspath(folder)), '') for folder in folders)
+        count = len(self.valid)
+        rows = [
+            row for row, path in enumerate(self.paths[:count])
+            if self.valid[row] and os.path.normcase(path).startswith(prefixes)
+        ]
+        return np.array(rows, dtype=np.int64)
+
+    def remove(self, paths):
+        """将已删除文件的行标记为无效（行号不变，之后同一路径重新写入时追加为新行）"""
+        for path in paths:
+            row = self.row_of.pop(path, None)
+            if row is not None:
+                self.valid[row] = False
+
+    def hashes(self, row):
+        """第 row 行的哈希，{哈希名称: 有符号64位整数}（与 image_processor.compute_hashes 的返回值格式相同）"""
+        return {name: int(self.packed[name][row:row + 1].view(np.int64)[0]) for name in HASH_COLUMNS}
+
+    def multi_index(self, hash_name):
+        """获取指定哈希的多索引哈希结构（首次使用时构建，之后复用）"""
+        if hash_name not in self._multi_index:
+            self._multi_index[hash_name] = MultiIndexHash(self.packed[hash_name])
+        return self._multi_index[hash_name]
+
+    def update(self, records):
+        """将新计算的记录合并到快照中：已有路径原地更新，新路径追加到末尾"""
+        appended = []
+        for record in records:
+            row = self.row_of.get(record['path'])
+            if row is None:
+                appended.append(record)
+                continue
+            # 与 HashIndex.store_many 一致：文件未变化时保留已有的摘要
+            unchanged = self.size[row] == record['size'] and self.mtime[row] == record['mtime']
+            self.size[row] = record['size']
+            self.mtime[row] = record['mtime']
+            self.width[row] = record['width']
+            self.height[row] = record['height']
+            for name in HASH_COLUMNS:
+                self.packed[name][row] = np.int64(record[name]).view(np.uint64)
+            for name in DIGEST_COLUMNS:
+                value = record.get(name)
+                if value is not None or not unchanged:
+                    getattr(self, name)[row] = value
+
+        if appended:
+            # 先扩展各列数组，再登记路径，其他线程通过 row_of 查到的行号总是有效的
+            self.valid = np.concatenate([self.valid, np.ones(len(appended), dtype=bool)])
+            self.size = np.concatenate([self.size, [r['size'] for r in appended]]).astype(np.int64)
+            self.mtime = np.concatenate([self.mtime, [r['mtime'] for r in appended]]).astype(np.float64)
+            self.width = np.concatenate([self.width, [r['width'] for r in appended]]).astype(np.int32)
+            self.height = np.concatenate([self.height, [r['height'] for r in appended]]).astype(np.int32)
+            for name in HASH_COLUMNS:
+                self.packed[name] = np.concatenate([self.packed[name], pack_hashes(r[name] for r in appended)])
+            self.partial_digest.extend(r.get('partial_digest') for r in appended)
+            self.digest.extend(r.get('digest') for r in appended)
+            for record in appended:
+                self.row_of[record['path']] = len(self.paths)
+                self.paths.append(record['path'])
+
+        # 多索引结构依赖哈希数组，数据变化后下次查询时重建
+        self._multi_index.clear()
+
+    def set_digests(self, updates):
+        """记录新计算的内容摘要（文件大小和修改时间与快照一致的行）"""
+        for path, size, mtime, partial, digest in updates:
+            row = self.row_of.get(path)
+            if row is not None and self.size[row] == size and self.mtime[row] == mtime:
+                self.partial_digest[row] = partial if partial is not None else self.partial_digest[row]
+                self.digest[row] = digest if digest is not None else self.digest[row]
+
+
+class HashIndex:
+    """
+    基于SQLite的图像哈希索引
+        以 路径 + 文件大小 + 修改时间 作为有效性判断依据，
+        文件未变化时直接返回索引中的哈希值和图像信息，无需重新解码图像
+    """
+
+    def __init__(self, index_file="image_similarity_index.db"):
+        self.index_file = index_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                phash INTEGER,
+                ahash INTEGER,
+                dhash INTEGER,
+                partial_digest BLOB,
+                digest BLOB
+            )
+        """)
+        # 旧版本创建的索引没有摘要列，直接追加（已有记录的摘要为空，需要时再计算）
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(images)")}
+        for name in DIGEST_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE images ADD COLUMN {name} BLOB")
+        self._conn.commit()
+        self._snapshot = None
+
+    def snapshot(self):
+        """获取索引的内存快照（首次调用时从数据库加载，之后随写入增量更新）"""
+        with self._lock:
+            if self._snapshot is None:
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime, width, height, {', '.join(HASH_COLUMNS + DIGEST_COLUMNS)} FROM images "
+                    f"WHERE {' AND '.join(f'{name} IS NOT NULL' for name in HASH_COLUMNS)}"
+                ).fetchall()
+                self._snapshot = HashSnapshot(rows)
+            return self._snapshot
+
+    def lookup_many(self, entries, hash_names=HASH_COLUMNS):
+        """
+        批量查询索引
+            entries: (路径, 文件大小, 修改时间) 元组列表
+            hash_names: 需要的哈希类型，默认要求三种哈希齐全
+
+        返回值:
+            {路径: 记录字典}，只包含文件未变化且已有所需哈希的条目
+        """
+        for hash_name in hash_names:
+            if hash_name not in HASH_COLUMNS:
+                raise ValueError(f"未知的哈希类型: {hash_name}")
+
+        wanted = {path: (size, mtime) for path, size, mtime in entries}
+        paths = list(wanted)
+        found = {}
+        batch = 500  # 避免超过SQLite参数数量上限
+
+        with self._lock:
+            for start in range(0, len(paths), batch):
+                chunk = paths[start:start + batch]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime, width, height, {', '.join(HASH_COLUMNS)} "
+                    f"FROM images WHERE path IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for path, size, mtime, width, height, *hashes in rows:
+                    # 文件大小或修改时间变化视为失效
+                    if wanted[path] != (size, mtime):
+                        continue
+                    record = {
+                        'path': path,
+                        'size': size,
+                        'mtime': mtime,
+                        'width': width,
+                        'height': height,
+                    }
+                    record.update(zip(HASH_COLUMNS, hashes))
+                    if any(record[hash_name] is None for hash_name in hash_names):
+                        continue
+                    found[path] = record
+        return found
+
+    def store_many(self, records):
+        """
+        批量写入索引记录
+            文件大小和修改时间不变时保留已有的其他哈希列和摘要列，否则整行覆盖
+            记录中可以包含 partial_digest、digest（见 content_digest）
+        """
+        rows = []
+        for record in records:
+            rows.append((
+                record['path'], record['size'], record['mtime'],
+                record['width'], record['height'],
+                record.get('phash'), record.get('ahash'), record.get('dhash'),
+                record.get('partial_digest'), record.get('digest')
+            ))
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO images (path, size, mtime, width, height, phash, ahash, dhash, partial_digest, digest)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    phash = CASE WHEN images.size = excluded.size AND images.mtime = excluded.mtime
+                                 THEN COALESCE(excluded.phash, images.phash) ELSE excluded.phash END,
+                    ahash = CASE WHEN images.size = excluded.size AND images.mtime = excluded.mtime
+                                 THEN COALESCE(excluded.ahash, images.ahash) ELSE excluded.ahash END,
+                    dhash = CASE WHEN images.size = excluded.size AND images.mtime = excluded.mtime
+                                 THEN COALESCE(excluded.dhash, images.dhash) ELSE excluded.dhash END,
+                    partial_digest = CASE WHEN images.size = excluded.size AND images.mtime = excluded.mtime
+                                          THEN COALESCE(excluded.partial_digest, images.partial_digest)
+                                          ELSE excluded.partial_digest END,
+                    digest = CASE WHEN images.size = excluded.size AND images.mtime = excluded.mtime
+                                  THEN COALESCE(excluded.digest, images.digest) ELSE excluded.digest END,
+                    size = excluded.size,
+                    mtime = excluded.mtime,
+                    width = excluded.width,
+                    height = excluded.height
+            """, rows)
+            self._conn.commit()
+
+            if self._snapshot is not None:
+                complete = [r for r in records if all(r.get(name) is not None for name in HASH_COLUMNS)]
+                self._snapshot.update(complete)
+
+    def store_digests(self, updates):
+        """
+        为已有记录保存内容摘要
+            updates: [(路径, 文件大小, 修改时间, 部分摘要, 完整摘要)]，只更新文件未变化的记录，摘要为None的列保持不变
+        """
+        updates = list(updates)
+        if not updates:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE images SET partial_digest = COALESCE(?, partial_digest), digest = COALESCE(?, digest) "
+                "WHERE path = ? AND size = ? AND mtime = ?",
+                [(partial, digest, path, size, mtime) for path, size, mtime, partial, digest in updates]
+            )
+            self._conn.commit()
+            if self._snapshot is not None:
+                self._snapshot.set_digests(updates)
+
+    def remove_many(self, paths):
+        """删除已不存在的文件的索引记录（同时更新内存快照）"""
+        paths = list(paths)
+        if not paths:
+            return
+        batch = 500  # 避免超过SQLite参数数量上限
+        with self._lock:
+            for start in range(0, len(paths), batch):
+                chunk = paths[start:start + batch]
+                self._conn.execute(f"DELETE FROM images WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+            self._conn.commit()
+            if self._snapshot is not None:
+                self._snapshot.remove(paths)
+
+    def close(self):
+        """关闭索引数据库连接"""
+        with self._lock:
+            self._conn.close()
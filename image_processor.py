@@ -2,7 +2,106 @@ import os
 import traceback
 from datetime import datetime
 from PIL import Image
-from ssim_calculator import compare_images_ssim 
+import imagehash
+import numpy as np
+from ssim_calculator import SSIMSource, local_stats, ssim_batch
+from thumbnail_cache import THUMBNAIL_SIZE, open_thumbnail_array
+from shared_results import STATUS_OK, STATUS_FILTERED
+
+# 哈希类型名称与imagehash算法的对应关系（名称同时作为索引的列名）
+HASH_ALGORITHMS = {
+    'phash': imagehash.phash,
+    'ahash': imagehash.average_hash,
+    'dhash': imagehash.dhash,
+}
+
+
+# 哈希算法中最大的输入尺寸（pHash缩放到32×32），快速解码时保留该尺寸的4倍余量，保证哈希一致性
+HASH_INPUT_SIZE = 32
+DECODE_MIN_SIZE = HASH_INPUT_SIZE * 4
+
+
+def open_reduced(img, min_size=DECODE_MIN_SIZE):
+    """
+    以满足哈希输入尺寸的最小分辨率解码图像
+        JPEG使用draft在DCT阶段直接按1/2、1/4、1/8缩小解码并输出灰度；
+        其他格式解码后先用reduce做整数倍盒式缩小，再进行颜色转换和哈希缩放
+    """
+    img.draft('L', (min_size, min_size))
+    if img.mode not in ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'I', 'F'):
+        img = img.convert('RGB')  # 调色板、16位等模式不支持reduce
+    factor = min(img.width // min_size, img.height // min_size)
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img
+
+
+def hash_to_int(img_hash):
+    """将ImageHash转换为有符号64位整数，便于存入索引"""
+    value = int(str(img_hash), 16)
+    if value >= 1 << 63:
+        value -= 1 << 64
+    return value
+
+
+def compute_hashes(img, hash_names=tuple(HASH_ALGORITHMS), fast_decode=True):
+    """
+    由一次解码的图像计算多种哈希
+        先生成共享的灰度图，各哈希算法只在此基础上缩放，避免重复转换
+        fast_decode: 是否以缩小的分辨率解码（见 open_reduced）
+    
+    返回值:
+        {哈希名称: 有符号64位整数}
+    """
+    if fast_decode:
+        img = open_reduced(img)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    gray = img.convert('L')
+    return {name: hash_to_int(HASH_ALGORITHMS[name](gray)) for name in hash_names}
+
+
+def decode_hashes(file_path, hash_names=tuple(HASH_ALGORITHMS)):
+    """解码图像并计算哈希，返回 (宽, 高, {哈希名称: 整数})"""
+    with Image.open(file_path) as img:
+        width, height = img.size
+        return width, height, compute_hashes(img, hash_names)
+
+
+def compute_image_record(entry, hash_names=tuple(HASH_ALGORITHMS)):
+    """
+    解码图像并计算哈希，生成可写入索引的记录
+        entry: (路径, 文件大小, 修改时间) 元组
+        hash_names: 需要计算的哈希类型，默认一次解码同时计算pHash、aHash和dHash
+    """
+    file_path, file_size, file_mtime = entry
+    try:
+        width, height, hashes = decode_hashes(file_path, hash_names)
+        record = {
+            'path': file_path,
+            'size': file_size,
+            'mtime': file_mtime,
+            'width': width,
+            'height': height,
+        }
+        record.update(hashes)
+        return record
+    except Exception as e:
+        print(f"处理图像 {file_path} 时出错: {e}")
+        traceback.print_exc()
+        return None  # 处理失败返回None
+
+
+def hash_record(entry):
+    """
+    解码图像并一次计算pHash、aHash和dHash，结果写入共享内存（见 shared_results），用于多进程处理
+        处理失败时抛出异常，由调用方记录错误信息
+
+    返回值:
+        (状态, 宽, 高, pHash, aHash, dHash)，与 shared_results.RECORD_DTYPES['hash'] 的字段对应
+    """
+    width, height, hashes = decode_hashes(entry[0])
+    return STATUS_OK, width, height, hashes['phash'], hashes['ahash'], hashes['dhash']
 
 
 def process_image(image_path, source_hash, hash_algorithm, min_similarity=0, max_similarity=1, filter_enabled=False):
@@ -56,49 +155,90 @@ def process_image(image_path, source_hash, hash_algorithm, min_similarity=0, max
         traceback.print_exc()
         return None  # 处理失败返回None
     
-def process_image_ssim(image_path, source_image_path, min_similarity=0, max_similarity=1, filter_enabled=False):
-    """使用SSIM方法处理单个图像并计算相似度"""
+# 每个工作进程缓存的SSIM源图像，避免对每个目标文件重复解码源图像
+_ssim_source = None
+
+
+def get_ssim_source(source_image_path):
+    """获取当前进程的SSIM源图像，源图像路径或修改时间变化时重新加载"""
+    global _ssim_source
+    mtime = os.path.getmtime(source_image_path)
+    if _ssim_source is None or (_ssim_source.path, _ssim_source.mtime) != (source_image_path, mtime):
+        _ssim_source = SSIMSource(source_image_path)
+    return _ssim_source
+
+
+def compute_ssim_thumbnail(entry, size=THUMBNAIL_SIZE):
+    """
+    生成SSIM规范缩略图（固定尺寸的灰度图），用于多进程处理
+        entry: (路径, 文件大小, 修改时间) 元组
+
+    返回值:
+        (entry, 原始宽度, 原始高度, 缩略图字节)，失败时返回None
+    """
+    file_path = entry[0]
     try:
-        # 获取文件信息
-        file_path = str(image_path)
-        file_name = os.path.basename(file_path)
-        file_ext = os.path.splitext(file_path)[1].lower()
-        file_type = file_ext[1:].upper()
-        
-        # 获取文件修改日期
-        file_mtime = os.path.getmtime(file_path)
-        file_date = datetime.fromtimestamp(file_mtime)
-        
-        # 获取图像分辨率
         with Image.open(file_path) as img:
             width, height = img.size
-            resolution = width * height
-            resolution_str = f"{width} × {height}"
-        
-        # 计算SSIM相似度
-        similarity = compare_images_ssim(source_image_path, file_path)
-        
-        # 应用相似度筛选
-        if filter_enabled and (similarity < min_similarity or similarity > max_similarity):
-            return None  # 不符合筛选条件
-        
-        # 返回图像信息
-        return {
-            'path': file_path,
-            'name': file_name,
-            'type': file_type,
-            'date': file_date,
-            'mtime': file_mtime,
-            'resolution': resolution,
-            'resolution_str': resolution_str,
-            'width': width,
-            'height': height,
-            'similarity': similarity
-        }
+            img.draft('L', (size, size))
+            thumbnail = img.convert('L').resize((size, size), Image.LANCZOS)
+        return entry, width, height, thumbnail.tobytes()
     except Exception as e:
-        print(f"处理图像 {image_path} 时出错: {e}")
+        print(f"生成缩略图 {file_path} 时出错: {e}")
         traceback.print_exc()
-        return None  # 处理失败返回None
+        return None
+
+
+def process_cached_ssim(rows, cache_file, capacity, source_thumbnails, batch_size=64):
+    """
+    直接在缩略图缓存上计算SSIM，不访问原始图像文件，用于多进程处理
+        rows: 缩略图在缓存中的行号列表
+        source_thumbnails: 源图像的规范缩略图字节列表（批量查询时有多个，每批目标缩略图只读取一次）
+
+    返回值:
+        (行号数组, 相似度数组)（进程池无序返回时仍可对应到文件）
+        相似度数组的形状为 (源图像数, 行数)
+    """
+    thumbnails = open_thumbnail_array(cache_file, capacity)
+    size = thumbnails.shape[1]
+    sources = []
+    for source_thumbnail in source_thumbnails:
+        source = np.frombuffer(source_thumbnail, dtype=np.uint8).reshape(size, size).astype(np.float32)
+        sources.append((source, local_stats(source)))
+
+    similarities = np.empty((len(sources), len(rows)), dtype=np.float64)
+    for start in range(0, len(rows), batch_size):
+        batch = thumbnails[rows[start:start + batch_size]].astype(np.float32)
+        for i, (source, stats) in enumerate(sources):
+            similarities[i, start:start + batch_size] = ssim_batch(source, batch, stats1=stats)
+    return np.asarray(rows, dtype=np.int64), similarities
+
+
+def ssim_record(entry, source_image_path, min_similarity=0, max_similarity=1, filter_enabled=False):
+    """
+    使用SSIM方法处理单个图像并计算相似度，结果写入共享内存（见 shared_results）
+        entry: (路径, 文件大小, 修改时间) 元组
+        处理失败时抛出异常，由调用方记录错误信息
+
+    返回值:
+        (状态, 相似度, 宽, 高, 修改时间)，与 shared_results.RECORD_DTYPES['ssim'] 的字段对应
+    """
+    file_path, _, file_mtime = entry
+    # 获取图像分辨率，并与预处理好的源图像计算SSIM相似度（目标图像只打开一次）
+    with Image.open(file_path) as img:
+        width, height = img.size
+        similarity = get_ssim_source(source_image_path).compare(img)
+    if filter_enabled and not (min_similarity <= similarity <= max_similarity):
+        status = STATUS_FILTERED  # 不符合筛选条件
+    else:
+        status = STATUS_OK
+    return status, similarity, width, height, file_mtime
+
+
+def compute_source_hashes(image_path, hash_names=tuple(HASH_ALGORITHMS)):
+    """计算源图像的多种哈希，与 compute_image_record 使用相同的灰度转换"""
+    with Image.open(image_path) as img:
+        return compute_hashes(img, hash_names)
 
 def compute_image_hash(image_path, hash_algorithm):
     """计算图像的哈希值"""
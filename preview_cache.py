@@ -0,0 +1,59 @@
+# preview_cache.py - 结果表格预览缩略图的磁盘缓存模块
+import os
+import hashlib
+import threading
+import traceback
+from PIL import Image
+
+# 结果表格中缩略图的最大边长（像素）
+PREVIEW_SIZE = 80
+
+
+class PreviewCache:
+    """
+    按内容寻址的预览缩略图磁盘缓存
+        每张缩略图保存为一个PNG文件，文件名是 路径 + 修改时间 的SHA-1，
+        图像被修改后自动对应到新的文件名，无需维护索引表；可在多个线程中同时使用
+    """
+
+    def __init__(self, cache_dir="image_similarity_previews", size=PREVIEW_SIZE):
+        self.cache_dir = cache_dir
+        self.size = size
+
+    def cache_path(self, path, mtime):
+        """缩略图的缓存文件路径（按哈希前两位分子目录，避免单个目录中文件过多）"""
+        key = hashlib.sha1(f"{path}\0{mtime!r}\0{self.size}".encode('utf-8', 'surrogatepass')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.png')
+
+    def get(self, path, mtime):
+        """返回已缓存的缩略图文件路径，未缓存时返回None"""
+        cache_path = self.cache_path(path, mtime)
+        return cache_path if os.path.exists(cache_path) else None
+
+    def get_or_create(self, path, mtime):
+        """
+        返回缩略图文件路径，未缓存时解码原图生成
+            JPEG使用draft直接以接近目标尺寸的分辨率解码，不解码完整的原图
+
+        返回值:
+            缓存文件路径，原图无法解码时返回None
+        """
+        cache_path = self.cache_path(path, mtime)
+        if os.path.exists(cache_path):
+            return cache_path
+        try:
+            with Image.open(path) as img:
+                img.draft('RGB', (self.size * 2, self.size * 2))
+                if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                    img = img.convert('RGBA' if 'transparency' in img.info or img.mode.endswith('A') else 'RGB')
+                img.thumbnail((self.size, self.size), Image.LANCZOS)
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                # 先写入临时文件再改名，其他线程或进程不会读到写了一半的文件
+                temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                img.save(temp_path, 'PNG')
+            os.replace(temp_path, cache_path)
+            return cache_path
+        except Exception as e:
+            print(f"生成预览缩略图 {path} 时出错: {e}")
+            traceback.print_exc()
+            return None
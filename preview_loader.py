@@ -0,0 +1,98 @@
+# preview_loader.py - 结果表格缩略图的后台加载模块
+from collections import OrderedDict
+from qtpy import QtCore, QtGui
+from preview_cache import PreviewCache, PREVIEW_SIZE
+
+
+class _PreviewTask(QtCore.QRunnable):
+    """在线程池中生成（或从磁盘缓存读取）一张缩略图"""
+
+    def __init__(self, loader, path, mtime):
+        super().__init__()
+        self.loader = loader
+        self.path = path
+        self.mtime = mtime
+
+    def run(self):
+        image = QtGui.QImage()
+        cache_path = self.loader.cache.get_or_create(self.path, self.mtime)
+        if cache_path is not None:
+            image.load(cache_path)  # QImage可以在非GUI线程中使用，QPixmap不行
+        self.loader._loaded.emit(self.path, self.mtime, image)
+
+
+class PreviewLoader(QtCore.QObject):
+    """
+    异步缩略图加载器
+        解码和缩放在 QThreadPool 中进行，GUI线程只把完成的QImage转换为QPixmap；
+        结果写入 PreviewCache 磁盘缓存，并在内存中保留最近使用的缩略图，重复搜索时直接显示
+    """
+
+    ready = QtCore.Signal(str, QtGui.QPixmap)  # 路径, 缩略图（无法解码时为空的QPixmap）
+    _loaded = QtCore.Signal(str, float, QtGui.QImage)  # 工作线程 → GUI线程
+
+    MEMORY_CACHE_SIZE = 2000  # 内存中保留的缩略图数量
+
+    def __init__(self, cache=None, max_threads=None, parent=None):
+        super().__init__(parent)
+        self.cache = cache or PreviewCache()
+        self._pool = QtCore.QThreadPool(self)
+        if max_threads:
+            self._pool.setMaxThreadCount(max_threads)
+        self._pending = set()  # 已提交但尚未完成的 (路径, 修改时间)
+        self._pixmaps = OrderedDict()  # (路径, 修改时间) → QPixmap，按最近使用排序
+        self._placeholder = None
+        self._loaded.connect(self._on_loaded)
+
+    def placeholder(self):
+        """缩略图生成前显示的占位图"""
+        if self._placeholder is None:
+            self._placeholder = QtGui.QPixmap(PREVIEW_SIZE, PREVIEW_SIZE)
+            self._placeholder.fill(QtGui.QColor(225, 225, 225))
+        return self._placeholder
+
+    def cached(self, path, mtime):
+        """返回内存中已有的缩略图，没有时返回None"""
+        key = (path, mtime)
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def request(self, path, mtime):
+        """
+        请求一张缩略图，完成后发出 ready 信号
+            按请求顺序处理，先请求的（表格靠前的行）先完成
+
+        返回值:
+            内存中已有时直接返回QPixmap（不再发出信号），否则返回None
+        """
+        pixmap = self.cached(path, mtime)
+        if pixmap is not None:
+            return pixmap
+        key = (path, mtime)
+        if key not in self._pending:
+            self._pending.add(key)
+            self._pool.start(_PreviewTask(self, path, mtime))
+        return None
+
+    def cancel_pending(self):
+        """丢弃尚未开始的请求（表格被重新填充时调用），正在执行的任务完成后仍会缓存"""
+        self._pool.clear()
+        self._pending.clear()
+
+    def shutdown(self):
+        """丢弃尚未开始的请求并等待正在执行的任务结束"""
+        self.cancel_pending()
+        self._pool.waitForDone()
+
+    def _on_loaded(self, path, mtime, image):
+        key = (path, mtime)
+        self._pending.discard(key)
+        pixmap = QtGui.QPixmap.fromImage(image) if not image.isNull() else QtGui.QPixmap()
+        if not pixmap.isNull():
+            self._pixmaps[key] = pixmap
+            self._pixmaps.move_to_end(key)
+            while len(self._pixmaps) > self.MEMORY_CACHE_SIZE:
+                self._pixmaps.popitem(last=False)
+        self.ready.emit(path, pixmap)
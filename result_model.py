@@ -0,0 +1,241 @@
+# result_model.py - 搜索结果表格的数据模型模块
+import os
+import bisect
+from qtpy import QtCore, QtGui
+
+# 表头：缩略图、名称、类型、分辨率、相似度
+COLUMNS = ["缩略图", "名称", "类型", "分辨率", "相似度"]
+THUMBNAIL_COLUMN = 0
+SIMILARITY_COLUMN = 4
+ROW_HEIGHT = 85  # 行高，适应80像素的缩略图
+
+# 排序方式（与界面中排序下拉框的顺序一致）：(结果字段, 是否从大到小)
+SORT_MODES = [
+    ('similarity', True),   # 按相似度排序
+    ('name', False),        # 按名称排序（不区分大小写）
+    ('mtime', True),        # 按日期排序（从新到旧）
+    ('type', False),        # 按图片类型排序
+    ('resolution', True),   # 按分辨率排序（从大到小）
+    ('resolution', False),  # 按分辨率排序（从小到大）
+    ('group', False),       # 按重复分组排序（查找重复图片的结果，组内建议保留的文件在前）
+    ('source', False),      # 按源图像排序（批量查询的结果，组内按相似度）
+]
+
+
+def similarity_color(similarity):
+    """相似度单元格的背景颜色：低于0.5为红色，低于0.8为黄色，其余为绿色"""
+    if similarity < 0.5:
+        return QtGui.QColor(255, 150, 150)
+    elif similarity < 0.8:
+        return QtGui.QColor(255, 255, 150)
+    return QtGui.QColor(150, 255, 150)
+
+
+class ResultTableModel(QtCore.QAbstractTableModel):
+    """
+    搜索结果表格模型
+        只保存结果集（result_store.ResultSet）的引用，单元格文字、颜色和缩略图在视图绘制时按需生成，
+        不为每行创建单元格对象；缩略图只为屏幕上可见的行请求，内存占用不随结果数量增长。
+        排序只改变行到结果的映射（见 sort_by），不重建模型，也不重新加载缩略图
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._results = None  # ResultSet，为None时表格为空
+        self._order = None  # 显示顺序：第i行对应结果集中的第 _order[i] 条，为None时按原顺序
+        self._stream_keys = []  # 实时结果各行的排序键（相似度取负，升序），见 add_streamed
+        self._sort_keys = {}  # 结果字段 → 排序键数组，结果变化前复用
+        self._preview_loader = None
+        self._colors = {}  # 背景颜色缓存，避免每次绘制都创建QColor
+        self.load_thumbnails = True  # 为False时不请求缩略图（搜索过程中避免与工作进程争用CPU）
+
+    @property
+    def preview_loader(self):
+        """缩略图的后台加载器（第一次需要缩略图时创建）"""
+        if self._preview_loader is None:
+            from preview_loader import PreviewLoader
+            self._preview_loader = PreviewLoader(parent=self)
+            self._preview_loader.ready.connect(self._on_preview_ready)
+        return self._preview_loader
+
+    # ---- QAbstractTableModel 接口 ----
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self._results is None:
+            return 0
+        return len(self._results) if self._order is None else len(self._order)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        results = self._results
+        i = self._source_row(index.row())
+        column = index.column()
+
+        if role == QtCore.Qt.DisplayRole:
+            if column == 1:
+                return results.name(i)
+            elif column == 2:
+                return results.type(i)
+            elif column == 3:
+                return results.resolution_str(i)
+            elif column == SIMILARITY_COLUMN:
+                group = results.group(i)
+                if group is not None:
+                    # 查找重复图片：显示分组编号，建议保留的文件标记为“保留”，其余显示与它的相似度
+                    mark = "保留" if results.is_keeper(i) else f"{results.similarity(i):.4f}"
+                    return f"组 {group + 1} · {mark}"
+                text = f"{results.similarity(i):.4f}"
+                hash_similarity = results.hash_similarity(i)
+                if hash_similarity is not None:
+                    # 级联模式同时显示哈希相似度
+                    text += f" (哈希 {hash_similarity:.4f})"
+                source = results.source(i)
+                if source is not None:
+                    # 批量查询：显示对应的源图像
+                    text += f" (源 {os.path.basename(source)})"
+                return text
+        elif role == QtCore.Qt.DecorationRole and column == THUMBNAIL_COLUMN:
+            return self._thumbnail(results.path(i), results.mtime(i))
+        elif role == QtCore.Qt.ToolTipRole and column in (THUMBNAIL_COLUMN, 1):
+            return results.path(i)
+        elif role == QtCore.Qt.ToolTipRole and column == SIMILARITY_COLUMN:
+            source = results.source(i)
+            return None if source is None else f"源图像: {source}"
+        elif role == QtCore.Qt.BackgroundRole and column == SIMILARITY_COLUMN:
+            similarity = results.similarity(i)
+            level = 0 if similarity < 0.5 else 1 if similarity < 0.8 else 2
+            if level not in self._colors:
+                self._colors[level] = similarity_color(similarity)
+            return self._colors[level]
+        elif role == QtCore.Qt.TextAlignmentRole and column == THUMBNAIL_COLUMN:
+            return int(QtCore.Qt.AlignCenter)
+        return None
+
+    def _thumbnail(self, path, mtime):
+        """可见行的缩略图：已加载时直接返回，否则在后台请求并先返回占位图"""
+        if not self.load_thumbnails:
+            return None
+        loader = self.preview_loader
+        pixmap = loader.request(path, mtime)
+        if pixmap is None:
+            return loader.placeholder()
+        return pixmap if not pixmap.isNull() else None
+
+    def _on_preview_ready(self, path, pixmap):
+        # 只通知缩略图列发生变化，视图只会重绘可见的行
+        row_count = self.rowCount()
+        if row_count:
+            self.dataChanged.emit(self.index(0, THUMBNAIL_COLUMN),
+                                  self.index(row_count - 1, THUMBNAIL_COLUMN),
+                                  [QtCore.Qt.DecorationRole])
+
+    # ---- 结果操作 ----
+
+    def set_results(self, results):
+        """替换全部结果（ResultSet，按原顺序显示；None 清空表格），丢弃上一次尚未开始生成的缩略图"""
+        self.beginResetModel()
+        self._results = results
+        self._order = None
+        self._stream_keys = []
+        self._sort_keys = {}
+        self.endResetModel()
+        if self._preview_loader is not None:
+            self._preview_loader.cancel_pending()
+
+    def results(self):
+        """模型中的结果集（原顺序）"""
+        return self._results
+
+    def sort_by(self, mode):
+        """
+        按 SORT_MODES 中的排序方式重新排列行
+            排序键按字段计算一次后缓存，之后切换排序方式只需一次argsort；
+            通过 layoutChanged 通知视图，选中的行随结果移动，已加载的缩略图继续使用
+        """
+        import numpy as np
+
+        field, descending = SORT_MODES[mode]
+        keys = self._sort_keys.get(field)
+        if keys is None:
+            keys = self._sort_keys[field] = self._results.sort_key(field)
+        # 稳定排序：相同键的结果保持原顺序（与Python的sorted一致）
+        order = np.argsort(-keys if descending else keys, kind='stable')
+
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        sources = [self._source_row(index.row()) for index in persistent]
+        self._order = order
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+        self.changePersistentIndexList(
+            persistent, [self.index(int(inverse[source]), index.column()) for source, index in zip(sources, persistent)]
+        )
+        self.layoutChanged.emit()
+
+    def _source_row(self, row):
+        return row if self._order is None else int(self._order[row])
+
+    def add_streamed(self, batch, limit):
+        """
+        实时结果：追加到结果集，并按相似度从高到低插入表格
+            表格最多显示 limit 行（只保留相似度最高的部分），其余结果只保存在结果集中
+        """
+        if self._results is None:
+            from result_store import ResultSet  # 依赖numpy，在第一批结果到达时才导入
+            # 与搜索的各批结果共享路径表，追加时不重新登记路径
+            self.set_results(ResultSet(batch.path_table))
+            self._order = []
+        start = len(self._results)
+        self._results.extend(batch)
+        for offset, similarity in enumerate(batch.array['similarity'].tolist()):
+            key = -similarity
+            row = bisect.bisect_right(self._stream_keys, key)
+            if row >= limit:
+                continue
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self._stream_keys.insert(row, key)
+            self._order.insert(row, start + offset)
+            self.endInsertRows()
+            if len(self._order) > limit:
+                self.beginRemoveRows(QtCore.QModelIndex(), limit, limit)
+                self._stream_keys.pop()
+                self._order.pop()
+                self.endRemoveRows()
+
+    def redundant_rows(self):
+        """查找重复图片时，各组中除建议保留的文件以外的行（升序）"""
+        import numpy as np
+
+        if self._results is None:
+            return []
+        results = self._results
+        group = results.array['group']
+        # 结果集中同组相邻，组内第一条为建议保留的文件
+        keeper = np.concatenate([[True], group[1:] != group[:-1]]) if len(group) else np.zeros(0, dtype=bool)
+        redundant = (group >= 0) & ~keeper
+        if self._order is None:
+            return np.flatnonzero(redundant).tolist()
+        return np.flatnonzero(redundant[np.asarray(self._order, dtype=np.int64)]).tolist()
+
+    def path(self, row):
+        """返回指定行的文件路径"""
+        return self._results.path(self._source_row(row))
+
+    def cancel_thumbnails(self):
+        """丢弃尚未开始生成的缩略图请求（如快速滚动后，已滚出屏幕的行）"""
+        if self._preview_loader is not None:
+            self._preview_loader.cancel_pending()
+
+    def shutdown(self):
+        """等待后台缩略图任务结束（关闭窗口时调用）"""
+        if self._preview_loader is not None:
+            self._preview_loader.shutdown()
@@ -0,0 +1,258 @@
+# result_store.py - 列式搜索结果存储模块
+import os
+from datetime import datetime
+import numpy as np
+
+# 每条结果在结构化数组中占用的字段（48字节），显示用的字符串在需要时才生成
+RESULT_DTYPE = np.dtype([
+    ('path', np.int64),  # 路径在 PathTable 中的编号
+    ('mtime', np.float64),
+    ('width', np.int32),
+    ('height', np.int32),
+    ('similarity', np.float64),
+    ('hash_similarity', np.float64),  # 级联模式的哈希相似度，其他模式为NaN
+    ('group', np.int32),  # 查找重复图片时所属分组的编号（同组结果相邻，保留建议排在组内第一位），其他模式为-1
+    ('source', np.int32),  # 批量查询时对应的源图像在 PathTable 中的编号，单张源图像时为-1
+])
+
+
+class PathTable:
+    """路径驻留表：每个路径只保存一次，结果中只记录编号"""
+
+    def __init__(self):
+        self.paths = []
+        self._id_of = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, path_id):
+        return self.paths[path_id]
+
+    def get(self, path):
+        """返回路径的编号，不在表中时返回None"""
+        return self._id_of.get(path)
+
+    def intern(self, path):
+        """返回路径的编号（新路径追加到表中）"""
+        path_id = self._id_of.get(path)
+        if path_id is None:
+            path_id = self._id_of[path] = len(self.paths)
+            self.paths.append(path)
+        return path_id
+
+    def intern_many(self, paths):
+        return np.fromiter((self.intern(path) for path in paths), dtype=np.int64, count=len(paths))
+
+    def rename(self, old_path, new_path):
+        """修改路径（文件被重命名），引用该路径的结果随之改变"""
+        path_id = self._id_of.pop(old_path, None)
+        if path_id is None:
+            return False
+        self.paths[path_id] = new_path
+        self._id_of[new_path] = path_id
+        return True
+
+
+class ResultSet:
+    """
+    列式搜索结果集
+        数值字段保存在一个 RESULT_DTYPE 结构化数组中，路径通过共享的 PathTable 驻留；
+        文件名、类型、分辨率文字和日期在访问时由路径和数值生成，不为每条结果创建字典。
+        追加时按倍数扩容，实时结果可以逐批追加
+    """
+
+    def __init__(self, path_table=None, array=None):
+        self.path_table = path_table if path_table is not None else PathTable()
+        self._data = array if array is not None else np.zeros(0, dtype=RESULT_DTYPE)
+        self._size = len(self._data)
+        self._name_keys = None  # 按名称排序用的小写文件名数组，结果变化时清除
+
+    @classmethod
+    def from_columns(cls, paths, mtime, width, height, similarity, hash_similarity=None, group=None,
+                     source=None, path_table=None):
+        """由各字段的列构建结果集（paths 为路径列表，其余为同长度的数组或列表）"""
+        result_set = cls(path_table)
+        result_set.append_columns(paths, mtime, width, height, similarity, hash_similarity, group, source)
+        return result_set
+
+    @property
+    def array(self):
+        """有效部分的结构化数组（视图）"""
+        return self._data[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return (self.record(i) for i in range(self._size))
+
+    def __getitem__(self, i):
+        return self.record(i)
+
+    def append_columns(self, paths, mtime, width, height, similarity, hash_similarity=None, group=None,
+                       source=None):
+        """追加一批结果（source 为源图像在本结果集路径表中的编号）"""
+        count = len(paths)
+        if count == 0:
+            return
+        if self._size + count > len(self._data):
+            data = np.zeros(max(self._size + count, len(self._data) * 2, 64), dtype=RESULT_DTYPE)
+            data[:self._size] = self.array
+            self._data = data
+        block = self._data[self._size:self._size + count]
+        block['path'] = self.path_table.intern_many(paths)
+        block['mtime'] = mtime
+        block['width'] = width
+        block['height'] = height
+        block['similarity'] = similarity
+        block['hash_similarity'] = np.nan if hash_similarity is None else hash_similarity
+        block['group'] = -1 if group is None else group
+        block['source'] = -1 if source is None else source
+        self._size += count
+        self._name_keys = None
+
+    def extend(self, other):
+        """追加另一个结果集中的全部结果"""
+        if other.path_table is self.path_table:
+            array = other.array
+            count = len(array)
+            if self._size + count > len(self._data):
+                data = np.zeros(max(self._size + count, len(self._data) * 2, 64), dtype=RESULT_DTYPE)
+                data[:self._size] = self.array
+                self._data = data
+            self._data[self._size:self._size + count] = array
+            self._size += count
+            self._name_keys = None
+        else:
+            array = other.array
+            source = np.array([-1 if i < 0 else self.path_table.intern(other.path_table[i])
+                               for i in array['source'].tolist()], dtype=np.int32)
+            self.append_columns([other.path_table[i] for i in array['path']], array['mtime'], array['width'],
+                                array['height'], array['similarity'], array['hash_similarity'], array['group'],
+                                source)
+
+    def select(self, index):
+        """按布尔掩码、下标数组或切片选出部分结果，返回新的结果集（共享路径表）"""
+        return ResultSet(self.path_table, np.ascontiguousarray(self.array[index]))
+
+    def filter(self, min_similarity, max_similarity):
+        """返回相似度在 [min_similarity, max_similarity] 范围内的结果"""
+        similarity = self.array['similarity']
+        return self.select((similarity >= min_similarity) & (similarity <= max_similarity))
+
+    def sorted(self):
+        """按相似度从高到低排序（稳定排序；批量查询时先按源图像分组），返回新的结果集"""
+        array = self.array
+        return self.select(np.lexsort((-array['similarity'], array['source'])))
+
+    def remove_paths(self, paths):
+        """移除指定路径的结果（如文件已被删除），返回移除的数量"""
+        path_ids = [path_id for path_id in map(self.path_table.get, paths) if path_id is not None]
+        keep = ~np.isin(self.array['path'], path_ids)
+        removed = self._size - int(keep.sum())
+        if removed:
+            self._data = np.ascontiguousarray(self.array[keep])
+            self._size = len(self._data)
+            self._name_keys = None
+        return removed
+
+    def rename_path(self, old_path, new_path):
+        """修改结果中的路径（文件被重命名）"""
+        renamed = self.path_table.rename(old_path, new_path)
+        if renamed:
+            self._name_keys = None
+        return renamed
+
+    # ---- 按行访问（显示时使用） ----
+
+    def path(self, i):
+        return self.path_table[int(self._data['path'][i])]
+
+    def name(self, i):
+        return os.path.basename(self.path(i))
+
+    def type(self, i):
+        return os.path.splitext(self.path(i))[1][1:].upper()
+
+    def mtime(self, i):
+        return float(self._data['mtime'][i])
+
+    def similarity(self, i):
+        return float(self._data['similarity'][i])
+
+    def hash_similarity(self, i):
+        """级联模式的哈希相似度，其他模式返回None"""
+        value = float(self._data['hash_similarity'][i])
+        return None if np.isnan(value) else value
+
+    def group(self, i):
+        """查找重复图片时所属分组的编号，其他模式返回None"""
+        group = int(self._data['group'][i])
+        return None if group < 0 else group
+
+    def is_keeper(self, i):
+        """是否为所在分组中建议保留的文件（组内排在第一位的结果）"""
+        group = self._data['group'][i]
+        return bool(group >= 0 and (i == 0 or self._data['group'][i - 1] != group))
+
+    def source(self, i):
+        """批量查询时对应的源图像路径，单张源图像时返回None"""
+        source = int(self._data['source'][i])
+        return None if source < 0 else self.path_table[source]
+
+    def resolution_str(self, i):
+        return f"{int(self._data['width'][i])} × {int(self._data['height'][i])}"
+
+    def record(self, i):
+        """第i条结果的字典形式（用于导出JSON等，显示时请使用上面的按行访问方法）"""
+        row = self._data[i]
+        width, height = int(row['width']), int(row['height'])
+        path = self.path(i)
+        record = {
+            'path': path,
+            'name': os.path.basename(path),
+            'type': os.path.splitext(path)[1][1:].upper(),
+            'date': datetime.fromtimestamp(float(row['mtime'])),
+            'mtime': float(row['mtime']),
+            'resolution': width * height,
+            'resolution_str': f"{width} × {height}",
+            'width': width,
+            'height': height,
+            'similarity': float(row['similarity']),
+        }
+        hash_similarity = self.hash_similarity(i)
+        if hash_similarity is not None:
+            record['hash_similarity'] = hash_similarity
+            record['ssim_similarity'] = record['similarity']
+        source = self.source(i)
+        if source is not None:
+            record['source'] = source
+        group = self.group(i)
+        if group is not None:
+            record['group'] = group
+            record['keeper'] = self.is_keeper(i)
+        return record
+
+    # ---- 排序键 ----
+
+    def sort_key(self, field):
+        """
+        排序键数组
+            field: 'similarity' / 'mtime' / 'resolution' / 'group' / 'source'（数值）
+                   或 'name'（小写文件名）/ 'type'（扩展名）
+        """
+        array = self.array
+        if field in ('similarity', 'mtime', 'group', 'source'):
+            return array[field]
+        elif field == 'resolution':
+            return array['width'].astype(np.int64) * array['height']
+        elif field == 'name':
+            if self._name_keys is None:
+                names = [os.path.basename(path).lower() for path in self.path_table.paths]
+                self._name_keys = np.array(names, dtype=str)[array['path']] if names else np.zeros(0, dtype=str)
+            return self._name_keys
+        elif field == 'type':
+            types = [os.path.splitext(path)[1][1:].upper() for path in self.path_table.paths]
+            return np.array(types, dtype=str)[array['path']] if types else np.zeros(0, dtype=str)
+        raise ValueError(f"未知的排序字段: {field}")
@@ -0,0 +1,822 @@
+# search_engine.py - 无界面的搜索引擎模块
+#
+# 扫描 → 哈希/SSIM → 筛选 → 排序 的完整流程，不依赖 qtpy、psutil 和 DCCdetect，
+# 可以在批处理脚本、CI 或 Blender 的 Python 中直接导入使用，也可以在命令行中运行:
+#   python -m search_engine source.png dir1 dir2 --algo phash --min 0.9 --json
+import os
+import sys
+import json
+import time
+import argparse
+from functools import partial
+import numpy as np
+from image_processor import (compute_source_hashes, compute_ssim_thumbnail, hash_record,
+                             process_cached_ssim, ssim_record)
+from hash_engine import HASH_BITS, compare_hashes, max_distance_for, popcount
+from worker_pool import WorkerPool, map_chunk
+from file_scanner import scan_images
+from hash_index import DIGEST_COLUMNS, HashIndex
+from content_digest import ExactCopyFinder, copy_record
+from thumbnail_cache import ThumbnailCache
+from result_store import ResultSet
+from shared_results import SharedRecordBuffer, STATUS_OK, map_chunk_shared
+
+# 搜索参数的默认值，见 SearchEngine.search
+DEFAULT_PARAMS = {
+    'algorithm': 'hash',  # 'hash' / 'ssim' / 'cascade'
+    'hash_name': 'phash',  # 'phash' / 'ahash' / 'dhash'
+    'hash_type': 0,  # 界面中哈希下拉框的序号，随结果保存到历史记录
+    'ssim_cache': True,  # SSIM是否使用缩略图缓存
+    'cascade_topk': 200,
+    'cascade_threshold': 0.0,
+    'filter_enabled': False,
+    'min_similarity': 0.0,
+    'max_similarity': 1.0,
+    'watched': False,  # 文件夹监视已保证索引与磁盘一致时为True
+}
+
+
+class SearchCanceled(Exception):
+    """搜索被用户取消"""
+
+
+def rank_hash_records(hash_search, hash_name, filter_enabled, min_similarity, max_similarity,
+                      use_multi_index=True, path_table=None):
+    """
+    使用哈希搜索的记录计算相似度并应用筛选
+        hash_search: 搜索完成后保存的 {'source_hashes', 'batch', 'snapshot', 'rows'} 字典
+                     batch 不为空时为批量查询，见 rank_hash_batch
+        use_multi_index: 是否使用多索引哈希（只对少量行排名时直接线性比较更快）
+        path_table: 结果使用的路径表（同一次搜索的多批结果共享）
+
+    返回值:
+        ResultSet，直接由索引快照的数组构建，不为每条结果创建字典
+    """
+    if hash_search.get('batch'):
+        return rank_hash_batch(hash_search, hash_name, filter_enabled, min_similarity, max_similarity,
+                               path_table=path_table)
+    snapshot = hash_search['snapshot']
+    rows = hash_search['rows']
+    source_hash = hash_search['source_hashes'][hash_name]
+
+    # 启用相似度筛选时使用多索引哈希，只访问汉明距离可能满足条件的条目
+    if filter_enabled and use_multi_index:
+        candidates = snapshot.multi_index(hash_name).query(source_hash, max_distance_for(min_similarity))
+        if candidates is not None:
+            in_search = np.zeros(len(snapshot), dtype=bool)
+            in_search[rows] = True
+            rows = candidates[in_search[candidates]]
+
+    similarities, mask = compare_hashes(
+        source_hash, snapshot.packed[hash_name][rows],
+        min_similarity, max_similarity, filter_enabled
+    )
+    rows = rows[mask]
+    return ResultSet.from_columns(
+        [snapshot.paths[row] for row in rows], snapshot.mtime[rows],
+        snapshot.width[rows], snapshot.height[rows], similarities[mask], path_table=path_table
+    )
+
+
+def rank_hash_batch(hash_search, hash_name, filter_enabled, min_similarity, max_similarity,
+                    path_table=None, block_size=1 << 16):
+    """
+    批量查询：全部源图像与每个目标文件的哈希在一次向量化计算中比较
+        hash_search['batch']: [(源图像路径, {哈希名称: 整数})]
+        目标按 block_size 分块，每块计算 源图像数 × 目标数 的汉明距离矩阵，每个目标的哈希只读取一次
+
+    返回值:
+        ResultSet，每条结果的 source 为对应源图像的路径编号
+    """
+    snapshot = hash_search['snapshot']
+    rows = hash_search['rows']
+    batch = hash_search['batch']
+    results = ResultSet(path_table)
+    source_ids = results.path_table.intern_many([path for path, _ in batch])
+    sources = np.array([hashes[hash_name] for _, hashes in batch], dtype=np.int64).view(np.uint64)
+    packed = snapshot.packed[hash_name]
+
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        distances = popcount(np.bitwise_xor(packed[block][None, :], sources[:, None]))
+        similarities = 1 - distances / HASH_BITS
+        if filter_enabled:
+            mask = (similarities >= min_similarity) & (similarities <= max_similarity)
+        else:
+            mask = np.ones(similarities.shape, dtype=bool)
+        source_index, position = np.nonzero(mask)
+        block_rows = block[position]
+        results.append_columns(
+            [snapshot.paths[row] for row in block_rows], snapshot.mtime[block_rows],
+            snapshot.width[block_rows], snapshot.height[block_rows], similarities[source_index, position],
+            source=source_ids[source_index]
+        )
+    return results
+
+
+class SearchEngine:
+    """
+    无界面的图像相似度搜索引擎
+        通过回调函数报告进度、状态和实时结果，回调在调用 search 的线程中执行；
+        未传入的索引、缩略图缓存和进程池在第一次使用时由引擎创建，并在 close 时释放
+    """
+
+    PROGRESS_INTERVAL = 0.05  # 进度回调的最小间隔（秒）
+    STREAM_CHUNK_SIZE = 32  # 边扫描边处理时每批提交给进程池的文件数
+
+    def __init__(self, hash_index=None, thumbnail_cache=None, worker_pool=None,
+                 on_progress=None, on_status=None, on_results=None):
+        """
+        on_progress(done, total, stage): 进度（total为0表示总数未知）
+        on_status(message): 阶段状态消息
+        on_results(results): 计算过程中新产生的符合条件的结果
+        """
+        self._owned = []
+        self._hash_index = hash_index
+        self._thumbnail_cache = thumbnail_cache
+        self._worker_pool = worker_pool
+        self._on_progress = on_progress or (lambda done, total, stage: None)
+        self._on_status = on_status or (lambda message: None)
+        self._on_results = on_results or (lambda results: None)
+        self.params = dict(DEFAULT_PARAMS)
+        self._path_table = None  # 当前搜索的结果共享的路径表
+        self._cancel_requested = False
+        self._last_progress = 0
+        self.total_files = 0  # 已扫描到的图像文件数
+
+    @property
+    def hash_index(self):
+        if self._hash_index is None:
+            self._hash_index = HashIndex()
+            self._owned.append(self._hash_index.close)
+        return self._hash_index
+
+    @property
+    def thumbnail_cache(self):
+        if self._thumbnail_cache is None:
+            self._thumbnail_cache = ThumbnailCache()
+            self._owned.append(self._thumbnail_cache.close)
+        return self._thumbnail_cache
+
+    @property
+    def worker_pool(self):
+        if self._worker_pool is None:
+            self._worker_pool = WorkerPool()
+            self._owned.append(self._worker_pool.shutdown)
+        return self._worker_pool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """释放由引擎自己创建的资源"""
+        for release in reversed(self._owned):
+            release()
+        self._owned = []
+
+    def cancel(self):
+        """请求取消搜索（可从任意线程调用）"""
+        self._cancel_requested = True
+
+    def _check_canceled(self):
+        if self._cancel_requested:
+            raise SearchCanceled()
+
+    def _report_progress(self, done, total, stage, force=False):
+        now = time.monotonic()
+        if force or done == total or now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self._on_progress(done, total, stage)
+
+    def _run_pool(self, func, items, stage, on_result=None, record_kind=None):
+        """
+        在常驻进程池中分批处理任务，按完成顺序增量取回结果
+            items: 任务列表，或边扫描边产出任务的可迭代对象（此时进度总数随扫描增长）
+            on_result: 每批结果到达时的回调
+            record_kind: 指定时（shared_results.RECORD_DTYPES 中的名称）结果通过共享内存传输：
+                         func(item) 返回一条固定格式的记录，工作进程直接写入共享内存，只通过管道返回错误信息；
+                         on_result(任务列表, 记录数组) 中的记录数组直接引用共享内存，回调返回后即被复用，
+                         需要保留的数据请复制
+
+        返回值:
+            全部结果（完成顺序；使用共享内存时为处理失败的 [(任务, 错误信息)]）
+        """
+        if isinstance(items, list):
+            chunksize = min(max(len(items) // (self.worker_pool.processes * 4), 1), 100)
+        else:
+            chunksize = self.STREAM_CHUNK_SIZE
+        pool = None
+        buffer = None
+        if record_kind is not None:
+            # 每个进程最多同时有4批任务在途，槽用完时等待已完成的批次释放，共享内存的大小固定
+            buffer = SharedRecordBuffer(record_kind, chunksize, self.worker_pool.processes * 4)
+        pending = []  # (异步结果, 任务列表, 共享内存中的起始行, 第一个任务的序号)
+        results = []
+        submitted = 0
+        done = 0
+
+        def collect(block):
+            # 取回已完成的批次，block为True时没有完成的批次则最多等待一个进度间隔
+            nonlocal pending, done
+            if block and not any(entry[0].ready() for entry in pending):
+                pending[0][0].wait(self.PROGRESS_INTERVAL)
+            still_pending = []
+            for entry in pending:
+                async_result, chunk, offset, first_index = entry
+                if not async_result.ready():
+                    still_pending.append(entry)
+                    continue
+                chunk_results = async_result.get()
+                done += len(chunk)
+                if buffer is None:
+                    results.extend(chunk_results)
+                    if on_result is not None:
+                        on_result(chunk_results)
+                else:
+                    results.extend((chunk[index - first_index], message) for index, message in chunk_results)
+                    if on_result is not None:
+                        on_result(chunk, buffer.view(offset, len(chunk)))
+                    buffer.release(offset)
+            pending = still_pending
+            self._report_progress(done, submitted, stage)
+
+        def submit(chunk):
+            nonlocal pool, submitted
+            if pool is None:
+                pool = self.worker_pool.get()
+            if buffer is None:
+                pending.append((pool.apply_async(map_chunk, (func, chunk)), chunk, None, submitted))
+            else:
+                while not buffer.has_free_slot():
+                    self._check_canceled()
+                    collect(block=True)
+                offset = buffer.acquire()
+                args = (func, buffer.name, record_kind, offset, submitted, chunk)
+                pending.append((pool.apply_async(map_chunk_shared, args), chunk, offset, submitted))
+            submitted += len(chunk)
+
+        try:
+            chunk = []
+            for item in items:
+                self._check_canceled()
+                chunk.append(item)
+                if len(chunk) >= chunksize:
+                    submit(chunk)
+                    chunk = []
+                    collect(block=False)
+            if chunk:
+                submit(chunk)
+            while pending:
+                self._check_canceled()
+                collect(block=True)
+        except BaseException:
+            # 取消或出错：终止正在执行的任务（它们可能仍在写入共享内存）并在后台重启进程池
+            if pending:
+                self.worker_pool.reset()
+            raise
+        finally:
+            if buffer is not None:
+                buffer.close()
+        return results
+
+    def search(self, source_image, search_folders, **params):
+        """
+        执行一次搜索
+            source_image: 源图像路径，或多个源图像路径的列表（批量查询：只扫描一次文件夹，
+                          每个目标文件只解码一次，与全部源图像同时比较；支持哈希和使用缩略图缓存的SSIM）
+            search_folders: 搜索文件夹列表（递归）
+            params: 其他参数，见 DEFAULT_PARAMS
+
+        返回值:
+            {'results', 'total_files', 'filtered_count', 'prefiltered_count', 'hash_search', 'params'}
+            filtered_count 为不符合相似度条件的文件数；prefiltered_count 为级联模式中未进入SSIM重排的文件数
+            results 按相似度从高到低排序（批量查询时先按源图像分组）；取消时抛出 SearchCanceled
+            （在搜索开始前调用 cancel 同样有效，搜索结束后取消标志自动清除）
+        """
+        for key in params:
+            if key not in DEFAULT_PARAMS:
+                raise TypeError(f"未知的搜索参数: {key}")
+        source_images = [source_image] if isinstance(source_image, str) else list(dict.fromkeys(source_image))
+        if not source_images:
+            raise ValueError("没有源图像")
+        self.params = dict(DEFAULT_PARAMS, source_image=source_images[0], source_images=source_images,
+                           search_folders=list(search_folders), **params)
+        self.total_files = 0
+        self._path_table = None
+        try:
+            self._check_canceled()
+            return self._search(self.params)
+        finally:
+            self._cancel_requested = False
+
+    def find_duplicates(self, search_folders, hash_name='phash', min_similarity=None, watched=False):
+        """
+        查找文件夹中近似重复的图片分组（不需要源图像），见 duplicate_finder.cluster_duplicates
+            先像哈希搜索一样确保全部文件都在哈希索引中，再在索引快照上做多索引哈希自连接
+            min_similarity: 判定为重复的最小哈希相似度，默认 duplicate_finder.DUPLICATE_SIMILARITY
+
+        返回值:
+            {'results', 'groups', 'wasted_bytes', 'total_files', 'params'}
+            results 为按分组排列的 ResultSet，wasted_bytes 为各组可释放的字节数；取消时抛出 SearchCanceled
+        """
+        from duplicate_finder import DUPLICATE_SIMILARITY, cluster_duplicates
+
+        if min_similarity is None:
+            min_similarity = DUPLICATE_SIMILARITY
+        self.params = dict(DEFAULT_PARAMS, algorithm='duplicates', source_image=None, source_images=[],
+                           search_folders=list(search_folders), hash_name=hash_name,
+                           filter_enabled=True, min_similarity=min_similarity, watched=watched)
+        self.total_files = 0
+        self._path_table = None
+        try:
+            self._check_canceled()
+            snapshot = self.hash_index.snapshot()
+            rows = self._index_hashes(self._scan(), snapshot)
+            self._on_status(f"正在查找 {len(rows)} 个文件中的重复图片...")
+
+            def on_step(done, total):
+                self._check_canceled()
+                self._report_progress(done, total, "查找重复图片...")
+
+            results, wasted_bytes = cluster_duplicates(snapshot, rows, hash_name, min_similarity, on_step=on_step)
+            return {'results': results, 'groups': len(wasted_bytes), 'wasted_bytes': wasted_bytes,
+                    'total_files': self.total_files, 'params': self.params}
+        finally:
+            self._cancel_requested = False
+
+    def _search(self, params):
+        summary = {'results': ResultSet(), 'total_files': 0, 'filtered_count': 0, 'prefiltered_count': 0,
+                   'hash_search': None, 'params': params}
+        # 本次搜索的全部结果（包括流式发送的各批）共享一个路径表，每个路径只保存一次
+        self._path_table = summary['results'].path_table
+        source_images = params['source_images']
+        algorithm = params['algorithm']
+        if len(source_images) > 1:
+            if not (algorithm == 'hash' or (algorithm == 'ssim' and params['ssim_cache'])):
+                raise ValueError("批量查询只支持哈希算法和使用缩略图缓存的SSIM")
+            # 源图像先登记到路径表，编号与源图像的顺序一致，结果按编号分组即按源图像顺序
+            self._path_table.intern_many(source_images)
+
+        # 扫描与计算同时进行：每个目录扫描完成后，其中的文件立即提交给工作进程
+        # 哈希和SSIM模式在计算过程中通过 on_results 流式发送符合条件的结果，
+        # 级联模式的最终相似度要到第二阶段才能确定，只在完成时一次性返回
+        batches = self._scan()
+        if algorithm == 'ssim' and params['ssim_cache']:
+            results = self._filter(self._search_ssim_cached(batches, stream=True))
+        elif algorithm == 'ssim':
+            results = self._search_ssim_full(batches)
+        elif algorithm == 'cascade':
+            summary['hash_search'] = self._search_hash(batches)
+            results = self._rerank_with_ssim(summary['hash_search'])
+            # 未进入SSIM重排的文件（低于哈希阈值、排在前K个之外或无法生成缩略图）单独统计，不算作被相似度筛选
+            summary['prefiltered_count'] = self.total_files - len(results)
+            results = self._filter(results)
+        elif algorithm == 'hash':
+            summary['hash_search'] = self._search_hash(batches, stream=True)
+            results = rank_hash_records(
+                summary['hash_search'], params['hash_name'], params['filter_enabled'],
+                params['min_similarity'], params['max_similarity'], path_table=self._path_table
+            )
+        else:
+            raise ValueError(f"未知的搜索算法: {algorithm}")
+
+        total_files = summary['total_files'] = self.total_files
+        if total_files == 0:
+            summary['hash_search'] = None
+            return summary
+
+        # 计算筛选统计（包括处理失败的文件，批量查询时按 源图像 × 文件 计数），结果按相似度排序
+        results = results.sorted()
+        summary['results'] = results
+        summary['filtered_count'] = (total_files * len(source_images) - summary['prefiltered_count']
+                                     - len(results))
+        return summary
+
+    def _scan(self):
+        """
+        扫描全部搜索文件夹（递归、扩展名不区分大小写），按目录分批产出条目并统计文件总数
+
+        产出:
+            [(路径, 文件大小, 修改时间)] 列表
+        """
+        self._on_status("正在扫描文件夹...")
+        for entries in scan_images(self.params['search_folders']):
+            self._check_canceled()
+            self.total_files += len(entries)
+            yield entries
+
+    def _filter(self, results):
+        """对结果集应用相似度筛选"""
+        params = self.params
+        if not params['filter_enabled']:
+            return results
+        return results.filter(params['min_similarity'], params['max_similarity'])
+
+    def _search_hash(self, batches, stream=False):
+        """
+        计算全部文件的哈希（未变化的文件直接使用索引）
+            batches: 扫描产出的条目批次，见 _scan
+            stream: 是否通过 on_results 流式发送符合条件的结果
+                    （索引命中的文件随扫描立即发送，新计算的文件每批写入索引后发送）
+
+        返回值:
+            {'source_image', 'source_images', 'source_hashes', 'batch', 'snapshot', 'rows'}，
+            供排名和切换哈希算法时使用；只有一个源图像时 batch 为None
+        """
+        params = self.params
+        source_images = params['source_images']
+        snapshot = self.hash_index.snapshot()
+        finder = ExactCopyFinder(snapshot)
+        batch = [(path, self._source_hashes(path, snapshot, finder)) for path in source_images]
+        source_hashes = batch[0][1]
+        if len(batch) == 1:
+            batch = None
+
+        def emit_rows(stream_rows):
+            hash_search = {'source_hashes': source_hashes, 'batch': batch, 'snapshot': snapshot, 'rows': stream_rows}
+            matches = rank_hash_records(
+                hash_search, params['hash_name'], params['filter_enabled'],
+                params['min_similarity'], params['max_similarity'], use_multi_index=False,
+                path_table=self._path_table
+            )
+            if len(matches):
+                self._on_results(matches)
+
+        rows = self._index_hashes(batches, snapshot, on_rows=emit_rows if stream else None, finder=finder)
+        return {
+            'source_image': params['source_image'],
+            'source_images': source_images,
+            'source_hashes': source_hashes,
+            'batch': batch,
+            'snapshot': snapshot,
+            'rows': rows,
+        }
+
+    def _source_hashes(self, source_image, snapshot, finder):
+        """源图像的哈希：源图像本身或与它内容完全相同的文件已在索引中时直接使用索引中的哈希，不解码"""
+        stat = os.stat(source_image)
+        entry = (source_image, stat.st_size, stat.st_mtime)
+        rows, _ = snapshot.find_rows([entry])
+        row = int(rows[0]) if len(rows) else finder.match(entry, register=False)[0]
+        if row is None:
+            return compute_source_hashes(source_image)
+        return snapshot.hashes(row)
+
+    def _index_hashes(self, batches, snapshot, on_rows=None, finder=None):
+        """
+        确保扫描到的全部文件都在哈希索引中（未变化的文件直接使用索引，其余由工作进程计算并写入）
+            on_rows(rows): 每批文件可用时调用（索引命中的文件随扫描调用，新计算的文件每批写入索引后调用）
+            参数 watched 为True时（文件夹监视已保证索引与磁盘一致），直接使用索引中的文件列表，不扫描文件夹
+            finder: 识别字节完全相同文件的 ExactCopyFinder（不指定时新建）：
+                    与已索引的文件或本次已提交的文件内容相同的新文件直接复制记录，不交给工作进程解码
+
+        返回值:
+            全部文件在索引快照中的行号数组
+        """
+        params = self.params
+        if params.get('watched'):
+            rows = snapshot.rows_under(params['search_folders'])
+            self.total_files = len(rows)
+            self._on_status(f"文件夹监视中，直接使用索引中的 {len(rows)} 个文件")
+            if on_rows is not None and len(rows):
+                on_rows(rows)
+            return rows
+
+        if finder is None:
+            finder = ExactCopyFinder(snapshot)
+        hit_rows = []
+        new_rows = []
+        copied_rows = []
+        deferred = []  # (条目, 内容相同且正在计算的条目)
+
+        def store_copies(pairs):
+            # 内容相同的文件直接复制已有记录的尺寸和哈希
+            if not pairs:
+                return
+            records = [copy_record(entry, snapshot, row, finder.digests(entry[0])) for entry, row in pairs]
+            self.hash_index.store_many(records)
+            rows = np.array([snapshot.row_of[r['path']] for r in records], dtype=np.int64)
+            copied_rows.append(rows)
+            if on_rows is not None:
+                on_rows(rows)
+
+        def scan_missing():
+            # 扫描到的文件先查索引，再排除与已知文件内容相同的文件，只把其余新增或修改过的文件交给工作进程
+            for batch in batches:
+                rows, missing = snapshot.find_rows(batch)
+                if len(rows):
+                    hit_rows.append(rows)
+                    if on_rows is not None:
+                        on_rows(rows)
+                copies = []
+                for entry in missing:
+                    row, original = finder.match(entry)
+                    if row is not None:
+                        copies.append((entry, row))
+                    elif original is not None:
+                        deferred.append((entry, original))
+                    else:
+                        yield entry
+                store_copies(copies)
+
+        def store_chunk(entries, records):
+            # 每批结果立即写入索引（同时更新内存快照），下次搜索时直接使用，取消时已完成的部分也不会丢失
+            # 路径、大小和修改时间取自主进程中的任务列表，工作进程只在共享内存中写入尺寸和哈希
+            ok = np.flatnonzero(records['status'] == STATUS_OK)
+            if not len(ok):
+                return
+            chunk_records = [
+                {'path': entries[i][0], 'size': entries[i][1], 'mtime': entries[i][2],
+                 'width': width, 'height': height, 'phash': phash, 'ahash': ahash, 'dhash': dhash,
+                 **dict(zip(DIGEST_COLUMNS, finder.digests(entries[i][0])))}
+                for i, width, height, phash, ahash, dhash in zip(
+                    ok.tolist(), records['width'][ok].tolist(), records['height'][ok].tolist(),
+                    records['phash'][ok].tolist(), records['ahash'][ok].tolist(), records['dhash'][ok].tolist()
+                )
+            ]
+            self.hash_index.store_many(chunk_records)
+            chunk_rows = np.array([snapshot.row_of[r['path']] for r in chunk_records], dtype=np.int64)
+            new_rows.append(chunk_rows)
+            if on_rows is not None:
+                on_rows(chunk_rows)
+
+        # 每个文件只解码一次，同时计算三种哈希
+        errors = self._run_pool(hash_record, scan_missing(), "计算图像哈希...",
+                                on_result=store_chunk, record_kind='hash')
+
+        # 与本次新计算的文件内容相同的文件，在其记录写入索引后复制（原文件处理失败时同样记为失败）
+        failed = {entry[0]: message for entry, message in errors}
+        copies = []
+        for entry, original in deferred:
+            if original[0] in failed:
+                errors.append((entry, failed[original[0]]))
+            else:
+                copies.append((entry, snapshot.row_of[original[0]]))
+        store_copies(copies)
+        self.hash_index.store_digests(finder.index_updates())
+
+        self._report_errors(errors)
+        hit_count = sum(len(rows) for rows in hit_rows)
+        copied_count = sum(len(rows) for rows in copied_rows)
+        computed_count = sum(len(rows) for rows in new_rows)
+        self._on_status(f"索引命中 {hit_count} 个文件，{copied_count} 个与已有文件内容相同，新计算 {computed_count} 个文件")
+        return np.concatenate([np.zeros(0, dtype=np.int64)] + hit_rows + copied_rows + new_rows)
+
+    def _rerank_with_ssim(self, hash_search):
+        """
+        级联模式第二阶段：取哈希相似度最高的前K个候选（可选哈希阈值），用SSIM重新评分
+            结果同时保留哈希相似度和SSIM相似度，'similarity' 为SSIM相似度
+        """
+        params = self.params
+        threshold = params['cascade_threshold']
+        candidates = rank_hash_records(hash_search, params['hash_name'], threshold > 0, threshold, 1.0,
+                                       path_table=self._path_table)
+        candidates = candidates.sorted().select(slice(0, params['cascade_topk']))
+        self._on_status(f"哈希预筛得到 {len(candidates)} 个候选，正在计算SSIM...")
+
+        # 候选文件的大小和修改时间直接取自索引快照，无需再次访问文件系统
+        snapshot = hash_search['snapshot']
+        entries = []
+        for i in range(len(candidates)):
+            path = candidates.path(i)
+            entries.append((path, int(snapshot.size[snapshot.row_of[path]]), candidates.mtime(i)))
+        ssim_results = self._search_ssim_cached([entries])
+
+        # 两个结果集共享路径表，按路径编号对应SSIM相似度（生成缩略图失败的候选被丢弃）
+        ssim_array = ssim_results.array
+        ssim_of = dict(zip(ssim_array['path'].tolist(), ssim_array['similarity'].tolist()))
+        array = candidates.array
+        keep = np.array([path_id in ssim_of for path_id in array['path'].tolist()], dtype=bool)
+        results = candidates.select(keep)
+        array = results.array
+        array['hash_similarity'] = array['similarity']
+        array['similarity'] = [ssim_of[path_id] for path_id in array['path'].tolist()]
+        return results
+
+    def _search_ssim_cached(self, batches, stream=False):
+        """
+        基于缩略图缓存的SSIM搜索
+            先为新增或修改过的文件生成规范缩略图（随扫描进行），再由进程池直接读取内存映射计算SSIM
+            batches: (路径, 文件大小, 修改时间) 条目批次
+            stream: 是否在每批相似度算完时通过 on_results 发送符合条件的结果
+
+        返回值:
+            全部结果的 ResultSet（未筛选）；批量查询时每个文件对每个源图像各有一条结果
+        """
+        cache = self.thumbnail_cache
+        source_images = self.params['source_images']
+        source_thumbnails = []
+        for source_image in source_images:
+            source_stat = os.stat(source_image)
+            source = compute_ssim_thumbnail((source_image, source_stat.st_size, source_stat.st_mtime))
+            if source is None:
+                raise ValueError(f"无法读取源图像: {source_image}")
+            source_thumbnails.append(source[3])
+        # 只有一个源图像时结果不记录 source
+        source_ids = self._path_table.intern_many(source_images) if len(source_images) > 1 else None
+
+        hits = []
+
+        def scan_missing():
+            for batch in batches:
+                batch_hits, missing = cache.find_rows(batch)
+                hits.extend(batch_hits)
+                yield from missing
+
+        def store_chunk(thumbnails):
+            hits.extend(cache.store_many([r for r in thumbnails if r is not None]))
+
+        self._run_pool(compute_ssim_thumbnail, scan_missing(), "生成缩略图...", on_result=store_chunk)
+        self._on_status(f"共 {len(hits)} 个缩略图，正在计算SSIM...")
+
+        # 按行号排序，提高内存映射的读取局部性
+        hits.sort(key=lambda hit: hit[4])
+        rows = [hit[4] for hit in hits]
+        # 各字段按列保存，工作进程返回的 (行号数组, 相似度数组) 按行号查找对应位置
+        position_of_row = {row: position for position, row in enumerate(rows)}
+        hit_paths = [hit[0] for hit in hits]
+        hit_mtime = np.array([hit[1] for hit in hits], dtype=np.float64)
+        hit_width = np.array([hit[2] for hit in hits], dtype=np.int32)
+        hit_height = np.array([hit[3] for hit in hits], dtype=np.int32)
+        chunk = 256
+        row_chunks = [rows[i:i + chunk] for i in range(0, len(rows), chunk)]
+        worker_func = partial(
+            process_cached_ssim,
+            cache_file=cache.cache_file,
+            capacity=cache.capacity,
+            source_thumbnails=source_thumbnails
+        )
+
+        results = ResultSet(self._path_table)
+
+        def collect(parts):
+            for part_rows, similarities in parts:
+                positions = np.array([position_of_row[row] for row in part_rows.tolist()], dtype=np.int64)
+                # 相似度为 (源图像数, 行数)，按源图像依次展开，其余列对每个源图像重复
+                sources = len(similarities)
+                part_results = ResultSet.from_columns(
+                    [hit_paths[position] for position in positions] * sources, np.tile(hit_mtime[positions], sources),
+                    np.tile(hit_width[positions], sources), np.tile(hit_height[positions], sources),
+                    similarities.reshape(-1), path_table=self._path_table,
+                    source=None if source_ids is None else np.repeat(source_ids, len(positions))
+                )
+                results.extend(part_results)
+                if stream:
+                    matches = self._filter(part_results)
+                    if len(matches):
+                        self._on_results(matches)
+
+        self._run_pool(worker_func, row_chunks, "计算SSIM相似度...", on_result=collect)
+        return results
+
+    def _search_ssim_full(self, batches):
+        """
+        对原始图像计算SSIM（随扫描进行），每个工作进程在第一次使用时预处理一次源图像并缓存
+            工作进程把相似度、尺寸和筛选状态写入共享内存，主进程按任务顺序对应路径，无需传回路径
+        """
+        params = self.params
+        worker_func = partial(
+            ssim_record,
+            source_image_path=params['source_image'],
+            min_similarity=params['min_similarity'],
+            max_similarity=params['max_similarity'],
+            filter_enabled=params['filter_enabled']
+        )
+        results = ResultSet(self._path_table)
+
+        def collect(entries, records):
+            ok = np.flatnonzero(records['status'] == STATUS_OK)
+            if not len(ok):
+                return
+            # 从共享内存复制出需要的列（append_columns 复制数据），之后该槽即可复用
+            matches = ResultSet.from_columns(
+                [entries[i][0] for i in ok.tolist()], records['mtime'][ok], records['width'][ok],
+                records['height'][ok], records['similarity'][ok], path_table=self._path_table
+            )
+            results.extend(matches)
+            self._on_results(matches)
+
+        entries = (entry for batch in batches for entry in batch)
+        errors = self._run_pool(worker_func, entries, "计算图像相似度...", on_result=collect, record_kind='ssim')
+        self._report_errors(errors)
+        return results
+
+    def _report_errors(self, errors):
+        """输出工作进程通过返回值传回的错误信息（处理失败的文件不计入结果）"""
+        for entry, message in errors:
+            print(f"处理图像 {entry[0]} 时出错: {message}", file=sys.stderr)
+        if errors:
+            self._on_status(f"{len(errors)} 个文件无法处理")
+
+
+def result_to_json(result):
+    """将结果字典（见 ResultSet.record）转换为可序列化为JSON的字典"""
+    item = {key: result[key] for key in ('path', 'name', 'type', 'width', 'height', 'similarity')}
+    item['mtime'] = result['mtime']
+    for key in ('hash_similarity', 'ssim_similarity', 'group', 'keeper', 'source'):
+        if key in result:
+            item[key] = result[key]
+    return item
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m search_engine",
+                                     description="在文件夹（含子文件夹）中搜索与源图像相似的图像")
+    parser.add_argument('source', help="源图像路径")
+    parser.add_argument('folders', nargs='+', help="搜索文件夹")
+    parser.add_argument('--also', action='append', default=[], metavar='SOURCE',
+                        help="批量查询的其他源图像（可多次指定，只扫描一次文件夹）")
+    parser.add_argument('--algo', choices=['phash', 'ahash', 'dhash', 'ssim', 'cascade'], default='phash',
+                        help="相似度算法（默认 phash）")
+    parser.add_argument('--cascade-hash', choices=['phash', 'ahash', 'dhash'], default='phash',
+                        help="级联模式预筛使用的哈希")
+    parser.add_argument('--topk', type=int, default=200, help="级联模式参与SSIM重排的候选数")
+    parser.add_argument('--min', type=float, dest='min_similarity', help="最小相似度（指定后启用筛选）")
+    parser.add_argument('--max', type=float, dest='max_similarity', help="最大相似度（指定后启用筛选）")
+    parser.add_argument('--limit', type=int, help="只输出相似度最高的N个结果（批量查询时每个源图像N个）")
+    parser.add_argument('--no-ssim-cache', action='store_true', help="SSIM直接读取原图，不使用缩略图缓存")
+    parser.add_argument('--index', default="image_similarity_index.db", help="哈希索引文件")
+    parser.add_argument('--thumbs', default="image_similarity_thumbs",
+                        help="缩略图缓存文件前缀（生成 .u8 和 .db 两个文件）")
+    parser.add_argument('--workers', type=int, help="工作进程数（默认CPU核心数）")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出结果")
+    parser.add_argument('--quiet', action='store_true', help="不输出进度信息")
+    args = parser.parse_args(argv)
+
+    sources = [args.source] + args.also
+    for source in sources:
+        if not os.path.isfile(source):
+            parser.error(f"源图像不存在: {source}")
+    if args.also and (args.algo == 'cascade' or (args.algo == 'ssim' and args.no_ssim_cache)):
+        parser.error("--also 批量查询只支持哈希算法和使用缩略图缓存的SSIM")
+
+    params = {'filter_enabled': args.min_similarity is not None or args.max_similarity is not None,
+              'min_similarity': args.min_similarity if args.min_similarity is not None else 0.0,
+              'max_similarity': args.max_similarity if args.max_similarity is not None else 1.0,
+              'ssim_cache': not args.no_ssim_cache,
+              'cascade_topk': args.topk}
+    if args.algo in ('ssim', 'cascade'):
+        params['algorithm'] = args.algo
+        params['hash_name'] = args.cascade_hash
+    else:
+        params['algorithm'] = 'hash'
+        params['hash_name'] = args.algo
+
+    def show_progress(done, total, stage):
+        end = '\n' if total and done == total else ''
+        print(f"\r{stage} {done}/{total or '?'}", end=end, file=sys.stderr, flush=True)
+
+    def show_status(message):
+        print(f"\r{message}", file=sys.stderr, flush=True)
+
+    callbacks = {} if args.quiet else {'on_progress': show_progress, 'on_status': show_status}
+    hash_index = HashIndex(args.index) if params['algorithm'] != 'ssim' else None
+    thumbnail_cache = (ThumbnailCache(args.thumbs + ".u8", args.thumbs + ".db")
+                       if params['algorithm'] != 'hash' and params['ssim_cache'] else None)
+    worker_pool = WorkerPool(args.workers)
+    start = time.perf_counter()
+    try:
+        with SearchEngine(hash_index, thumbnail_cache, worker_pool, **callbacks) as engine:
+            summary = engine.search(sources if args.also else args.source, args.folders, **params)
+    except KeyboardInterrupt:
+        print("\n搜索已取消", file=sys.stderr)
+        return 130
+    finally:
+        worker_pool.shutdown()
+        for resource in (hash_index, thumbnail_cache):
+            if resource is not None:
+                resource.close()
+    elapsed = time.perf_counter() - start
+
+    results = summary['results']
+    if args.limit:
+        # 结果按源图像分组、组内按相似度排序，每组取前N个
+        source_column = results.array['source']
+        first = np.searchsorted(source_column, source_column, side='left')
+        results = results.select(np.flatnonzero(np.arange(len(results)) - first < args.limit))
+    if args.json:
+        json.dump({
+            'source': args.source,
+            'sources': sources,
+            'algorithm': args.algo,
+            'total_files': summary['total_files'],
+            'matched': len(summary['results']),
+            'elapsed': round(elapsed, 3),
+            'results': [result_to_json(r) for r in results],
+        }, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for i in range(len(results)):
+            source = f"{results.source(i)}\t" if args.also else ""
+            print(f"{source}{results.similarity(i):.4f}\t{results.resolution_str(i)}\t{results.path(i)}")
+        if not args.quiet:
+            print(f"共扫描 {summary['total_files']} 个文件，找到 {len(summary['results'])} 个结果，"
+                  f"耗时 {elapsed:.2f} 秒", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
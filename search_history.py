@@ -14,14 +14,14 @@ class SearchHistoryManager:
         self.max_history_items = 20  # 最大历史记录数量
         self.history_file = "image_similarity_history.json"
         self.history_menu_actions = []  # 历史记录菜单项
-
-        # 初始化时加载历史记录
-        self.load_history()
+        self.history_menu = None  # 历史记录菜单，见 create_history_menu
+        self.loaded = False  # 历史记录在窗口显示后才加载，见 load_history_deferred
         
     def add_history_item(self, source_image, search_folders, hash_method, results_count, algorithm_info=None):
         """添加新的历史记录"""
         if not source_image or not search_folders:
             return
+        self.ensure_loaded()  # 避免尚未加载时保存覆盖已有的历史记录
         
         # 创建历史记录条目
         history_item = {
@@ -67,8 +67,20 @@ class SearchHistoryManager:
         except Exception as e:
             print(f"保存历史记录失败: {e}")
     
+    def ensure_loaded(self):
+        """确保历史记录已从文件加载"""
+        if not self.loaded:
+            self.load_history()
+
+    def load_history_deferred(self):
+        """窗口显示后加载历史记录并刷新菜单，避免读取文件拖慢启动"""
+        self.ensure_loaded()
+        if self.history_menu is not None:
+            self.update_history_menu(self.history_menu)
+
     def load_history(self):
         """从文件加载历史记录"""
+        self.loaded = True
         try:
             if os.path.exists(self.history_file):
                 with open(self.history_file, 'r', encoding='utf-8') as f:
@@ -105,6 +117,7 @@ class SearchHistoryManager:
         history_menu.addSeparator()
         
         # 更新历史记录菜单项
+        self.history_menu = history_menu
         self.update_history_menu(history_menu)
         
         return history_menu
@@ -0,0 +1,69 @@
+# search_worker.py - 后台搜索线程模块
+import traceback
+from qtpy import QtCore
+from search_engine import SearchEngine, SearchCanceled
+
+
+class SearchWorker(QtCore.QObject):
+    """
+    后台搜索对象
+        在独立的QThread中运行 SearchEngine 的完整搜索流程，
+        通过信号向界面报告进度、部分结果、错误和完成状态
+    """
+
+    progress = QtCore.Signal(int, int, str)  # 已完成数量, 总数量, 阶段说明
+    status = QtCore.Signal(str)  # 状态栏消息
+    partial_results = QtCore.Signal(object)  # 新产生的结果（ResultSet）
+    error = QtCore.Signal(str)
+    canceled = QtCore.Signal()
+    finished = QtCore.Signal(dict)  # 搜索汇总，见 SearchEngine.search
+
+    def __init__(self, params, hash_index, thumbnail_cache, worker_pool):
+        """
+        params: 搜索参数字典
+            source_image（批量查询时为路径列表）, search_folders，以及 search_engine.DEFAULT_PARAMS 中的参数
+        """
+        super().__init__()
+        self.params = params
+        self.engine = SearchEngine(
+            hash_index, thumbnail_cache, worker_pool,
+            on_progress=self.progress.emit,
+            on_status=self.status.emit,
+            on_results=self.partial_results.emit
+        )
+
+    def cancel(self):
+        """请求取消搜索（可从任意线程调用）"""
+        self.engine.cancel()
+
+    @QtCore.Slot()
+    def run(self):
+        """执行搜索，结束时发出 finished、canceled 或 error 信号之一"""
+        try:
+            summary = self._execute()
+        except SearchCanceled:
+            self.canceled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.error.emit(str(e))
+        else:
+            self.finished.emit(summary)
+
+    def _execute(self):
+        params = dict(self.params)
+        source_image = params.pop('source_image')
+        search_folders = params.pop('search_folders')
+        return self.engine.search(source_image, search_folders, **params)
+
+
+class DuplicateWorker(SearchWorker):
+    """
+    后台查找重复图片对象
+        信号与 SearchWorker 相同，finished 发出 SearchEngine.find_duplicates 的汇总；
+        params: search_folders，以及 find_duplicates 的 hash_name、min_similarity、watched
+    """
+
+    def _execute(self):
+        params = dict(self.params)
+        search_folders = params.pop('search_folders')
+        return self.engine.find_duplicates(search_folders, **params)
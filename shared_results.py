@@ -0,0 +1,109 @@
+# shared_results.py - 工作进程与主进程之间的共享内存结果传输模块
+#
+# 主进程创建一块共享内存，划分为若干个固定大小的槽，每批任务占用一个槽；
+# 工作进程把每个任务的结果按固定的记录格式直接写入槽中对应的行，只通过管道返回出错信息，
+# 主进程在批次完成后直接读取共享内存中的记录（不经过pickle），处理完即释放该槽供下一批使用
+from multiprocessing import shared_memory
+import numpy as np
+
+# 记录状态
+STATUS_EMPTY = 0  # 未写入
+STATUS_OK = 1
+STATUS_FILTERED = 2  # 已计算但不符合相似度筛选条件
+STATUS_FAILED = 3  # 处理失败（错误信息通过返回值传回）
+
+# 记录格式：前两个字段固定为 任务序号、状态，其余字段与记录函数的返回值一一对应
+RECORD_DTYPES = {
+    # SSIM相似度（见 image_processor.ssim_record）
+    'ssim': np.dtype([
+        ('index', np.int64), ('status', np.int8),
+        ('similarity', np.float64), ('width', np.int32), ('height', np.int32), ('mtime', np.float64),
+    ]),
+    # 图像哈希（见 image_processor.hash_record）
+    'hash': np.dtype([
+        ('index', np.int64), ('status', np.int8),
+        ('width', np.int32), ('height', np.int32), ('phash', np.int64), ('ahash', np.int64), ('dhash', np.int64),
+    ]),
+}
+
+
+# 工作进程中已打开的共享内存，按名称缓存（同一次搜索的各批任务复用）
+_attached = {}
+
+
+def _records_in_worker(name, kind):
+    if name not in _attached:
+        for shm, _ in _attached.values():
+            shm.close()
+        _attached.clear()
+        # 进程池的工作进程与主进程共用同一个资源跟踪器，打开时的登记不会导致共享内存被提前删除
+        shm = shared_memory.SharedMemory(name=name)
+        dtype = RECORD_DTYPES[kind]
+        _attached[name] = (shm, np.ndarray((shm.size // dtype.itemsize,), dtype=dtype, buffer=shm.buf))
+    return _attached[name][1]
+
+
+def map_chunk_shared(func, name, kind, offset, first_index, items):
+    """
+    在工作进程中处理一批任务，结果写入共享内存从 offset 开始的行
+        func(item) 返回 (状态, 其余字段...)，抛出异常时记为 STATUS_FAILED
+
+    返回值:
+        [(任务序号, 错误信息)]，只包含处理失败的任务
+    """
+    records = _records_in_worker(name, kind)
+    errors = []
+    for i, item in enumerate(items):
+        index = first_index + i
+        try:
+            records[offset + i] = (index,) + tuple(func(item))
+        except Exception as e:
+            records[offset + i]['index'] = index
+            records[offset + i]['status'] = STATUS_FAILED
+            errors.append((index, str(e)))
+    return errors
+
+
+class SharedRecordBuffer:
+    """
+    主进程持有的共享内存记录缓冲区
+        划分为 slots 个槽，每个槽最多容纳 slot_size 条记录；
+        acquire 返回空闲槽的起始行，批次的结果处理完后调用 release 归还
+    """
+
+    def __init__(self, kind, slot_size, slots):
+        self.kind = kind
+        self.slot_size = slot_size
+        dtype = RECORD_DTYPES[kind]
+        self._shm = shared_memory.SharedMemory(create=True, size=max(dtype.itemsize * slot_size * slots, 1))
+        self.name = self._shm.name
+        self._records = np.ndarray((slot_size * slots,), dtype=dtype, buffer=self._shm.buf)
+        self._free = list(range(slots - 1, -1, -1))
+
+    def has_free_slot(self):
+        return bool(self._free)
+
+    def acquire(self):
+        """取得一个空闲槽，返回其起始行（没有空闲槽时抛出 IndexError）"""
+        offset = self._free.pop() * self.slot_size
+        self._records[offset:offset + self.slot_size]['status'] = STATUS_EMPTY
+        return offset
+
+    def view(self, offset, count):
+        """槽中前 count 条记录（直接引用共享内存，release 之前使用，需要保留的数据请复制）"""
+        return self._records[offset:offset + count]
+
+    def release(self, offset):
+        self._free.append(offset // self.slot_size)
+
+    def close(self):
+        """释放共享内存（所有工作进程都已不再写入时调用）"""
+        if self._shm is None:
+            return
+        self._records = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # 出错退出时异常回溯中可能仍引用着记录数组，映射在其释放后自动关闭
+        self._shm.unlink()
+        self._shm = None
@@ -1,65 +1,240 @@
 # ssim_calculator.py
+import os
 import numpy as np
 from PIL import Image
 
-def calculate_ssim(img1_path, img2_path, window_size=11, k1=0.01, k2=0.03, L=255):
+# 窗口SSIM在计算前将图像缩小到短边约为该尺寸（与Wang等人参考实现的自动下采样一致）
+SSIM_DOWNSAMPLE_SIZE = 256
+
+
+def gaussian_kernel(window_size=11, sigma=1.5):
+    """生成归一化的一维高斯核（float32）"""
+    x = np.arange(window_size, dtype=np.float32) - (window_size - 1) / 2
+    kernel = np.exp(-(x ** 2) / (2 * sigma ** 2))
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def box_kernel(window_size=11):
+    """生成归一化的一维均值核（float32）"""
+    return np.full(window_size, 1.0 / window_size, dtype=np.float32)
+
+
+def filter_separable(img, kernel):
     """
-    SSIM计算
-        img1_path, img2_path: 两个图像的路径
-        window_size: 计算结构相似性时的窗口大小
-        k1, k2: 稳定常数
-        L: 像素值的动态范围
-    
+    可分离二维滤波（valid模式）
+        先沿行方向、再沿列方向做一维卷积，计算量由 n² 降为 2n
+        img 可以是单张 (H, W) 或一批 (N, H, W) 图像，滤波作用于最后两个维度
+    """
+    n = len(kernel)
+    height, width = img.shape[-2:]
+
+    rows = kernel[0] * img[..., :width - n + 1]
+    for i in range(1, n):
+        rows += kernel[i] * img[..., i:width - n + 1 + i]
+
+    out = kernel[0] * rows[..., :height - n + 1, :]
+    for i in range(1, n):
+        out += kernel[i] * rows[..., i:height - n + 1 + i, :]
+    return out
+
+
+def window_kernel(window_size=11, window='gaussian'):
+    """根据窗口类型生成一维滤波核"""
+    return gaussian_kernel(window_size) if window == 'gaussian' else box_kernel(window_size)
+
+
+def local_stats(img, window_size=11, window='gaussian'):
+    """计算局部均值和局部方差，可预先对源图像计算后重复使用"""
+    kernel = window_kernel(window_size, window)
+    mu = filter_separable(img, kernel)
+    sigma_sq = filter_separable(img * img, kernel) - mu * mu
+    return mu, sigma_sq
+
+
+def ssim_map(img1, img2, window_size=11, window='gaussian', k1=0.01, k2=0.03, L=255, stats1=None):
+    """
+    计算局部窗口SSIM图
+        img1, img2: 相同尺寸的float32灰度数组
+        window: 'gaussian'（σ=1.5的高斯窗）或 'box'（均值窗）
+        stats1: 预先计算的img1局部统计量 (mu1, sigma1_sq)，见 local_stats
+
     返回值:
-        ssim_value: 0到1之间的相似度值，1表示完全相同
+        每个窗口位置的SSIM值组成的数组
     """
-    # 加载图像并转换为灰度图
-    img1 = Image.open(img1_path).convert('L')
-    img2 = Image.open(img2_path).convert('L')
-    
-    # 将图像调整为相同尺寸以进行比较
-    # 使用较小图像的尺寸作为目标尺寸
-    width = min(img1.width, img2.width)
-    height = min(img1.height, img2.height)
-    img1 = img1.resize((width, height), Image.LANCZOS)
-    img2 = img2.resize((width, height), Image.LANCZOS)
-    
-    # 转换为numpy数组以进行数学运算
-    img1 = np.array(img1, dtype=np.float64)
-    img2 = np.array(img2, dtype=np.float64)
-    
-    # 计算均值
-    mu1 = np.mean(img1)
-    mu2 = np.mean(img2)
-    
+    kernel = window_kernel(window_size, window)
+
+    C1 = (k1 * L) ** 2
+    C2 = (k2 * L) ** 2
+
+    # 局部均值、方差和协方差
+    if stats1 is None:
+        stats1 = local_stats(img1, window_size, window)
+    mu1, sigma1_sq = stats1
+    mu2 = filter_separable(img2, kernel)
+    mu1_sq = mu1 * mu1
+    mu2_sq = mu2 * mu2
+    mu1_mu2 = mu1 * mu2
+    sigma2_sq = filter_separable(img2 * img2, kernel) - mu2_sq
+    sigma12 = filter_separable(img1 * img2, kernel) - mu1_mu2
+
+    numerator = (2 * mu1_mu2 + C1) * (2 * sigma12 + C2)
+    denominator = (mu1_sq + mu2_sq + C1) * (sigma1_sq + sigma2_sq + C2)
+    return numerator / denominator
+
+
+def global_stats(img):
+    """计算整幅图像的均值和方差"""
+    return float(np.mean(img, dtype=np.float64)), float(np.var(img, dtype=np.float64))
+
+
+def global_ssim(img1, img2, k1=0.01, k2=0.03, L=255, stats1=None):
+    """
+    全局SSIM（快速模式）
+        直接使用整幅图像的均值、方差和协方差，不做窗口滑动
+        stats1: 预先计算的img1统计量 (mu1, sigma1_sq)，见 global_stats
+    """
+    # 计算均值和方差
+    mu1, sigma1_sq = stats1 if stats1 is not None else global_stats(img1)
+    mu2 = float(np.mean(img2, dtype=np.float64))
+
     # 计算方差和协方差
-    sigma1_sq = np.var(img1)
-    sigma2_sq = np.var(img2)
-    sigma12 = np.mean((img1 - mu1) * (img2 - mu2))
-    
+    sigma2_sq = float(np.var(img2, dtype=np.float64))
+    sigma12 = float(np.mean((img1 - mu1) * (img2 - mu2), dtype=np.float64))
+
     # 计算稳定常数
     C1 = (k1 * L) ** 2
     C2 = (k2 * L) ** 2
     C3 = C2 / 2
-    
+
     # 计算亮度、对比度和结构对比
     l = (2 * mu1 * mu2 + C1) / (mu1**2 + mu2**2 + C1)  # 亮度
     c = (2 * np.sqrt(sigma1_sq) * np.sqrt(sigma2_sq) + C2) / (sigma1_sq + sigma2_sq + C2)  # 对比度
     s = (sigma12 + C3) / (np.sqrt(sigma1_sq) * np.sqrt(sigma2_sq) + C3)  # 结构
-    
+
     # 计算SSIM
-    ssim_value = l * c * s
-    
-    return ssim_value
+    return l * c * s
+
+
+def prepare_gray(img, size, window='gaussian'):
+    """
+    将PIL图像转换为指定尺寸的float32灰度数组
+        窗口模式下按短边自动整数倍下采样，global模式保持原尺寸
+    """
+    img = img.convert('L')
+    if img.size != size:
+        img = img.resize(size, Image.LANCZOS)
+    if window != 'global':
+        factor = max(1, round(min(size) / SSIM_DOWNSAMPLE_SIZE))
+        if factor > 1:
+            img = img.reduce(factor)
+    return np.asarray(img, dtype=np.float32)
+
+
+def use_global(shape, window_size=11, window='gaussian'):
+    """图像小于窗口时无法做窗口滑动，退回全局模式"""
+    return window == 'global' or min(shape) < window_size
+
+
+def ssim_from_arrays(img1, img2, window_size=11, window='gaussian', k1=0.01, k2=0.03, L=255, stats1=None):
+    """对两个相同尺寸的灰度数组计算SSIM，窗口模式返回SSIM图的均值"""
+    if use_global(img1.shape, window_size, window):
+        return float(global_ssim(img1, img2, k1, k2, L, stats1))
+    return float(np.mean(ssim_map(img1, img2, window_size, window, k1, k2, L, stats1), dtype=np.float64))
+
+
+def ssim_batch(source, targets, window_size=11, window='gaussian', k1=0.01, k2=0.03, L=255, stats1=None):
+    """
+    一个源图像与一批同尺寸目标图像的向量化SSIM
+        source: (H, W) float32数组
+        targets: (N, H, W) float32数组
+
+    返回值:
+        长度为N的平均SSIM数组
+    """
+    if use_global(source.shape, window_size, window):
+        return np.array([global_ssim(source, target, k1, k2, L, stats1) for target in targets])
+    maps = ssim_map(source, targets, window_size, window, k1, k2, L, stats1)
+    return maps.mean(axis=(-2, -1), dtype=np.float64)
+
+
+class SSIMSource:
+    """
+    预处理后的SSIM源图像
+        源图像只解码一次并保存灰度图，按比较尺寸缓存缩放后的数组及其统计量，
+        同一批目标图像尺寸相同时（如统一4096×4096的贴图）无需重复缩放和滤波
+    """
+
+    def __init__(self, path, window_size=11, window='gaussian', max_cached_sizes=8):
+        self.path = path
+        self.window_size = window_size
+        self.window = window
+        self.max_cached_sizes = max_cached_sizes
+        self.mtime = os.path.getmtime(path)
+        with Image.open(path) as img:
+            self.image = img.convert('L')
+        self._prepared = {}  # {(宽, 高): (数组, 统计量)}
+
+    @property
+    def size(self):
+        return self.image.size
+
+    def at_size(self, size):
+        """获取指定比较尺寸下的源图像数组和统计量"""
+        prepared = self._prepared.get(size)
+        if prepared is None:
+            arr = prepare_gray(self.image, size, self.window)
+            if use_global(arr.shape, self.window_size, self.window):
+                stats = global_stats(arr)
+            else:
+                stats = local_stats(arr, self.window_size, self.window)
+            if len(self._prepared) >= self.max_cached_sizes:
+                self._prepared.pop(next(iter(self._prepared)))
+            prepared = self._prepared[size] = (arr, stats)
+        return prepared
+
+    def compare(self, target_img, k1=0.01, k2=0.03, L=255):
+        """
+        与已打开的目标图像计算SSIM
+            target_img: PIL图像对象
+        """
+        width = min(self.image.width, target_img.width)
+        height = min(self.image.height, target_img.height)
+        source_arr, stats = self.at_size((width, height))
+        target_arr = prepare_gray(target_img, (width, height), self.window)
+        return ssim_from_arrays(source_arr, target_arr, self.window_size, self.window, k1, k2, L, stats)
+
+
+def calculate_ssim(img1_path, img2_path, window_size=11, k1=0.01, k2=0.03, L=255, window='gaussian'):
+    """
+    SSIM计算
+        img1_path, img2_path: 两个图像的路径
+        window_size: 计算结构相似性时的窗口大小
+        k1, k2: 稳定常数
+        L: 像素值的动态范围
+        window: 'gaussian' 高斯窗口 / 'box' 均值窗口 / 'global' 全局快速模式
+
+    返回值:
+        ssim_value: 平均SSIM值，1表示完全相同
+    """
+    # 加载图像并转换为灰度图
+    with Image.open(img1_path) as img1, Image.open(img2_path) as img2:
+        # 将图像调整为相同尺寸以进行比较
+        # 使用较小图像的尺寸作为目标尺寸
+        width = min(img1.width, img2.width)
+        height = min(img1.height, img2.height)
+        arr1 = prepare_gray(img1, (width, height), window)
+        arr2 = prepare_gray(img2, (width, height), window)
+
+    return ssim_from_arrays(arr1, arr2, window_size, window, k1, k2, L)
 
 def compare_images_ssim(source_path, target_path):
     """
     计算两个图像的SSIM相似度，用于多进程调用
-    
+
     参数:
         source_path: 源图像路径
         target_path: 目标图像路径
-    
+
     返回值:
         0到1之间的相似度值
     """
@@ -0,0 +1,23 @@
+import numpy as np
+
+from hash_engine import _popcount_table, popcount
+
+
+def _expected(values):
+    return np.vectorize(lambda value: bin(int(value)).count('1'), otypes=[np.uint8])(values)
+
+
+def test_popcount_table_keeps_shape():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, np.iinfo(np.uint64).max, size=(3, 4), dtype=np.uint64, endpoint=True)
+    counts = _popcount_table(values)
+    assert counts.shape == (3, 4)
+    assert np.array_equal(counts, _expected(values))
+    assert np.array_equal(counts[1], _popcount_table(values[1]))
+
+
+def test_popcount_table_matches_popcount():
+    # 与 np.bitwise_count（NumPy 2）或同一查表实现的结果一致，含非连续的转置输入
+    values = np.arange(24, dtype=np.uint64).reshape(4, 6) * np.uint64(0x0101010101010101)
+    assert np.array_equal(_popcount_table(values.T), popcount(values.T))
+    assert np.array_equal(_popcount_table(values.T), _expected(values.T))
@@ -0,0 +1,145 @@
+# thumbnail_cache.py - SSIM规范缩略图缓存模块
+import os
+import sqlite3
+import threading
+import numpy as np
+
+# 规范缩略图尺寸（正方形灰度图，每张占用 THUMBNAIL_SIZE² 字节）
+THUMBNAIL_SIZE = 128
+
+# 工作进程中已打开的只读内存映射，按 (文件, 容量) 缓存
+_open_arrays = {}
+
+
+def open_thumbnail_array(cache_file, capacity, size=THUMBNAIL_SIZE):
+    """在工作进程中以只读方式打开缩略图数组（同一进程内复用）"""
+    key = (cache_file, capacity)
+    if key not in _open_arrays:
+        _open_arrays.clear()
+        _open_arrays[key] = np.memmap(cache_file, dtype=np.uint8, mode='r', shape=(capacity, size, size))
+    return _open_arrays[key]
+
+
+class ThumbnailCache:
+    """
+    SSIM规范缩略图缓存
+        所有缩略图保存在一个内存映射的uint8数组文件中（每行一张），
+        路径→行号表保存在SQLite中，以文件大小和修改时间判断缓存是否失效
+    """
+
+    def __init__(self, cache_file="image_similarity_thumbs.u8", table_file="image_similarity_thumbs.db",
+                 size=THUMBNAIL_SIZE):
+        self.cache_file = cache_file
+        self.size = size
+        self.row_bytes = size * size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(table_file, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                row INTEGER NOT NULL UNIQUE
+            )
+        """)
+        self._conn.commit()
+
+        # 路径→(文件大小, 修改时间, 宽, 高, 行号)
+        self._entries = {
+            path: (size, mtime, width, height, row)
+            for path, size, mtime, width, height, row in self._conn.execute(
+                "SELECT path, size, mtime, width, height, row FROM thumbnails")
+        }
+        self._next_row = max((entry[4] for entry in self._entries.values()), default=-1) + 1
+
+        if not os.path.exists(cache_file):
+            open(cache_file, 'wb').close()
+        self.capacity = os.path.getsize(cache_file) // self.row_bytes
+        self._array = None
+        self._open_array()
+
+    def _open_array(self):
+        self._array = None
+        if self.capacity > 0:
+            self._array = np.memmap(self.cache_file, dtype=np.uint8, mode='r+',
+                                    shape=(self.capacity, self.size, self.size))
+
+    def _ensure_capacity(self, rows_needed):
+        """容量不足时按倍数扩展缓存文件"""
+        if rows_needed <= self.capacity:
+            return
+        new_capacity = max(rows_needed, self.capacity * 2, 1024)
+        if self._array is not None:
+            self._array.flush()
+        self._array = None
+        with open(self.cache_file, 'r+b') as f:
+            f.truncate(new_capacity * self.row_bytes)
+        self.capacity = new_capacity
+        self._open_array()
+
+    def find_rows(self, entries):
+        """
+        检查 (路径, 文件大小, 修改时间) 条目是否已有有效缩略图
+
+        返回值:
+            (hits, missing)
+            hits: [(路径, 修改时间, 宽, 高, 行号)]
+            missing: 需要重新生成缩略图的条目列表
+        """
+        hits = []
+        missing = []
+        with self._lock:
+            for entry in entries:
+                path, size, mtime = entry
+                cached = self._entries.get(path)
+                if cached is not None and cached[0] == size and cached[1] == mtime:
+                    hits.append((path, mtime, cached[2], cached[3], cached[4]))
+                else:
+                    missing.append(entry)
+        return hits, missing
+
+    def store_many(self, items):
+        """
+        写入缩略图
+            items: [((路径, 文件大小, 修改时间), 宽, 高, 缩略图字节)]
+
+        返回值:
+            与items对应的 [(路径, 修改时间, 宽, 高, 行号)]
+        """
+        stored = []
+        if not items:
+            return stored
+        with self._lock:
+            new_paths = sum(1 for item in items if item[0][0] not in self._entries)
+            self._ensure_capacity(self._next_row + new_paths)
+
+            rows = []
+            for (path, size, mtime), width, height, thumbnail in items:
+                cached = self._entries.get(path)
+                if cached is not None:
+                    row = cached[4]  # 文件变化时复用原来的行
+                else:
+                    row = self._next_row
+                    self._next_row += 1
+                self._array[row] = np.frombuffer(thumbnail, dtype=np.uint8).reshape(self.size, self.size)
+                self._entries[path] = (size, mtime, width, height, row)
+                rows.append((path, size, mtime, width, height, row))
+                stored.append((path, mtime, width, height, row))
+
+            self._array.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO thumbnails (path, size, mtime, width, height, row) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        return stored
+
+    def close(self):
+        """刷新缓存文件并关闭数据库连接"""
+        with self._lock:
+            if self._array is not None:
+                self._array.flush()
+                self._array = None
+            self._conn.close()
@@ -0,0 +1,105 @@
+# worker_pool.py - 常驻工作进程池模块
+#
+# 本模块只依赖标准库：spawn 启动方式下工作进程会以 __mp_main__ 的身份导入本模块，
+# 而不是导入 Main.py 及其 Qt、psutil 等依赖
+import os
+import sys
+import threading
+
+
+def _warm_worker():
+    """工作进程初始化函数：预先导入图像处理模块，第一次搜索时无需再等待导入"""
+    import image_processor  # noqa: F401
+
+
+def map_chunk(func, items):
+    """在工作进程中处理一批任务，配合 imap_unordered(chunksize=1) 使用，按批返回结果"""
+    return [func(item) for item in items]
+
+
+def use_lean_main(name):
+    """
+    将 __main__ 指向本模块，原主模块改以 name 登记（程序入口在启动任何线程之前调用一次）
+        spawn/forkserver 启动的子进程会重新导入父进程的主模块；替换后工作进程（包括进程池之后
+        补充创建的进程，如某个工作进程崩溃后）只导入本模块和图像处理模块，而不是 Main.py 及其 Qt 依赖。
+        只在启动时替换一次，之后不再修改全局状态，不会与其他线程中的导入交错
+    """
+    main_module = sys.modules['__main__']
+    sys.modules.setdefault(name, main_module)
+    sys.modules['__main__'] = sys.modules[__name__]
+
+
+class WorkerPool:
+    """
+    应用持有的常驻进程池
+        在后台线程中延迟启动，所有搜索复用同一组工作进程，
+        取消搜索时终止并在后台重新启动，程序退出时关闭
+    """
+
+    def __init__(self, processes=None):
+        self.processes = processes or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._starting = False
+
+    def start_async(self):
+        """在后台线程中启动进程池（已启动或正在启动时不做任何事）"""
+        with self._lock:
+            if self._pool is not None or self._starting:
+                return
+            self._starting = True
+            self._ready.clear()
+        threading.Thread(target=self._start, name="WorkerPoolStarter", daemon=True).start()
+
+    def _start(self):
+        import multiprocessing  # 在后台线程中导入，不占用窗口启动时间
+        try:
+            if os.name == 'posix':
+                # 先启动主进程的资源跟踪器，fork 出的工作进程与主进程共用；否则每个工作进程打开共享内存
+                # （见 shared_results）时各自启动跟踪器，退出时把主进程仍在使用或已删除的共享内存当作泄漏处理
+                from multiprocessing import resource_tracker
+                resource_tracker.ensure_running()
+            pool = multiprocessing.Pool(processes=self.processes, initializer=_warm_worker)
+            with self._lock:
+                self._pool = pool
+        finally:
+            with self._lock:
+                self._starting = False
+            self._ready.set()
+
+    def _wait_for_start(self):
+        """正在后台启动时等待启动完成"""
+        with self._lock:
+            starting = self._starting
+        if starting:
+            self._ready.wait()
+
+    def get(self):
+        """获取进程池，尚未启动时启动并等待就绪"""
+        self.start_async()
+        self._ready.wait()
+        with self._lock:
+            if self._pool is None:
+                raise RuntimeError("工作进程池启动失败")
+            return self._pool
+
+    def reset(self):
+        """终止正在执行的任务（如取消搜索），并在后台重新启动进程池"""
+        self._wait_for_start()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        self.start_async()
+
+    def shutdown(self):
+        """关闭进程池，程序退出时调用"""
+        self._wait_for_start()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.terminate()
+            pool.join()